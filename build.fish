@@ -52,7 +52,7 @@ end
 
 echo "Building CLI version ($cli_file)..."
 if test -f $cli_file
-    pyinstaller --onefile --name mondeo-cli $cli_file
+    pyinstaller --onefile --name mondeo-cli --add-data "mondeo/dtc.idx:mondeo" $cli_file
     if test $status -ne 0
         echo "Failed to build CLI version"
         exit 1
@@ -64,7 +64,7 @@ end
 echo "Building GUI version (main-gui.py)..."
 if test -f main-gui.py
     # For GUI applications, we might want additional options
-    pyinstaller --onefile --name mondeo-gui --windowed main-gui.py
+    pyinstaller --onefile --name mondeo-gui --windowed --add-data "mondeo/dtc.idx:mondeo" main-gui.py
     if test $status -ne 0
         echo "Warning: GUI build failed - this is normal if GTK is not available"
     end
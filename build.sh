@@ -32,6 +32,10 @@ else
   pip install PyGObject 2>/dev/null || echo "Warning: PyGObject not available - GUI may not work"
 fi
 
+# The offline DTC database ships prebuilt (mondeo/dtc.idx); rebuild it with
+#   python -m mondeo.dtcdb --build
+# after changing mondeo/ford_defs.py or upgrading python-OBD
+
 # Clean previous builds
 echo "Cleaning previous builds..."
 [ -d build ] && rm -rf build
@@ -44,7 +48,7 @@ cli_file="main.py"
 
 echo "Building CLI version ($cli_file)..."
 if [ -f "$cli_file" ]; then
-  pyinstaller --onefile --name mondeo-cli "$cli_file"
+  pyinstaller --onefile --name mondeo-cli --add-data "mondeo/dtc.idx:mondeo" "$cli_file"
   if [ $? -ne 0 ]; then
     echo "Failed to build CLI version"
     exit 1
@@ -55,7 +59,7 @@ fi
 
 echo "Building GUI version (main-gui.py)..."
 if [ -f main-gui.py ]; then
-  pyinstaller --onefile --name mondeo-gui --windowed main-gui.py
+  pyinstaller --onefile --name mondeo-gui --windowed --add-data "mondeo/dtc.idx:mondeo" main-gui.py
   if [ $? -ne 0 ]; then
     echo "Warning: GUI build failed - this is normal if GTK is not available"
   fi
@@ -3,18 +3,34 @@
 """
 Ford Mondeo Mk4 2007 TDCi Full Diagnostics Tool - GTK GUI Version
 """
+import logging
 import gi
 gi.require_version('Gtk', '3.0')
-from gi.repository import Gtk, GLib, Pango
-import obd
-import serial
-import serial.tools.list_ports
+from gi.repository import Gtk, GLib
 import threading
 import time
 from datetime import datetime
+from mondeo import preload_obd
+from mondeo.worker import ObdWorker, PRIORITY_CONNECT, PRIORITY_BACKGROUND
+from mondeo.monitor import DtcMonitor, STORED, PENDING, APPEARED, format_event
+from mondeo.health import LINK_LOST
+from mondeo.ports import PortRegistry, RANK_BRIDGE
+from mondeo.history import HistoryStore
 
-# Set log level
-obd.logger.setLevel(obd.logging.ERROR)
+logger = logging.getLogger(__name__)
+
+# python-OBD, NumPy and the feature modules are imported when first used,
+# so the window comes up before Pint's unit registry is built
+
+# Results panels redraw at most this often, however fast rows arrive
+RESULTS_FPS = 10
+RESULTS_MAX_ROWS = 10000
+
+# Dashboard redraw rate; samples arriving in between only go into its ring buffers
+DASHBOARD_FPS = 25
+
+# ELM327 fast-mode profile (mondeo.connection): settings are verified, clones fall back
+FAST_MODE = True
 
 class MondeoDialogWindow:
     def __init__(self, parent, title, message, dialog_type="info"):
@@ -71,44 +87,303 @@ class MondeoProgressDialog:
             GLib.source_remove(self.timeout_id)
         self.dialog.destroy()
 
-class MondeoResultsDialog:
-    def __init__(self, parent, title, results):
+class MondeoResultsPanel:
+    """
+    Non-modal results list backed by a Gtk.ListStore.
+
+    append() may be called from any thread: rows are queued and moved into
+    the store in one batch at most RESULTS_FPS times a second, so a stream
+    of results never blocks the GTK main loop. Rows have a fixed height, so
+    the TreeView only lays out the visible ones; the oldest rows are dropped
+    beyond `max_rows`.
+    """
+
+    COLUMNS = (("Time", 100), ("Source", 80), ("Item", 220), ("Value", 140), ("Details", 360))
+
+    def __init__(self, parent, title, note=None, max_rows=RESULTS_MAX_ROWS):
+        self.max_rows = max_rows
+        self.closed = False
+        self.total = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._status = None
+        self.status_text = ""
+
         self.dialog = Gtk.Dialog(
             title=title,
             transient_for=parent,
-            modal=True
+            modal=False
         )
-        self.dialog.set_default_size(600, 400)
+        self.dialog.set_default_size(900, 450)
         self.dialog.add_button("Close", Gtk.ResponseType.CLOSE)
+        self.dialog.connect("response", lambda dialog, response: self.destroy())
+
+        content = self.dialog.get_content_area()
+        content.set_border_width(10)
+
+        self.store = Gtk.ListStore(str, str, str, str, str)
+        self.treeview = Gtk.TreeView(model=self.store)
+        for i, (name, width) in enumerate(self.COLUMNS):
+            column = Gtk.TreeViewColumn(name, Gtk.CellRendererText(), text=i)
+            column.set_sizing(Gtk.TreeViewColumnSizing.FIXED)
+            column.set_fixed_width(width)
+            column.set_resizable(True)
+            self.treeview.append_column(column)
+        # every row the same height: GTK skips measuring off-screen rows
+        self.treeview.set_fixed_height_mode(True)
 
-        # Create scrolled window
         scrolled = Gtk.ScrolledWindow()
         scrolled.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
-        scrolled.set_border_width(10)
+        scrolled.add(self.treeview)
+        content.pack_start(scrolled, True, True, 0)
+
+        self.status_label = Gtk.Label()
+        self.status_label.set_halign(Gtk.Align.START)
+        content.pack_start(self.status_label, False, False, 5)
+
+        if note:
+            note_label = Gtk.Label()
+            note_label.set_markup(f"<span size='small' style='italic'>{GLib.markup_escape_text(note)}</span>")
+            note_label.set_halign(Gtk.Align.START)
+            content.pack_start(note_label, False, False, 0)
+
+        self.timeout_id = GLib.timeout_add(1000 // RESULTS_FPS, self.flush)
+        self.dialog.show_all()
+
+    def append(self, timestamp, source, item, value="", details=""):
+        """Queue one row (any thread)"""
+        if self.closed:
+            return
+        time_text = datetime.fromtimestamp(timestamp).strftime("%H:%M:%S.%f")[:-3] if timestamp else ""
+        row = [time_text, source, item, str(value), details]
+        with self._lock:
+            self._pending.append(row)
+
+    def set_status(self, text):
+        """Status line under the list (any thread), shown on the next frame"""
+        with self._lock:
+            self._status = text
+
+    def flush(self):
+        """Move queued rows into the store (GLib timeout, one batch per frame)"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+            status, self._status = self._status, None
+
+        if rows:
+            adjustment = self.treeview.get_vadjustment()
+            at_bottom = adjustment.get_value() >= adjustment.get_upper() - adjustment.get_page_size() - 1
+
+            self.total += len(rows)
+            rows = rows[-self.max_rows:]
+            for row in rows:
+                self.store.append(row)
+            for _ in range(len(self.store) - self.max_rows):
+                self.store.remove(self.store.get_iter_first())
+
+            if at_bottom:
+                self.treeview.scroll_to_cell(Gtk.TreePath(len(self.store) - 1), None, False, 0, 0)
+
+        if rows or status is not None:
+            if status is not None:
+                self.status_text = status
+            shown = f"{len(self.store)} rows"
+            if self.total > len(self.store):
+                shown += f" (last {self.max_rows} of {self.total})"
+            self.status_label.set_text(f"{shown}  |  {self.status_text}" if self.status_text else shown)
+        return True
+
+    def destroy(self):
+        self.closed = True
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        self.dialog.destroy()
+        return False
+
+class MondeoLiveDataDialog:
+    RESPONSE_LOG = 1
+
+    def __init__(self, parent, worker, get_recorder=lambda: None):
+        self.worker = worker
+        self.get_recorder = get_recorder
+        self.dialog = Gtk.Dialog(
+            title="Live Data",
+            transient_for=parent,
+            modal=False
+        )
+        self.dialog.set_default_size(450, 400)
+        self.dialog.add_button("Show Log", self.RESPONSE_LOG)
+        self.dialog.add_button("Close", Gtk.ResponseType.CLOSE)
+        # Close button and the window manager's close both emit "response"
+        self.dialog.connect("response", self.on_response)
+        self.parent = parent
+        self.log_panel = None
+
+        content = self.dialog.get_content_area()
+        content.set_border_width(20)
+
+        # One row per streamed PID, filled in as samples arrive
+        self.grid = Gtk.Grid(column_spacing=20, row_spacing=6)
+        content.pack_start(self.grid, True, True, 0)
+        self.value_labels = {}
 
-        # Create text view
-        text_view = Gtk.TextView()
-        text_view.set_editable(False)
-        text_view.set_cursor_visible(False)
-        text_view.set_wrap_mode(Gtk.WrapMode.WORD)
+        self.rate_label = Gtk.Label()
+        self.rate_label.set_halign(Gtk.Align.START)
+        content.pack_start(self.rate_label, False, False, 10)
 
-        # Set monospace font
-        font_desc = Pango.FontDescription("monospace 11")
-        text_view.modify_font(font_desc)
+        from mondeo.decode import RawBatch
+        from mondeo.stream import PidStream
 
-        # Add text
-        buffer = text_view.get_buffer()
-        buffer.set_text(results)
+        self.latest = {}
+        self.lock = threading.Lock()
+        self.batch = RawBatch()
+        self.stream = PidStream(worker.connection, raw=True)
 
-        scrolled.add(text_view)
-        self.dialog.get_content_area().pack_start(scrolled, True, True, 0)
+        # The OBD worker streams raw replies between queued commands; the UI
+        # decodes them in bulk, shows and records them at 10 Hz
+        worker.start_background(self.stream, self.on_sample)
+        self.timeout_id = GLib.timeout_add(100, self.refresh)
 
         self.dialog.show_all()
 
-    def run(self):
-        response = self.dialog.run()
+    def on_response(self, dialog, response):
+        if response == self.RESPONSE_LOG:
+            if self.log_panel is None or self.log_panel.closed:
+                self.log_panel = MondeoResultsPanel(self.parent, "Live Data Log")
+        else:
+            self.destroy()
+
+    def on_sample(self, sample):
+        """Called on the OBD worker thread for every raw sample"""
+        with self.lock:
+            self.batch.add(sample)
+
+    def refresh(self):
+        from mondeo.decode import format_reading, unit_symbol
+
+        with self.lock:
+            decoded = self.batch.decode()
+
+        log_panel = self.log_panel
+        recorder = self.get_recorder()
+        for name, (times, values) in decoded.items():
+            self.latest[name] = values[-1]
+            if log_panel and not log_panel.closed:
+                for t, value in zip(times.tolist(), values.tolist()):
+                    log_panel.append(t, "PID", name, format_reading(name, value))
+            if recorder:
+                recorder.extend(name, times, values, unit_symbol(name))
+
+        for name, value in self.latest.items():
+            if name not in self.value_labels:
+                row = len(self.value_labels)
+                name_label = Gtk.Label(label=name)
+                name_label.set_halign(Gtk.Align.START)
+                value_label = Gtk.Label()
+                value_label.set_halign(Gtk.Align.END)
+                self.grid.attach(name_label, 0, row, 1, 1)
+                self.grid.attach(value_label, 1, row, 1, 1)
+                name_label.show()
+                value_label.show()
+                self.value_labels[name] = value_label
+            self.value_labels[name].set_text(format_reading(name, value))
+
+        self.rate_label.set_text(f"{self.stream.rate():.1f} samples/s, {self.stream.requests} requests")
+        return True
+
+    def destroy(self):
+        self.stream.stop()
+        self.worker.stop_background(self.stream)
+        self.refresh()  # record what is still in the batch
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
         self.dialog.destroy()
-        return response
+        return False
+
+class MondeoDashboardDialog:
+    """RPM, boost, EGT and rail pressure gauges with scrolling charts"""
+
+    def __init__(self, parent, worker, get_recorder=lambda: None):
+        from mondeo.dashboard import Dashboard, DashboardStream
+        from mondeo.decode import RawBatch
+
+        self.worker = worker
+        self.get_recorder = get_recorder
+        self.dialog = Gtk.Dialog(
+            title="Dashboard",
+            transient_for=parent,
+            modal=False
+        )
+        self.dialog.set_default_size(900, 650)
+        self.dialog.add_button("Close", Gtk.ResponseType.CLOSE)
+        self.dialog.connect("response", lambda dialog, response: self.destroy())
+
+        content = self.dialog.get_content_area()
+        content.set_border_width(10)
+
+        self.dashboard = Dashboard()
+        self.area = Gtk.DrawingArea()
+        self.area.connect("draw", self.on_draw)
+        content.pack_start(self.area, True, True, 0)
+
+        self.rate_label = Gtk.Label()
+        self.rate_label.set_halign(Gtk.Align.START)
+        content.pack_start(self.rate_label, False, False, 5)
+
+        # Raw PID replies are collected on the OBD worker and decoded in bulk
+        # into the ring buffers (and the recording) at each redraw
+        self.lock = threading.Lock()
+        self.batch = RawBatch()
+        self.stream = DashboardStream(worker.connection, raw=True)
+        worker.start_background(self.stream, self.on_sample)
+        self.timeout_id = GLib.timeout_add(1000 // DASHBOARD_FPS, self.redraw)
+
+        self.dialog.show_all()
+
+    def on_sample(self, sample):
+        """Called on the OBD worker thread for every sample"""
+        from mondeo.stream import RawSample
+
+        if isinstance(sample, RawSample):
+            with self.lock:
+                self.batch.add(sample)
+            return
+        # the EGT DID comes decoded
+        self.dashboard.add(sample)
+        recorder = self.get_recorder()
+        if recorder:
+            recorder.record(sample)
+
+    def on_draw(self, area, cr):
+        self.dashboard.draw(cr, area.get_allocated_width(), area.get_allocated_height())
+        return False
+
+    def redraw(self):
+        from mondeo.decode import unit_symbol
+
+        with self.lock:
+            decoded = self.batch.decode()
+        recorder = self.get_recorder()
+        for name, (times, values) in decoded.items():
+            self.dashboard.extend(name, times, values)
+            if recorder:
+                recorder.extend(name, times, values, unit_symbol(name))
+        self.area.queue_draw()
+        self.rate_label.set_text(f"{self.stream.rate():.1f} samples/s, "
+                                 f"redraw {self.dashboard.draw_time * 1000:.1f} ms")
+        return True
+
+    def destroy(self):
+        self.stream.stop()
+        self.worker.stop_background(self.stream)
+        self.redraw()  # record what is still in the batch
+        if self.timeout_id:
+            GLib.source_remove(self.timeout_id)
+            self.timeout_id = None
+        self.dialog.destroy()
+        return False
 
 class MondeoPortSelectionDialog:
     def __init__(self, parent, available_ports):
@@ -173,16 +448,92 @@ class MondeoPortSelectionDialog:
         self.dialog.destroy()
         return response, self.selected_port
 
+class MondeoDtcLookupDialog:
+    """Search the offline DTC database (mondeo.dtcdb) as the user types"""
+
+    def __init__(self, parent):
+        from mondeo import dtcdb
+
+        self.dtcdb = dtcdb
+        self.dialog = Gtk.Dialog(
+            title="DTC Lookup",
+            transient_for=parent,
+            modal=False
+        )
+        self.dialog.set_default_size(700, 450)
+        self.dialog.add_button("Close", Gtk.ResponseType.CLOSE)
+        self.dialog.connect("response", lambda dialog, response: dialog.destroy())
+
+        content = self.dialog.get_content_area()
+        content.set_border_width(20)
+
+        label = Gtk.Label(label="Code (P2002, P24) or words from the description (glow plug):")
+        label.set_halign(Gtk.Align.START)
+        content.pack_start(label, False, False, 10)
+
+        self.entry = Gtk.SearchEntry()
+        self.entry.connect("search-changed", self.on_search_changed)
+        content.pack_start(self.entry, False, False, 0)
+
+        scrolled = Gtk.ScrolledWindow()
+        scrolled.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
+
+        self.liststore = Gtk.ListStore(str, str)
+        self.treeview = Gtk.TreeView(model=self.liststore)
+        for i, title in enumerate(("Code", "Description")):
+            self.treeview.append_column(Gtk.TreeViewColumn(title, Gtk.CellRendererText(), text=i))
+
+        scrolled.add(self.treeview)
+        content.pack_start(scrolled, True, True, 10)
+
+        self.status_label = Gtk.Label()
+        self.status_label.set_halign(Gtk.Align.START)
+        content.pack_start(self.status_label, False, False, 0)
+
+        self.dialog.show_all()
+
+    def on_search_changed(self, entry):
+        # A search is a few bisections in the mapped file, fine on the UI thread
+        query = entry.get_text()
+        results = self.dtcdb.search(query, limit=500)
+        self.liststore.clear()
+        for code, description in results:
+            self.liststore.append([code, description])
+        if not query.strip():
+            self.status_label.set_text("")
+        elif results:
+            self.status_label.set_text(f"{len(results)} code(s)" + (" (first 500)" if len(results) == 500 else ""))
+        else:
+            self.status_label.set_text(f"No code matches '{query}'")
+
 class MondeoMainWindow:
     def __init__(self):
         self.connection = None
+        self.recorder = None
+        # Background mode 03/07 polling; only changes reach the UI
+        self.dtc_monitor = DtcMonitor()
+        self.dtc_stale = True  # the DTC summary doesn't show the latest good read
+        self.dtc_poll_id = None
+        # Every connection is a session in the local history database; writes are queued
+        self.history = HistoryStore()
+        self.history_session = None
+        # Imports python-OBD in the background while the window comes up
+        self.obd_loader = preload_obd()
+        # Owns the connection; callbacks are delivered on the GTK main loop
+        self.worker = ObdWorker(dispatch=GLib.idle_add, fast_mode=FAST_MODE)
+        # Heartbeat between jobs, reconnect and resume streams on link loss
+        self.worker.watch_health(self.on_health_event)
+        self.lost_port = None
+        # Port list kept current by hotplug events; known adapters connect when plugged in
+        self.port_registry = PortRegistry()
+        self.port_registry.start(on_added=lambda port: GLib.idle_add(self.on_port_added, port))
         self.setup_ui()
         self.update_connection_status()
 
     def setup_ui(self):
         # Main window
         self.window = Gtk.Window(title="Ford Mondeo Mk4 1.8 TDCi Diagnostics")
-        self.window.set_default_size(500, 450)
+        self.window.set_default_size(500, 1010)
         self.window.set_position(Gtk.WindowPosition.CENTER)
         self.window.connect("destroy", Gtk.main_quit)
 
@@ -204,6 +555,12 @@ class MondeoMainWindow:
         self.status_label.set_halign(Gtk.Align.CENTER)
         header_box.pack_start(self.status_label, False, False, 0)
 
+        # DTC monitor status, updated only when codes appear or clear
+        self.dtc_label = Gtk.Label()
+        self.dtc_label.set_halign(Gtk.Align.CENTER)
+        self.dtc_label.set_line_wrap(True)
+        header_box.pack_start(self.dtc_label, False, False, 0)
+
         # Separator
         separator = Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL)
         header_box.pack_start(separator, False, False, 10)
@@ -226,6 +583,60 @@ class MondeoMainWindow:
         self.clear_button.connect("clicked", self.on_clear_codes)
         button_box.pack_start(self.clear_button, False, False, 0)
 
+        # Freeze frame button
+        self.freeze_button = Gtk.Button(label="Freeze Frame Data")
+        self.freeze_button.set_size_request(300, 50)
+        self.freeze_button.connect("clicked", self.on_freeze_frames)
+        button_box.pack_start(self.freeze_button, False, False, 0)
+
+        # Readiness monitors button
+        self.readiness_button = Gtk.Button(label="Readiness Monitors")
+        self.readiness_button.set_size_request(300, 50)
+        self.readiness_button.connect("clicked", self.on_readiness)
+        button_box.pack_start(self.readiness_button, False, False, 0)
+
+        # Live data button
+        self.live_button = Gtk.Button(label="Live Data")
+        self.live_button.set_size_request(300, 50)
+        self.live_button.connect("clicked", self.on_live_data)
+        button_box.pack_start(self.live_button, False, False, 0)
+
+        # Dashboard button
+        self.dashboard_button = Gtk.Button(label="Dashboard")
+        self.dashboard_button.set_size_request(300, 50)
+        self.dashboard_button.connect("clicked", self.on_dashboard)
+        button_box.pack_start(self.dashboard_button, False, False, 0)
+
+        # Ford module scan button
+        self.module_button = Gtk.Button(label="Ford Module Scan")
+        self.module_button.set_size_request(300, 50)
+        self.module_button.connect("clicked", self.on_module_scan)
+        button_box.pack_start(self.module_button, False, False, 0)
+
+        # Full scan button (every module on the car)
+        self.full_scan_button = Gtk.Button(label="Full Scan")
+        self.full_scan_button.set_size_request(300, 50)
+        self.full_scan_button.connect("clicked", self.on_full_scan)
+        button_box.pack_start(self.full_scan_button, False, False, 0)
+
+        # DTC lookup button (offline code database, works without a car)
+        self.lookup_button = Gtk.Button(label="DTC Lookup")
+        self.lookup_button.set_size_request(300, 50)
+        self.lookup_button.connect("clicked", self.on_dtc_lookup)
+        button_box.pack_start(self.lookup_button, False, False, 0)
+
+        # Latency stats button
+        self.stats_button = Gtk.Button(label="Latency Stats")
+        self.stats_button.set_size_request(300, 50)
+        self.stats_button.connect("clicked", self.on_stats)
+        button_box.pack_start(self.stats_button, False, False, 0)
+
+        # Record session button
+        self.record_button = Gtk.ToggleButton(label="Record Session")
+        self.record_button.set_size_request(300, 50)
+        self.record_button.connect("toggled", self.on_record_toggled)
+        button_box.pack_start(self.record_button, False, False, 0)
+
         # Select port button
         self.port_button = Gtk.Button(label="Select Serial Port")
         self.port_button.set_size_request(300, 50)
@@ -281,66 +692,47 @@ class MondeoMainWindow:
             self.status_label.set_markup(f"<span color='green' weight='bold'>CONNECTED to {port_name}</span>")
             self.read_button.set_sensitive(True)
             self.clear_button.set_sensitive(True)
+            self.freeze_button.set_sensitive(True)
+            self.readiness_button.set_sensitive(True)
+            self.live_button.set_sensitive(True)
+            self.dashboard_button.set_sensitive(True)
+            self.module_button.set_sensitive(True)
         else:
             self.status_label.set_markup("<span color='red' weight='bold'>NOT CONNECTED</span>")
             self.read_button.set_sensitive(False)
             self.clear_button.set_sensitive(False)
+            self.freeze_button.set_sensitive(False)
+            self.readiness_button.set_sensitive(False)
+            self.live_button.set_sensitive(False)
+            self.dashboard_button.set_sensitive(False)
+            self.module_button.set_sensitive(False)
 
     def get_available_ports(self):
-        """Get list of available serial ports"""
-        try:
-            ports = list(serial.tools.list_ports.comports())
-            # Filter for likely OBD-II adapters
-            obd_ports = []
-            for port in ports:
-                # Common OBD-II adapter descriptions
-                desc_lower = port.description.lower()
-                if any(keyword in desc_lower for keyword in ['usb', 'serial', 'ch340', 'ftdi', 'cp210', 'obd']):
-                    obd_ports.append(port)
-            
-            return obd_ports if obd_ports else ports
-        except Exception as e:
-            print(f"Error listing ports: {e}")
-            return []
+        """Likely OBD-II adapters first; every port if none looks like one"""
+        return self.port_registry.adapters() or self.port_registry.ports()
 
     def connect_to_obd(self, selected_port=None):
         """Connect to OBD-II adapter"""
-        def connect_worker():
-            try:
-                if selected_port:
-                    # Try connecting to specific port
-                    conn = obd.OBD(selected_port, baudrate=38400, timeout=30)
-                else:
-                    # Try auto-connect
-                    conn = obd.OBD(baudrate=38400, timeout=30)
-                
-                if conn.is_connected():
-                    GLib.idle_add(self.connection_success, conn)
-                else:
-                    # If auto-connect failed, try different baudrates
-                    for baudrate in [38400, 9600, 115200, 57600]:
-                        try:
-                            if selected_port:
-                                conn = obd.OBD(selected_port, baudrate=baudrate, timeout=30)
-                            else:
-                                conn = obd.OBD(baudrate=baudrate, timeout=30)
-                            
-                            if conn.is_connected():
-                                GLib.idle_add(self.connection_success, conn)
-                                return
-                            else:
-                                conn.close()
-                        except:
-                            continue
-                    
-                    GLib.idle_add(self.connection_failed, "No connection detected. Check ignition, adapter, and cable.")
-            except Exception as e:
-                GLib.idle_add(self.connection_failed, f"Connection failed: {str(e)}")
-
-        # Start connection in background thread
-        thread = threading.Thread(target=connect_worker)
-        thread.daemon = True
-        thread.start()
+        if selected_port:
+            ports = [selected_port]
+        else:
+            ports = self.port_registry.candidates()
+
+        # Probes every candidate port in parallel on the OBD worker,
+        # first adapter to answer wins (once python-OBD has finished loading)
+        self.worker.submit(lambda conn: self.obd_loader.join(), priority=PRIORITY_CONNECT)
+        self.worker.connect(ports, callback=self.on_connect_done)
+
+    def on_connect_done(self, future):
+        """Handle the result of a queued connect"""
+        try:
+            conn = future.result()
+        except Exception as e:
+            return self.connection_failed(f"Connection failed: {str(e)}")
+
+        if conn and conn.is_connected():
+            return self.connection_success(conn)
+        return self.connection_failed("No connection detected. Check ignition, adapter, and cable.")
 
     def connection_success(self, conn):
         """Handle successful connection"""
@@ -348,8 +740,116 @@ class MondeoMainWindow:
         self.update_connection_status()
         if hasattr(self, 'progress_dialog'):
             self.progress_dialog.destroy()
+
+        # New session in the history (reads the VIN on the worker)
+        self.worker.submit(lambda conn: self.history.begin(conn, source="gui"), key="history",
+                           callback=self.on_history_session)
+
+        # Start watching for DTC changes. A user connect may be to another car, so
+        # every code is new; a restored link (on_health_event) keeps the snapshot.
+        self.reset_dtc_monitor()
+        if self.dtc_poll_id is None:
+            self.dtc_poll_id = GLib.timeout_add(int(self.dtc_monitor.interval * 1000), self.poll_dtcs)
+        self.poll_dtcs()
+        return False
+
+    def on_history_session(self, future):
+        """Switch the history over to the new connection's session"""
+        try:
+            session = future.result()
+        except Exception:
+            logger.exception("Could not start a history session")
+            return False
+        if self.history_session:
+            self.history_session.end()
+        self.history_session = session
+        self.record_history()
+        if self.recorder:
+            session.add_log(self.recorder.path)
+        return False
+
+    def record_history(self):
+        """Queue the codes of the latest DTC read into the session history"""
+        if self.history_session and self.dtc_monitor.last_poll and not self.dtc_monitor.failed:
+            self.history_session.record_dtcs(self.dtc_monitor.active(), self.dtc_monitor.last_poll)
+
+    def on_port_added(self, port):
+        """A serial port was plugged in: connect if it is a known adapter and we have none"""
+        if self.connection or port.rank > RANK_BRIDGE or port.device == self.lost_port:
+            return False  # the health monitor reopens a lost port on its own
+        self.status_label.set_markup(
+            f"<span color='orange' weight='bold'>{GLib.markup_escape_text(port.description)} plugged in"
+            " - connecting...</span>")
+        self.connect_to_obd(port.device)
         return False
 
+    def on_health_event(self, event):
+        """The worker lost the adapter or got it back on its own"""
+        self.lost_port = event.port if event.kind == LINK_LOST else None
+        if event.kind == LINK_LOST:
+            self.connection = None
+            self.update_connection_status()
+            self.status_label.set_markup(
+                f"<span color='orange' weight='bold'>LINK LOST on {GLib.markup_escape_text(event.port)}"
+                " - reconnecting...</span>")
+        else:
+            # open live data and dashboard windows carry on with their buffers
+            self.connection = self.worker.connection
+            self.update_connection_status()
+            self.poll_dtcs()
+        return False
+
+    def reset_dtc_monitor(self):
+        """Forget the DTC snapshot of the previous connection"""
+        self.dtc_monitor.reset()
+        self.dtc_label.set_text("")
+        self.dtc_stale = True
+
+    def poll_dtcs(self):
+        """Queue a background DTC poll (GLib timeout)"""
+        if self.connection:
+            self.worker.submit(self.dtc_monitor.poll, key="dtc_monitor",
+                               priority=PRIORITY_BACKGROUND, callback=self.on_dtc_events)
+        return True
+
+    def on_dtc_events(self, future):
+        """Handle the events of a background DTC poll"""
+        try:
+            events = future.result()
+        except Exception as e:
+            logger.warning("DTC monitor poll failed: %s", e)
+            self.show_dtc_failure(f"DTC monitor: {e}")
+            return False
+        if self.dtc_monitor.failed:
+            self.show_dtc_failure("No answer from the ECU")
+            return False
+        self.record_history()
+        self.handle_dtc_events(events)
+        return False
+
+    def show_dtc_failure(self, message):
+        """Replace the DTC summary, which may be stale now, with why the poll failed"""
+        self.dtc_stale = True
+        self.dtc_label.set_markup(f"<span color='gray'>Stored DTCs: ?   Pending: ?</span>\n"
+                                  f"<span size='small'>{GLib.markup_escape_text(message)}</span>")
+
+    def handle_dtc_events(self, events):
+        """Record new codes and refresh the DTC summary; unchanged reads do nothing"""
+        if not events and not self.dtc_stale:
+            return
+        self.dtc_stale = False
+        appeared = [event for event in events if event.kind == APPEARED]
+        if self.recorder and appeared:
+            for event in appeared:
+                self.recorder.record_dtcs([(event.code, event.description)], event.first_seen)
+
+        stored = len(self.dtc_monitor.active(STORED))
+        pending = len(self.dtc_monitor.active(PENDING))
+        color = "red" if stored else "orange" if pending else "green"
+        self.dtc_label.set_markup(
+            f"<span color='{color}'>Stored DTCs: {stored}   Pending: {pending}</span>\n"
+            f"<span size='small'>{GLib.markup_escape_text(format_event(events[-1]) if events else '')}</span>")
+
     def connection_failed(self, error_msg):
         """Handle connection failure"""
         self.connection = None
@@ -385,14 +885,8 @@ class MondeoMainWindow:
         response, selected_port = port_dialog.run()
 
         if response == Gtk.ResponseType.OK and selected_port:
-            # Close existing connection
-            if self.connection:
-                try:
-                    self.connection.close()
-                except:
-                    pass
-                self.connection = None
-
+            # The queued connect closes the existing connection first
+            self.connection = None
             self.update_connection_status()
 
             # Show progress dialog
@@ -424,47 +918,322 @@ class MondeoMainWindow:
             "Reading Diagnostic Trouble Codes..."
         )
 
-        def read_worker():
-            try:
-                codes = self.connection.get_dtc()
-                GLib.idle_add(self.show_dtc_results, codes)
-            except Exception as e:
-                GLib.idle_add(self.show_error, f"Error reading DTCs: {str(e)}")
+        # Repeated clicks while a read is queued share the same request
+        self.worker.submit(self.dtc_monitor.poll, key="get_dtc", callback=self.on_read_done)
 
-        thread = threading.Thread(target=read_worker)
-        thread.daemon = True
-        thread.start()
+    def on_read_done(self, future):
+        """Handle the result of a queued DTC read"""
+        try:
+            events = future.result()
+        except Exception as e:
+            return self.show_error(f"Error reading DTCs: {str(e)}")
+        if self.dtc_monitor.failed:
+            self.show_dtc_failure("No answer from the ECU")
+            return self.show_error("No answer from the ECU. Check ignition and adapter.")
+        self.record_history()
+        self.handle_dtc_events(events)
+        return self.show_dtc_results(self.dtc_monitor.active(STORED))
 
     def show_dtc_results(self, codes):
-        """Display DTC results"""
+        """Display the stored codes of the DTC monitor's latest read"""
         self.progress_dialog.destroy()
 
-        if codes and codes.value:
-            # Format results
-            results = f"Diagnostic Trouble Codes Found ({len(codes.value)} total):\n\n"
-            results += "=" * 50 + "\n\n"
+        if codes:
+            panel = MondeoResultsPanel(
+                self.window,
+                "Diagnostic Trouble Codes",
+                "Please consult your service manual or a qualified technician for proper diagnosis and repair."
+            )
+            # Time column is when each code was first seen
+            for dtc in codes:
+                panel.append(dtc.first_seen, "OBD-II", dtc.code, dtc.status, dtc.description)
+            panel.set_status(f"{len(codes)} stored codes")
+        else:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "No DTCs Found",
+                "No diagnostic trouble codes detected. Vehicle systems appear normal.",
+                "info"
+            )
+            dialog.run()
 
-            for i, (code, desc) in enumerate(codes.value, 1):
-                results += f"{i}. Code: {code}\n"
-                results += f"   Description: {desc}\n"
-                results += f"   Timestamp: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        return False
 
-            results += "=" * 50 + "\n"
-            results += "Please consult your service manual or a qualified technician for proper diagnosis and repair."
+    def on_freeze_frames(self, button):
+        """Handle freeze frame button click"""
+        from mondeo import freeze
 
-            dialog = MondeoResultsDialog(self.window, "Diagnostic Trouble Codes", results)
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
             dialog.run()
-        else:
+            return
+
+        self.progress_dialog = MondeoProgressDialog(
+            self.window,
+            "Reading Freeze Frames",
+            "Reading freeze frame data..."
+        )
+
+        def read(conn):
+            """Runs on the OBD worker: stored codes first, then one frame per code"""
+            events = self.dtc_monitor.poll(conn)
+            codes = [dtc.code for dtc in self.dtc_monitor.active(STORED)]
+            return events, codes, freeze.read_freeze_frames(conn, codes)
+
+        self.worker.submit(read, key="freeze_frames", callback=self.on_freeze_done)
+
+    def on_freeze_done(self, future):
+        """Display the freeze frames of the stored codes"""
+        import obd
+        from mondeo.stream import format_value
+
+        try:
+            events, codes, frames = future.result()
+        except Exception as e:
+            return self.show_error(f"Error reading freeze frames: {str(e)}")
+        self.record_history()
+        if self.history_session and frames:
+            self.history_session.record_freeze(frames)
+        self.handle_dtc_events(events)
+        self.progress_dialog.destroy()
+
+        if not frames:
             dialog = MondeoDialogWindow(
                 self.window,
-                "No DTCs Found",
-                "No diagnostic trouble codes detected. Vehicle systems appear normal.",
+                "No Freeze Frame",
+                "The engine control module has no freeze frame stored.",
                 "info"
             )
             dialog.run()
+            return False
+
+        panel = MondeoResultsPanel(self.window, "Freeze Frame Data")
+        for frame in frames.values():
+            source = frame.dtc or f"Frame {frame.frame}"
+            for name, value in frame.values.items():
+                panel.append(None, source, name, format_value(value), obd.commands[name].desc)
+        missing = [code for code in codes if code not in frames]
+        status = f"{len(frames)} freeze frame(s)"
+        panel.set_status(f"{status}; none for {', '.join(missing)}" if missing else status)
+        return False
+
+    def on_readiness(self, button):
+        """Handle readiness monitors button click"""
+        from mondeo import freeze
+
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
+            dialog.run()
+            return
+
+        self.progress_dialog = MondeoProgressDialog(
+            self.window,
+            "Reading Readiness",
+            "Reading readiness monitors..."
+        )
+        self.worker.submit(freeze.read_readiness, key="readiness", callback=self.on_readiness_done)
+
+    def on_readiness_done(self, future):
+        """Display readiness monitor status"""
+        from mondeo import freeze
+
+        try:
+            status = future.result()
+        except Exception as e:
+            return self.show_error(f"Error reading readiness monitors: {str(e)}")
+        if status is None:
+            return self.show_error("Readiness status not available.")
+        self.progress_dialog.destroy()
+
+        panel = MondeoResultsPanel(self.window, "Readiness Monitors")
+        for monitor in status.monitors:
+            panel.append(None, "Readiness", freeze.monitor_label(monitor.name),
+                         "complete" if monitor.complete else "incomplete", freeze.describe_monitor(monitor))
+        panel.set_status(f"MIL {'on' if status.mil else 'off'}, {status.dtc_count} DTC(s), "
+                         f"{status.ignition} ignition")
+        return False
+
+    def on_live_data(self, button):
+        """Handle live data button click"""
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
+            dialog.run()
+            return
 
+        self.live_dialog = MondeoLiveDataDialog(self.window, self.worker, lambda: self.recorder)
+
+    def on_dashboard(self, button):
+        """Handle dashboard button click"""
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
+            dialog.run()
+            return
+
+        # Takes over the worker's background stream from an open Live Data dialog
+        self.dashboard_dialog = MondeoDashboardDialog(self.window, self.worker, lambda: self.recorder)
+
+    def on_module_scan(self, button):
+        """Handle Ford module scan button click"""
+        from mondeo import ford
+
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
+            dialog.run()
+            return
+
+        panel = MondeoResultsPanel(self.window, "Ford Module Scan")
+        panel.set_status(f"Looking for {len(ford.MODULES)} modules...")
+
+        def scan(conn):
+            """Runs on the OBD worker; rows reach the panel as each reply arrives"""
+            # a short TesterPresent first, so only fitted modules get the full UDS/KWP timeouts
+            present = ford.discover_modules(conn)
+            for name, module in ford.MODULES.items():
+                if panel.closed:
+                    break
+                if name not in present:
+                    panel.append(None, name, "Not fitted or not reachable", "", module.description)
+                    continue
+                panel.set_status(f"Scanning {name} - {module.description}...")
+                dtcs = ford.read_module_dtcs(conn, name)
+                if self.history_session:
+                    self.history_session.record_module_dtcs(name, dtcs)
+                for dtc in dtcs:
+                    panel.append(time.time(), name, dtc.code, ford.describe_status(dtc.status), dtc.description)
+                values = ford.read_dids(conn, name, callback=lambda definition, value: panel.append(
+                    time.time(), definition.module, definition.name,
+                    ford.format_did(definition.name, value), definition.description))
+                if not dtcs and not values:
+                    panel.append(time.time(), name, "No response", "", module.description)
+
+        self.worker.submit(scan, key="module_scan", callback=lambda future: self.on_module_scan_done(future, panel))
+
+    def on_module_scan_done(self, future, panel):
+        """Report the end of a Ford module scan"""
+        try:
+            future.result()
+        except Exception as e:
+            panel.set_status(f"Scan failed: {str(e)}")
+            return False
+        panel.set_status("Scan complete")
         return False
 
+    def on_full_scan(self, button):
+        """Read DTCs from every fitted module and report the total scan time"""
+        from mondeo import ford
+
+        if not self.connection:
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Not Connected",
+                "Please connect to the vehicle first.",
+                "error"
+            )
+            dialog.run()
+            return
+
+        panel = MondeoResultsPanel(self.window, "Full Scan",
+                                   note="Modules that don't answer a short TesterPresent are skipped.")
+        panel.set_status(f"Looking for {len(ford.MODULES)} modules...")
+
+        def show(name, dtcs):
+            """Runs on the OBD worker as each module is read"""
+            if self.history_session:
+                self.history_session.record_module_dtcs(name, dtcs)
+            module = ford.MODULES[name]
+            panel.set_status(f"Read {name} - {module.description}")
+            for dtc in dtcs:
+                panel.append(time.time(), name, dtc.code, ford.describe_status(dtc.status), dtc.description)
+            if not dtcs:
+                panel.append(time.time(), name, "No trouble codes", "", module.description)
+
+        self.worker.submit(lambda conn: ford.full_scan(conn, callback=show), key="full_scan",
+                           callback=lambda future: self.on_full_scan_done(future, panel))
+
+    def on_full_scan_done(self, future, panel):
+        """Report the modules that weren't found and the total scan time"""
+        from mondeo import ford
+
+        try:
+            result = future.result()
+        except Exception as e:
+            panel.set_status(f"Scan failed: {str(e)}")
+            return False
+        for name in result.absent:
+            panel.append(None, name, "Not fitted or not reachable", "", ford.MODULES[name].description)
+        panel.set_status(f"{len(result.modules)} of {len(result.modules) + len(result.absent)} modules "
+                         f"answered, total scan time {result.elapsed:.2f} s")
+        return False
+
+    def on_dtc_lookup(self, button):
+        """Search DTC descriptions offline"""
+        MondeoDtcLookupDialog(self.window)
+
+    def on_stats(self, button):
+        """Show per-command latency histograms and export them for Prometheus"""
+        from mondeo import stats
+
+        snapshot = stats.registry.snapshot()
+        panel = MondeoResultsPanel(self.window, "Latency Stats",
+                                   note="Times in ms. read = adapter and ECU, decode = python-OBD, "
+                                        "search = protocol detection.")
+        for metric, label, histogram in snapshot:
+            panel.append(None, metric, label,
+                         f"p50 {histogram.percentile(50) * 1000:.2f}  p95 {histogram.percentile(95) * 1000:.2f}",
+                         f"{histogram.count} samples, mean {histogram.mean * 1000:.2f}, "
+                         f"max {histogram.maximum * 1000:.2f}")
+        try:
+            path = stats.write_prometheus()
+            panel.set_status(f"Prometheus metrics written to {path}")
+        except OSError as e:
+            panel.set_status(f"Could not write Prometheus metrics: {e}")
+
+    def on_record_toggled(self, button):
+        """Start or stop recording the session"""
+        if button.get_active():
+            from mondeo.recorder import SessionRecorder
+
+            self.recorder = SessionRecorder()
+            if self.history_session:
+                self.history_session.add_log(self.recorder.path)
+            button.set_label("Stop Recording")
+        elif self.recorder:
+            recorder, self.recorder = self.recorder, None
+            recorder.close()
+            button.set_label("Record Session")
+            dialog = MondeoDialogWindow(
+                self.window,
+                "Session Saved",
+                f"Session recorded to {recorder.path}",
+                "info"
+            )
+            dialog.run()
+
     def on_clear_codes(self, button):
         """Handle clear DTCs button click"""
         if not self.connection:
@@ -501,22 +1270,22 @@ class MondeoMainWindow:
                 "Clearing Diagnostic Trouble Codes..."
             )
 
-            def clear_worker():
-                try:
-                    response = self.connection.clear_dtc()
-                    GLib.idle_add(self.show_clear_results, response)
-                except Exception as e:
-                    GLib.idle_add(self.show_error, f"Error clearing DTCs: {str(e)}")
+            self.worker.submit(lambda conn: conn.clear_dtc(), key="clear_dtc", callback=self.on_clear_done)
 
-            thread = threading.Thread(target=clear_worker)
-            thread.daemon = True
-            thread.start()
+    def on_clear_done(self, future):
+        """Handle the result of a queued DTC clear"""
+        try:
+            response = future.result()
+        except Exception as e:
+            return self.show_error(f"Error clearing DTCs: {str(e)}")
+        return self.show_clear_results(response)
 
     def show_clear_results(self, response):
         """Display clear DTCs results"""
         self.progress_dialog.destroy()
 
         if response.is_successful():
+            self.poll_dtcs()  # turns the cleared codes into events
             dialog = MondeoDialogWindow(
                 self.window,
                 "DTCs Cleared",
@@ -551,14 +1320,8 @@ class MondeoMainWindow:
 
     def on_reconnect(self, button):
         """Handle reconnect button click"""
-        # Close existing connection
-        if self.connection:
-            try:
-                self.connection.close()
-            except:
-                pass
-            self.connection = None
-
+        # The queued connect closes the existing connection first
+        self.connection = None
         self.update_connection_status()
 
         # Show progress dialog
@@ -573,12 +1336,17 @@ class MondeoMainWindow:
 
     def on_exit(self, button):
         """Handle exit button click"""
-        # Close OBD connection
-        if self.connection:
-            try:
-                self.connection.close()
-            except:
-                pass
+        if self.dtc_poll_id:
+            GLib.source_remove(self.dtc_poll_id)
+        if self.recorder:
+            self.recorder.close()
+        if self.history_session:
+            self.history_session.end()
+        self.history.close()
+
+        # Close OBD connection and stop the worker
+        self.port_registry.stop()
+        self.worker.stop()
 
         Gtk.main_quit()
 
@@ -590,11 +1358,7 @@ def main():
         Gtk.main()
     except KeyboardInterrupt:
         print("\nExiting...")
-        if app.connection:
-            try:
-                app.connection.close()
-            except:
-                pass
+        app.worker.stop()
 
 if __name__ == "__main__":
     main()
@@ -3,12 +3,25 @@
 
 """
 Ford Mondeo Mk4 2007 TDCi Full Diagnostics Tool
+
+Headless entry point: never imports GTK. python-OBD (and Pint), NumPy and
+the feature modules are imported when first used, so the port list shows
+up immediately; check with `python -m mondeo.bench --startup-only`.
 """
 
-import obd
-import serial.tools.list_ports
 import os
-from time import sleep
+import sys
+import argparse
+import json
+import logging
+from mondeo import preload_obd
+from mondeo.probe import connect_fastest
+from mondeo.monitor import DtcMonitor, STORED, APPEARED, format_event
+from mondeo.health import HealthMonitor, LINK_LOST, keep_alive
+from mondeo.export import FORMATS
+from mondeo.ports import PortRegistry
+from mondeo import stats
+from time import sleep, monotonic, strftime, localtime
 
 # NerdFont Icons
 NF = {
@@ -20,11 +33,40 @@ NF = {
     "warning": "",
     "broom": "󰃢",
     "exit": "󰿅",
-    "reconnect": "󰴽"
+    "reconnect": "󰴽",
+    "gauge": "󰓅",
+    "record": "󰑊",
+    "module": "󰘚",
+    "monitor": "󰋽",
+    "freeze": "󰜗",
+    "readiness": "󰄬",
+    "stats": "󰄨"
 }
 
-# Set log level (change to DEBUG if you want verbose logs)
-obd.logger.setLevel(obd.logging.ERROR)
+# Use the asyncio transport (mondeo.aio) instead of python-OBD's serial I/O
+USE_ASYNC = False
+
+# ELM327 fast-mode profile (mondeo.connection): settings are verified, clones fall back
+FAST_MODE = True
+# Baud rate to switch the adapter to with ATBRD once connected (None = keep the probed one)
+FAST_BAUD = None
+
+# Seconds of raw samples decoded and written at a time (mondeo.decode), for
+# --live exports and Live Data recording
+DECODE_INTERVAL = 0.5
+
+# Prometheus text file written by the Latency Stats menu and on exit (--prometheus)
+PROMETHEUS_FILE = None
+
+# Seconds to wait for a recognisable adapter to be plugged in before
+# offering whatever ports there are (built-in, Bluetooth, no USB IDs)
+ADAPTER_WAIT = 10
+
+# Local session database (mondeo.history); None = the default location
+HISTORY_FILE = None
+
+# python-OBD log level (change to logging.DEBUG if you want verbose logs)
+OBD_LOG_LEVEL = logging.ERROR
 
 # === Utility ===
 def clear():
@@ -33,9 +75,100 @@ def clear():
 def pause():
     input(f"\n⏸️  Press Enter to continue...")
 
+# === Session Recording ===
+recorder = None  # active SessionRecorder, if recording is switched on
+
+def toggle_recording():
+    from mondeo.recorder import SessionRecorder
+
+    global recorder
+    if recorder:
+        recorder.close()
+        print(f"{NF['ok']} Session saved to {recorder.path}")
+        recorder = None
+    else:
+        recorder = SessionRecorder()
+        if history_session:
+            history_session.add_log(recorder.path)
+        print(f"{NF['record']} Recording to {recorder.path}")
+    pause()
+
+# === DTC Monitor ===
+# Remembers when each code was first seen across reads in this session
+dtc_monitor = DtcMonitor()
+
+def record_events(events):
+    if recorder:
+        for event in events:
+            if event.kind == APPEARED:
+                recorder.record_dtcs([(event.code, event.description)], event.first_seen)
+    if history_session and dtc_monitor.last_poll and not dtc_monitor.failed:
+        history_session.record_dtcs(dtc_monitor.active(), dtc_monitor.last_poll)
+
+# === Session History ===
+# Every connection is a session in the local database; writes are queued, never block
+history = None          # HistoryStore, opened in main()
+history_session = None  # the current connection's Session
+
+def begin_history(conn):
+    global history_session
+    if history is None:
+        return
+    if history_session:
+        history_session.end()
+    history_session = history.begin(conn, source="cli")
+
+def end_history():
+    global history_session
+    if history_session:
+        history_session.end()
+        history_session = None
+    if history:
+        history.close()
+
+def code_history(code, days=30):
+    started = monotonic()
+    cars = history.cars_with_code(code, days)
+    elapsed = monotonic() - started
+    period = f"in the last {days:g} days" if days else "ever"
+    if not cars:
+        print(f"{NF['ok']} No car reported {code.upper()} {period}.")
+    else:
+        print(f"{NF['check']} Cars that reported {code.upper()} {period}:")
+        for car in cars:
+            first = strftime("%Y-%m-%d %H:%M", localtime(car.first_seen))
+            last = strftime("%Y-%m-%d %H:%M", localtime(car.last_seen))
+            print(f"  {car.vin or 'Unknown VIN':<17}  {car.sessions:>4} session(s)  first {first}  last {last}")
+    print(f"({elapsed * 1000:.1f} ms)")
+    return 0
+
+# === DTC Lookup ===
+# Offline: the code database ships with the tool, no adapter needed
+def lookup_codes(query):
+    from mondeo import dtcdb
+
+    results = dtcdb.search(query)
+    if not results:
+        print(f"{NF['error']} No code matches '{query}'.")
+        return 1
+    for code, description in results:
+        print(f"  {code}  {description}")
+    return 0
+
+# === Link Health ===
+# Long-running loops heartbeat the adapter and reconnect on their own
+def print_health(event):
+    if event.kind == LINK_LOST:
+        print(f"\n{NF['error']} Lost the adapter on {event.port}, reconnecting...")
+    else:
+        print(f"{NF['ok']} Reconnected after {event.downtime:.1f} s")
+
 # === Serial Port Listing ===
+# Kept up to date by hotplug events (started in main()), so listing never rescans
+port_registry = None
+
 def list_serial_ports():
-    ports = serial.tools.list_ports.comports()
+    ports = port_registry.ports()
     if not ports:
         print(f"{NF['error']} No serial ports found.")
     else:
@@ -45,31 +178,41 @@ def list_serial_ports():
     return ports
 
 # === OBD Connection with port selection ===
-def connect():
+def connect(interactive=True):
+    # python-OBD loads in the background while ports are listed and chosen
+    loader = preload_obd(OBD_LOG_LEVEL)
     print(f"{NF['link']} Connecting to OBD-II...")
 
     ports = list_serial_ports()
+    if not port_registry.adapters() and interactive:
+        print(f"{NF['link']} Plug in the OBD-II adapter (waiting {ADAPTER_WAIT} s, Ctrl+C to skip)...")
+        try:
+            port_registry.wait_for_adapter(ADAPTER_WAIT)
+        except KeyboardInterrupt:
+            pass
+        ports = list_serial_ports()
     if not ports:
         return None
 
-    port = None
-    if len(ports) > 1:
+    candidates = port_registry.candidates()
+    if len(ports) > 1 and interactive:
         choice = input("Select serial port index or press Enter to auto-connect: ").strip()
         if choice.isdigit() and int(choice) < len(ports):
-            port = ports[int(choice)].device
-    else:
-        port = ports[0].device
+            candidates = [ports[int(choice)].device]
 
     try:
-        if port:
-            print(f"Trying port {port} ...")
-            conn = obd.OBD(port)  # connect to chosen port, default baudrate 9600
+        if len(candidates) == 1:
+            print(f"Trying port {candidates[0]} ...")
         else:
-            print("Auto-connecting...")
-            conn = obd.OBD()  # auto connect
+            print(f"Auto-connecting, probing {len(candidates)} ports...")
+        loader.join()
+        # probes all candidates in parallel
+        conn = connect_fastest(candidates, asynchronous=USE_ASYNC, fast_mode=FAST_MODE, fast_baud=FAST_BAUD)
 
-        if conn.is_connected():
+        if conn and conn.is_connected():
             print(f"{NF['ok']} Connected to {conn.port_name()}")
+            dtc_monitor.reset()  # maybe another car: its codes are all new
+            begin_history(conn)
             return conn
         else:
             print(f"{NF['error']} No connection. Check ignition and adapter.")
@@ -78,15 +221,121 @@ def connect():
 
     return None
 
+# === Fleet Scan (non-interactive) ===
+def fleet_scan(as_json=False):
+    from mondeo.fleet import scan_fleet, format_report
+
+    preload_obd(OBD_LOG_LEVEL).join()
+    ports = port_registry.candidates()
+    if not ports:
+        print(f"{NF['error']} No serial ports found.")
+        return 1
+    if not as_json:
+        print(f"{NF['link']} Scanning {len(ports)} ports for vehicles...")
+    report = scan_fleet(ports)
+    if as_json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+    else:
+        print(format_report(report))
+    return 0 if report["vehicles"] else 1
+
+# === Export (non-interactive) ===
+def export(fmt, output=None, dtcs=True, live=None):
+    from contextlib import redirect_stdout
+    from mondeo.decode import RawBatch
+    from mondeo.export import open_writer, dtc_record, batch_records
+    from mondeo.stream import PidStream
+
+    # records may be going to stdout, so progress goes to stderr
+    with redirect_stdout(sys.stderr):
+        conn = connect(interactive=False)
+    if not conn:
+        return 1
+
+    port = conn.port_name()
+    try:
+        writer = open_writer(fmt, output)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"{NF['error']} {e}", file=sys.stderr)
+        conn.close()
+        return 1
+
+    with writer:
+        if dtcs:
+            record_events(dtc_monitor.poll(conn))
+            for dtc in dtc_monitor.active():
+                writer.write(dtc_record(dtc.code, dtc.description, dtc.status, dtc_monitor.last_poll,
+                                        dtc.first_seen, port))
+        if live is not None:
+            # raw data bytes collected and decoded a batch at a time (mondeo.decode)
+            stream = PidStream(conn, raw=True)
+            batch = RawBatch()
+            deadline = monotonic() + live if live else None
+            last_decode = monotonic()
+            try:
+                for sample in stream:
+                    batch.add(sample)
+                    if monotonic() - last_decode >= DECODE_INTERVAL:
+                        last_decode = monotonic()
+                        for record in batch_records(batch.decode(), port):
+                            writer.write(record)
+                    if deadline and monotonic() >= deadline:
+                        stream.stop()
+            except KeyboardInterrupt:
+                stream.stop()
+            for record in batch_records(batch.decode(), port):
+                writer.write(record)
+    conn.close()
+    print(f"{NF['ok']} Exported {writer.records} records", file=sys.stderr)
+    return 0
+
+def bus_monitor(seconds=0):
+    """Print every reassembled CAN message on the bus (ATMA) for `seconds` (0 = until Ctrl+C)"""
+    from contextlib import redirect_stdout
+    from mondeo.isotp import BusMonitor
+
+    with redirect_stdout(sys.stderr):
+        conn = connect(interactive=False)
+    if not conn:
+        return 1
+
+    monitor = BusMonitor(conn)
+    try:
+        monitor.start()
+    except RuntimeError as e:
+        print(f"{NF['error']} {e}", file=sys.stderr)
+        conn.close()
+        return 1
+    print(f"{NF['gauge']} Monitoring the bus (Ctrl+C to stop)", file=sys.stderr)
+    try:
+        for message in monitor.messages(timeout=seconds or None):
+            stamp = strftime("%H:%M:%S", localtime(message.time)) + f".{int(message.time * 1000) % 1000:03d}"
+            print(f"{stamp} {message.can_id:03X} {message.data.hex(' ').upper()}")
+    except KeyboardInterrupt:
+        pass
+    monitor.stop()
+    conn.close()
+    print(f"{NF['ok']} {monitor.received} frames at {monitor.rate():.0f} frames/s, "
+          f"{monitor.reassembler.errors} incomplete messages, {monitor.overflows} adapter overflows",
+          file=sys.stderr)
+    return 0
+
 # === Diagnostics ===
 def read_codes(conn):
     if conn:
         print(f"{NF['check']} Reading Diagnostic Trouble Codes...")
-        codes = conn.get_dtc()
-        if codes and codes.value:
+        events = dtc_monitor.poll(conn)
+        record_events(events)
+        new = {event.code for event in events if event.kind == APPEARED and event.status == STORED}
+        codes = dtc_monitor.active(STORED)
+        if dtc_monitor.failed:
+            print(f"{NF['error']} No response from the ECU. Check ignition and adapter.")
+        elif codes:
             print(f"{NF['warning']} Active DTCs:")
-            for code, desc in codes.value:
-                print(f"  {NF['error']} {code}: {desc}")
+            for dtc in codes:
+                first_seen = strftime("%H:%M:%S", localtime(dtc.first_seen))
+                marker = "new" if dtc.code in new else f"since {first_seen}"
+                print(f"  {NF['error']} {dtc.code}: {dtc.description} ({marker})")
         else:
             print(f"{NF['ok']} No trouble codes detected.")
     else:
@@ -99,31 +348,243 @@ def clear_codes(conn):
         response = conn.clear_dtc()
         if response.is_successful():
             print(f"{NF['ok']} DTCs cleared!")
+            dtc_monitor.poll(conn)
         else:
             print(f"{NF['error']} Failed to clear DTCs.")
     else:
         print(f"{NF['error']} Not connected.")
     pause()
 
+def freeze_frames(conn):
+    from mondeo import freeze
+    from mondeo.stream import format_value
+
+    if conn:
+        print(f"{NF['freeze']} Reading freeze frames...")
+        record_events(dtc_monitor.poll(conn))
+        codes = [dtc.code for dtc in dtc_monitor.active(STORED)]
+        frames = freeze.read_freeze_frames(conn, codes)
+        if history_session and frames:
+            history_session.record_freeze(frames)
+        if not frames:
+            print(f"{NF['ok']} No freeze frame stored.")
+        for frame in frames.values():
+            print(f"\n  {NF['error']} Frame {frame.frame}, stored by {frame.dtc or 'unknown code'}")
+            for name, value in frame.values.items():
+                print(f"    {name:<28} {format_value(value)}")
+        missing = [code for code in codes if code not in frames]
+        if frames and missing:
+            print(f"\n  {NF['warning']} No freeze frame for {', '.join(missing)}")
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+
+def readiness(conn):
+    from mondeo import freeze
+
+    if conn:
+        print(f"{NF['readiness']} Reading readiness monitors...")
+        status = freeze.read_readiness(conn)
+        if status:
+            print(f"  MIL {'on' if status.mil else 'off'}, {status.dtc_count} DTC(s),"
+                  f" {status.ignition} ignition\n")
+            for monitor in status.monitors:
+                icon = NF['ok'] if monitor.complete else NF['warning']
+                print(f"  {icon} {freeze.monitor_label(monitor.name):<24} {freeze.describe_monitor(monitor)}")
+        else:
+            print(f"{NF['error']} Readiness status not available.")
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+
+def monitor_codes(conn):
+    """Returns the connection to use afterwards (a new one if the link was restored)"""
+    if conn:
+        health = HealthMonitor()
+        print(f"{NF['monitor']} Watching DTCs every {dtc_monitor.interval:g} s (Ctrl+C to stop)\n")
+        for dtc in dtc_monitor.active():
+            first_seen = strftime("%H:%M:%S", localtime(dtc.first_seen))
+            print(f"  {NF['warning']} {dtc.code} ({dtc.status}) since {first_seen}: {dtc.description}")
+        try:
+            for event in keep_alive(conn, dtc_monitor.watch, health, print_health):
+                if event is None:
+                    continue  # a tick between polls
+                record_events([event])
+                icon = NF['error'] if event.kind == APPEARED else NF['ok']
+                print(f"  {icon} {format_event(event)}")
+        except KeyboardInterrupt:
+            dtc_monitor.stop()
+        print(f"\n{NF['ok']} {dtc_monitor.polls} polls, {len(dtc_monitor.active())} codes active")
+        conn = health.connection or conn
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+    return conn
+
+def live_data(conn):
+    """Returns the connection to use afterwards (a new one if the link was restored)"""
+    from mondeo.decode import RawBatch, format_reading, unit_symbol
+    from mondeo.stream import PidStream
+
+    if conn:
+        # raw replies, decoded in bulk every DECODE_INTERVAL for the screen and the recording
+        stream = PidStream(conn, raw=True)
+        batch = RawBatch()
+        health = HealthMonitor()
+        latest = {}
+        last_draw = 0
+
+        def decode():
+            for name, (times, values) in batch.decode().items():
+                latest[name] = values[-1]
+                if recorder:
+                    recorder.extend(name, times, values, unit_symbol(name))
+
+        try:
+            # recorded samples and the latest values survive a reconnect
+            for sample in keep_alive(conn, stream.restart, health, print_health):
+                batch.add(sample)
+                if monotonic() - last_draw >= DECODE_INTERVAL:
+                    last_draw = monotonic()
+                    decode()
+                    clear()
+                    print(f"{NF['gauge']} Live Data (Ctrl+C to stop)\n")
+                    for name, value in latest.items():
+                        print(f"  {name:<28} {format_reading(name, value)}")
+                    print(f"\n  {stream.rate():.1f} samples/s, {stream.requests} requests")
+        except KeyboardInterrupt:
+            stream.stop()
+        decode()
+        if recorder:
+            recorder.flush()
+        print(f"\n{NF['ok']} {stream.samples} samples at {stream.rate():.1f} samples/s")
+        conn = health.connection or conn
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+    return conn
+
+def module_scan(conn):
+    from mondeo import ford
+
+    if conn:
+        # a short TesterPresent first, so only fitted modules get the full UDS/KWP timeouts
+        present = ford.discover_modules(conn)
+        for name, module in ford.MODULES.items():
+            print(f"{NF['module']} {name} - {module.description} ({module.request_id:03X})")
+            if name not in present:
+                print(f"  {NF['warning']} Not fitted or not reachable.\n")
+                continue
+            result = ford.scan_module(conn, name)
+            if history_session:
+                history_session.record_module_dtcs(name, result["dtcs"])
+            if not result["dtcs"] and not result["dids"]:
+                print(f"  {NF['warning']} No response.\n")
+                continue
+            if result["dtcs"]:
+                for dtc in result["dtcs"]:
+                    print(f"  {NF['error']} {dtc.code}: {dtc.description} ({ford.describe_status(dtc.status)})")
+            else:
+                print(f"  {NF['ok']} No trouble codes stored.")
+            for did_name, value in result["dids"].items():
+                print(f"    {did_name:<28} {ford.format_did(did_name, value)}")
+            print()
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+
+def full_scan(conn):
+    from mondeo import ford
+
+    def show(name, dtcs):
+        if history_session:
+            history_session.record_module_dtcs(name, dtcs)
+        module = ford.MODULES[name]
+        print(f"{NF['module']} {name} - {module.description} ({module.request_id:03X})")
+        for dtc in dtcs:
+            print(f"  {NF['error']} {dtc.code}: {dtc.description} ({ford.describe_status(dtc.status)})")
+        if not dtcs:
+            print(f"  {NF['ok']} No trouble codes stored.")
+        print()
+
+    if conn:
+        print(f"{NF['check']} Scanning all {len(ford.MODULES)} modules...\n")
+        result = ford.full_scan(conn, callback=show)
+        if result.absent:
+            print(f"{NF['warning']} Not fitted or not reachable: {', '.join(result.absent)}")
+        codes = sum(len(dtcs) for dtcs in result.modules.values())
+        print(f"{NF['ok']} {len(result.modules)} modules answered, {codes} trouble codes, "
+              f"total scan time {result.elapsed:.2f} s")
+    else:
+        print(f"{NF['error']} Not connected.")
+    pause()
+
 # === Menu ===
+def write_prometheus(path):
+    try:
+        stats.write_prometheus(path)
+        print(f"{NF['ok']} Prometheus metrics written to {path}", file=sys.stderr)
+    except OSError as e:
+        print(f"{NF['error']} Could not write {path}: {e}", file=sys.stderr)
+
+
+def show_stats():
+    print(f"{NF['stats']} Command latency since start\n")
+    print(stats.format_table())
+    default = PROMETHEUS_FILE or stats.PROMETHEUS_FILE
+    answer = input(f"\nWrite Prometheus metrics to {default}? [y/N/other path]: ").strip()
+    if answer.lower() in ("y", "yes"):
+        write_prometheus(default)
+    elif answer and answer.lower() not in ("n", "no"):
+        write_prometheus(answer)
+    pause()
+
+
 def menu(conn):
     while True:
         clear()
         print(f"{NF['car']} Ford Mondeo Mk4 1.8 TDCi Diagnostics\n")
-        print(f"{NF['link']} Connection: {'Connected' if conn and conn.is_connected() else '❌ Not Connected'}\n")
+        print(f"{NF['link']} Connection: {'Connected' if conn and conn.is_connected() else '❌ Not Connected'}")
+        print(f"{NF['record']} Recording: {'On' if recorder else 'Off'}\n")
         print(f"1. {NF['check']}  Read DTCs")
         print(f"2. {NF['broom']}  Clear DTCs")
-        print(f"3. {NF['reconnect']}  Reconnect")
-        print(f"4. {NF['exit']}  Exit\n")
+        print(f"3. {NF['freeze']}  Freeze Frame Data")
+        print(f"4. {NF['readiness']}  Readiness Monitors")
+        print(f"5. {NF['gauge']}  Live Data")
+        print(f"6. {NF['monitor']}  DTC Monitor")
+        print(f"7. {NF['module']}  Ford Module Scan")
+        print(f"8. {NF['check']}  Full Scan")
+        print(f"9. {NF['record']}  Start/Stop Recording")
+        print(f"10. {NF['stats']} Latency Stats")
+        print(f"11. {NF['reconnect']} Reconnect")
+        print(f"12. {NF['exit']} Exit\n")
 
-        choice = input("Choose an option (1–4): ").strip()
+        choice = input("Choose an option (1–12): ").strip()
         if choice == '1':
             read_codes(conn)
         elif choice == '2':
             clear_codes(conn)
         elif choice == '3':
-            conn = connect()
+            freeze_frames(conn)
         elif choice == '4':
+            readiness(conn)
+        elif choice == '5':
+            conn = live_data(conn)
+        elif choice == '6':
+            conn = monitor_codes(conn)
+        elif choice == '7':
+            module_scan(conn)
+        elif choice == '8':
+            full_scan(conn)
+        elif choice == '9':
+            toggle_recording()
+        elif choice == '10':
+            show_stats()
+        elif choice == '11':
+            conn = connect()
+        elif choice == '12':
+            if recorder:
+                recorder.close()
             print(f"{NF['exit']} Exiting. Drive safe!")
             break
         else:
@@ -131,7 +592,78 @@ def menu(conn):
             pause()
 
 # === Start ===
+def main():
+    global USE_ASYNC, FAST_MODE, FAST_BAUD, PROMETHEUS_FILE, port_registry, history
+
+    parser = argparse.ArgumentParser(description="Ford Mondeo Mk4 TDCi Diagnostics")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="drive the adapter with the asyncio transport")
+    parser.add_argument("--no-fast", action="store_true",
+                        help="keep the adapter's default timing (no ELM327 fast-mode settings)")
+    parser.add_argument("--fast-baud", type=int, metavar="BAUD",
+                        help="switch the adapter to BAUD with ATBRD after connecting (e.g. 115200)")
+    parser.add_argument("--fleet", action="store_true",
+                        help="scan every connected vehicle in parallel, print a report and exit")
+    parser.add_argument("--json", action="store_true", help="print the fleet report as JSON")
+    parser.add_argument("--export", choices=FORMATS,
+                        help="connect without prompting, write DTCs (and --live samples) as records and exit")
+    parser.add_argument("--output", help="export file (default: stdout; required for parquet)")
+    parser.add_argument("--live", type=float, metavar="SECONDS",
+                        help="with --export, stream live data for SECONDS (0 = until Ctrl+C)")
+    parser.add_argument("--no-dtcs", action="store_true", help="with --export, skip reading DTCs")
+    parser.add_argument("--monitor", type=float, metavar="SECONDS",
+                        help="connect without prompting, print all CAN traffic (ATMA) for SECONDS (0 = until Ctrl+C)")
+    parser.add_argument("--dtc-interval", type=float, default=dtc_monitor.interval,
+                        help="seconds between DTC monitor polls")
+    parser.add_argument("--history", metavar="CODE",
+                        help="list the cars that reported CODE (see --days) from the session history and exit")
+    parser.add_argument("--days", type=float, default=30,
+                        help="with --history, how far back to look (0 = all sessions)")
+    parser.add_argument("--lookup", metavar="TEXT",
+                        help="search the offline DTC database by code prefix or words and exit")
+    parser.add_argument("--list-ports", action="store_true", help="list the serial ports and exit")
+    parser.add_argument("--history-file", default=HISTORY_FILE, help="session history database")
+    parser.add_argument("--no-history", action="store_true", help="don't record this session")
+    parser.add_argument("--stats", action="store_true",
+                        help="print per-command latency stats to stderr on exit")
+    parser.add_argument("--prometheus", metavar="FILE",
+                        help="write latency histograms in Prometheus text format to FILE on exit")
+    args = parser.parse_args()
+    if args.lookup:
+        raise SystemExit(lookup_codes(args.lookup))
+    USE_ASYNC = args.use_async
+    FAST_MODE = not args.no_fast
+    FAST_BAUD = args.fast_baud
+    PROMETHEUS_FILE = args.prometheus
+    dtc_monitor.interval = args.dtc_interval
+    port_registry = PortRegistry()
+    if args.list_ports:
+        raise SystemExit(0 if list_serial_ports() else 1)
+    if not args.no_history or args.history:
+        from mondeo.history import HistoryStore, HISTORY_FILE as DEFAULT_HISTORY_FILE
+
+        history = HistoryStore(args.history_file or DEFAULT_HISTORY_FILE)
+
+    try:
+        if args.history:
+            raise SystemExit(code_history(args.history, args.days or None))
+        if args.fleet:
+            raise SystemExit(fleet_scan(args.json))
+        if args.monitor is not None:
+            raise SystemExit(bus_monitor(args.monitor))
+        if args.export:
+            raise SystemExit(export(args.export, args.output, not args.no_dtcs, args.live))
+
+        port_registry.start()
+        connection = connect()
+        menu(connection)
+    finally:
+        end_history()
+        if args.stats:
+            print(stats.format_table(), file=sys.stderr)
+        if PROMETHEUS_FILE:
+            write_prometheus(PROMETHEUS_FILE)
+
 if __name__ == "__main__":
-    connection = connect()
-    menu(connection)
+    main()
 
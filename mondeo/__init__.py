@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+"""
+Shared diagnostics engine used by both the CLI (main.py) and GTK GUI (main-gui.py)
+
+Modules that need python-OBD import it themselves, so importing the
+package stays cheap; python-OBD builds Pint's unit registry on import,
+which is most of the tool's startup time.
+"""
+
+import logging
+import threading
+
+_obd_loader = None
+_obd_loader_lock = threading.Lock()
+
+
+def preload_obd(log_level=logging.ERROR):
+    """
+    Import python-OBD on a background thread and set its log level.
+
+    Returns the loader thread; join() it before connecting so python-OBD's
+    own logger setup can't override `log_level`. Calling it again returns
+    the same thread.
+    """
+    global _obd_loader
+
+    def load():
+        import obd
+        obd.logger.setLevel(log_level)
+
+    with _obd_loader_lock:
+        if _obd_loader is None:
+            _obd_loader = threading.Thread(target=load, name="obd-preload", daemon=True)
+            _obd_loader.start()
+        return _obd_loader
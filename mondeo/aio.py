@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+"""
+asyncio ELM327 transport
+
+AsyncElm327 drives an adapter straight from the serial (or pty) file
+descriptor with loop.add_reader, so one event loop can run any number of
+adapters and streams without a thread per operation. Commands are queued
+and the next one is written the moment the '>' prompt for the previous one
+arrives. Every command has a deadline, counted from when it is queued;
+when it expires, or the awaiting task is cancelled, the ELM is
+interrupted with a single character (it answers "STOPPED" and prompts
+again) and the queue moves on. No prompt within INTERRUPT_GRACE of the
+interrupt fails every queued command: the adapter has gone silent.
+
+    async def scan(ports):
+        adapters = [AsyncElm327(port) for port in ports]
+        await asyncio.gather(*(a.open() for a in adapters))
+        return await asyncio.gather(*(a.query(obd.commands.GET_DTC) for a in adapters))
+
+SyncConnection wraps an AsyncElm327 running on a shared background loop
+with the blocking get_dtc()/clear_dtc() interface of MondeoOBD, so
+read_codes/clear_codes work unchanged on top of it. Like python-OBD, it
+answers a silent or unplugged adapter with null responses, not exceptions.
+"""
+
+import asyncio
+import os
+import termios
+import threading
+import time
+import tty
+from collections import deque
+
+import obd
+from obd.elm327 import ELM327
+
+from mondeo import stats
+from mondeo.connection import FAST_SETTINGS, READ_TIMEOUT, ClearResponse
+
+DEFAULT_TIMEOUT = 1.0
+RESET_TIMEOUT = 2.0
+SEARCH_TIMEOUT = 6.0
+INTERRUPT_GRACE = 0.5  # seconds for the ELM's prompt after an interrupt; none means it's gone
+
+_BAUD_CONSTANTS = {
+    9600: termios.B9600, 19200: termios.B19200, 38400: termios.B38400,
+    57600: termios.B57600, 115200: termios.B115200, 230400: termios.B230400,
+}
+
+
+class _Request:
+    def __init__(self, cmd, future, timeout):
+        self.cmd = cmd
+        self.future = future
+        self.timeout = timeout
+        self.timer = None
+        self.sent = None  # perf_counter() when written
+
+
+class AsyncElm327:
+    """
+    Pipelined ELM327 command channel on an asyncio event loop. `fast_mode`
+    applies the fast-mode settings the adapter accepts (see MondeoOBD).
+    """
+
+    def __init__(self, port, baudrate=38400, protocol=None, fast_mode=False):
+        self.port = port
+        self.baudrate = baudrate
+        self.requested_protocol = protocol
+        self.fast_mode = fast_mode
+        self.fast_settings = []  # settings the adapter accepted
+        self.protocol = None  # python-OBD protocol parser, set by open()
+        self.supported_commands = set(obd.commands.base_commands())
+        self._fd = None
+        self._loop = None
+        self._buffer = bytearray()
+        self._queue = deque()
+        self._current = None
+        self._grace = None  # timer failing everything if an interrupt gets no prompt
+
+    # ---------------------------------------------------------------- setup
+
+    async def open(self):
+        """Open the port, initialise the ELM and detect the car's protocol"""
+        self._loop = asyncio.get_running_loop()
+        self._fd = os.open(self.port, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        tty.setraw(self._fd)
+        if self.baudrate in _BAUD_CONSTANTS:
+            attrs = termios.tcgetattr(self._fd)
+            attrs[4] = attrs[5] = _BAUD_CONSTANTS[self.baudrate]
+            termios.tcsetattr(self._fd, termios.TCSANOW, attrs)
+        self._loop.add_reader(self._fd, self._on_readable)
+
+        await self.command(b"ATZ", RESET_TIMEOUT)
+        for cmd in (b"ATE0", b"ATL0", b"ATH1"):
+            await self.command(cmd)
+        if self.fast_mode:
+            await self._tune()
+
+        protocol = self.requested_protocol or "0"
+        await self.command(b"ATSP" + protocol.encode())
+        lines = await self.command(b"0100", SEARCH_TIMEOUT)
+        if not any("41 00" in line or "4100" in line for line in lines):
+            raise ConnectionError(f"No response from the car on {self.port}")
+
+        dpn = (await self.command(b"ATDPN"))[0].lstrip("A")
+        if dpn not in ELM327._SUPPORTED_PROTOCOLS:
+            raise ConnectionError(f"Unsupported protocol {dpn!r} on {self.port}")
+        self.protocol = ELM327._SUPPORTED_PROTOCOLS[dpn](lines)
+        await self._load_commands()
+        return self
+
+    async def _tune(self):
+        for alternatives in FAST_SETTINGS:
+            for cmd in alternatives:
+                if any("OK" in line for line in await self.command(cmd)):
+                    self.fast_settings.append(cmd)
+                    break
+
+    async def _load_commands(self):
+        """Supported-PID scan, as python-OBD does on connect"""
+        for getter in obd.commands.pid_getters():
+            if getter not in self.supported_commands:
+                continue
+            response = await self.query(getter)
+            if response.is_null():
+                continue
+            for i, bit in enumerate(response.value):
+                pid = getter.pid + i + 1
+                if bit and obd.commands.has_pid(getter.mode, pid):
+                    self.supported_commands.add(obd.commands[getter.mode][pid])
+                if bit and getter.mode == 1 and obd.commands.has_pid(2, pid):
+                    self.supported_commands.add(obd.commands[2][pid])
+
+    def close(self):
+        if self._fd is None:
+            return
+        self._loop.remove_reader(self._fd)
+        os.close(self._fd)
+        self._fd = None
+        self._fail_all(ConnectionError("Adapter closed"))
+
+    # ------------------------------------------------------------- commands
+
+    def command(self, cmd, timeout=DEFAULT_TIMEOUT):
+        """Queue a raw command; returns a future resolving to the response lines"""
+        future = self._loop.create_future()
+        if self._fd is None:
+            future.set_exception(ConnectionError("Adapter not open"))
+            return future
+        request = _Request(cmd, future, timeout)
+        future.add_done_callback(lambda f: self._on_done(request))
+        # the deadline runs from here, so a command stuck behind a silent one times out too
+        request.timer = self._loop.call_later(timeout, self._expire, request)
+        self._queue.append(request)
+        self._send_next()
+        return future
+
+    async def query(self, cmd, timeout=DEFAULT_TIMEOUT):
+        """Send an OBDCommand and decode the response with python-OBD"""
+        lines = await self.command(cmd.command, timeout)
+        started = time.perf_counter()
+        messages = self.protocol(lines) if self.protocol else []
+        if not messages:
+            return obd.OBDResponse()
+        response = cmd(messages)
+        stats.observe("decode", stats.command_label(cmd.command), time.perf_counter() - started)
+        return response
+
+    async def send_raw(self, cmd_string, timeout=DEFAULT_TIMEOUT):
+        """Send a raw OBD request, returns parsed Messages"""
+        lines = await self.command(cmd_string, timeout)
+        return self.protocol(lines) if self.protocol else []
+
+    # ------------------------------------------------------------ internals
+
+    def _send_next(self):
+        while self._current is None and self._queue:
+            request = self._queue.popleft()
+            if request.future.done():
+                continue  # cancelled while queued
+            started = time.perf_counter()
+            try:
+                os.write(self._fd, request.cmd + b"\r")
+            except OSError as e:
+                request.future.set_exception(e)
+                continue
+            request.sent = time.perf_counter()
+            stats.observe("write", stats.command_label(request.cmd), request.sent - started)
+            self._current = request
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, 4096)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._fail_all(e)
+            return
+        if not data:
+            self._fail_all(ConnectionError("Adapter disconnected"))
+            return
+
+        self._buffer.extend(data)
+        while b">" in self._buffer:
+            end = self._buffer.index(b">")
+            chunk = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            self._complete(chunk)
+
+    def _complete(self, chunk):
+        request, self._current = self._current, None
+        if self._grace:
+            self._grace.cancel()
+            self._grace = None
+        if request is not None:
+            if not request.future.done():
+                text = chunk.replace(b"\x00", b"").decode("utf-8", "ignore")
+                lines = [line.strip() for line in text.replace("\n", "\r").split("\r") if line.strip()]
+                label, elapsed = stats.command_label(request.cmd), time.perf_counter() - request.sent
+                stats.observe("read", label, elapsed)
+                if any("SEARCHING" in line for line in lines):
+                    stats.observe("search", label, elapsed)
+                request.future.set_result(lines)
+        self._send_next()
+
+    def _expire(self, request):
+        if not request.future.done():
+            request.future.set_exception(asyncio.TimeoutError(f"{request.cmd!r} timed out"))
+
+    def _on_done(self, request):
+        request.timer.cancel()
+        # timed out or cancelled while on the wire: interrupt the ELM, whose
+        # "STOPPED" prompt then completes this request and frees the line.
+        # An adapter that doesn't even prompt after that has gone silent.
+        if request is self._current and (request.future.cancelled() or request.future.exception()):
+            try:
+                os.write(self._fd, b" ")
+            except OSError:
+                pass
+            if self._grace is None:
+                self._grace = self._loop.call_later(INTERRUPT_GRACE, self._fail_all,
+                                                    ConnectionError("Adapter stopped answering"))
+
+    def _fail_all(self, error):
+        if self._grace:
+            self._grace.cancel()
+            self._grace = None
+        requests = list(self._queue)
+        if self._current:
+            requests.append(self._current)
+        self._queue.clear()
+        self._current = None
+        for request in requests:
+            if request.timer:
+                request.timer.cancel()
+            if not request.future.done():
+                request.future.set_exception(error)
+
+
+# ------------------------------------------------------------------ facade
+
+_shared_loop = None
+_shared_lock = threading.Lock()
+
+
+def shared_loop():
+    """Event loop running on a background thread, shared by all SyncConnections"""
+    global _shared_loop
+    with _shared_lock:
+        if _shared_loop is None:
+            _shared_loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_shared_loop.run_forever, name="obd-asyncio", daemon=True)
+            thread.start()
+        return _shared_loop
+
+
+class SyncConnection:
+    """Blocking MondeoOBD-style facade over an AsyncElm327"""
+
+    def __init__(self, port, baudrate=38400, protocol=None, fast_mode=False):
+        self.baudrate = baudrate
+        self.fast_mode = fast_mode
+        self.adapter = AsyncElm327(port, baudrate, protocol, fast_mode)
+        self._connected = False
+        try:
+            self._run(self.adapter.open())
+            self._connected = True
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            self.close()
+
+    def _run(self, coro, timeout=None):
+        return asyncio.run_coroutine_threadsafe(coro, shared_loop()).result(timeout)
+
+    def _request(self, coro, default):
+        """
+        Run one request. A silent or vanished adapter gives `default` and
+        leaves the connection marked as not connected, where python-OBD
+        would return a null response too, instead of raising.
+        """
+        try:
+            return self._run(coro)
+        except (OSError, ConnectionError, asyncio.TimeoutError):
+            self._connected = False
+            return default
+
+    @property
+    def fast_settings(self):
+        return self.adapter.fast_settings
+
+    @property
+    def supported_commands(self):
+        return self.adapter.supported_commands
+
+    def is_connected(self):
+        return self._connected
+
+    def port_name(self):
+        return self.adapter.port
+
+    def protocol_id(self):
+        return self.adapter.protocol.ELM_ID if self.adapter.protocol else ""
+
+    def supports(self, cmd):
+        return cmd in self.adapter.supported_commands
+
+    def query(self, cmd, force=False):
+        if not self._connected or (not force and not self.supports(cmd)):
+            return obd.OBDResponse()
+        return self._request(self.adapter.query(cmd), obd.OBDResponse())
+
+    def heartbeat(self):
+        """Adapter voltage (ATRV), or None; a silent adapter is given READ_TIMEOUT"""
+        if not self._connected:
+            return None
+        response = self._request(self.adapter.query(obd.commands.ELM_VOLTAGE, READ_TIMEOUT),
+                                 obd.OBDResponse())
+        return None if response.is_null() else response.value
+
+    def send_raw(self, cmd_string):
+        if not self._connected:
+            return []
+        return self._request(self.adapter.send_raw(cmd_string), [])
+
+    def command(self, cmd_string):
+        """Send a command, returns the adapter's output lines unparsed"""
+        if not self._connected:
+            return []
+        return self._request(self._command(cmd_string), [])
+
+    async def _command(self, cmd_string):
+        # AsyncElm327.command() creates its future on the running loop, so
+        # it has to be called there, not on the caller's thread
+        return await self.adapter.command(cmd_string)
+
+    def get_dtc(self):
+        """Read stored DTCs (mode 03)"""
+        return self.query(obd.commands.GET_DTC)
+
+    def clear_dtc(self):
+        """Clear DTCs and freeze-frame data (mode 04)"""
+        response = self.query(obd.commands.CLEAR_DTC)
+        return ClearResponse(response.command, response.messages)
+
+    def close(self):
+        self._connected = False
+        shared_loop().call_soon_threadsafe(self.adapter.close)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks against the simulated adapter
+
+Measures p50/p95/p99 latency of a cold connect, a warm reconnect (cached
+adapter profile) and a get_dtc() round trip, plus PID polling throughput,
+with and without the ELM327 fast-mode profile (against a simulator that
+models the adapter's response timeout), and per-response python-OBD
+decoding against bulk NumPy decoding of the same raw replies.
+Latencies are measured twice: called directly the way main.py does, and
+through the shared ObdWorker with the result handed back to a main loop
+the way MondeoMainWindow does. Results are written as JSON, by default to
+bench.json in the tool's cache directory, so runs can be compared release
+to release.
+
+The startup benchmark runs the entry points under `python -X importtime`,
+the CLI up to its first port listing (the point where connect() starts
+preloading python-OBD), and fails if the headless CLI loads python-OBD,
+Pint, NumPy, pandas or GTK before a connection is made.
+
+    python -m mondeo.bench --out bench.json
+    python -m mondeo.bench --startup-only
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import obd
+
+from mondeo import profiles
+from mondeo.decode import RawBatch
+from mondeo.probe import connect_fastest
+from mondeo.simulator import SimulatedElm327
+from mondeo.stream import PidStream, DEFAULT_SCHEDULE, MAX_BATCH, RawSample, split_pids, split_raw
+from mondeo.worker import ObdWorker
+
+obd.logger.setLevel(obd.logging.ERROR)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Interpreter arguments for each startup path
+STARTUP_TARGETS = {
+    "cli": ["main.py", "--list-ports"],  # argument parsing, port scan and listing
+    "gui_engine": ["-c", "import mondeo.probe, mondeo.worker"],  # main-gui.py minus GTK
+}
+# Must not be imported until a connection is made
+DEFERRED_MODULES = ("obd", "pint", "numpy", "pandas", "gi")
+# Next to the adapter profiles, not in whatever directory the benchmark runs from
+RESULTS_FILE = os.path.join(profiles.CACHE_DIR, "bench.json")
+
+
+def summarize(samples):
+    """p50/p95/p99 in milliseconds"""
+    ms = np.asarray(samples) * 1000.0
+    return {
+        "n": len(ms),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+    }
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+class WorkerPath:
+    """GUI-style execution: jobs queued on an ObdWorker, results posted back to a main loop queue"""
+
+    def __init__(self):
+        self.results = queue.Queue()
+        # the queue stands in for GLib.idle_add and the GTK main loop
+        self.worker = ObdWorker(dispatch=lambda callback, future: self.results.put(future))
+
+    def call(self, func):
+        self.worker.submit(lambda connection: func(), callback=lambda future: None)
+        return self.results.get().result()
+
+    def close(self):
+        self.worker.stop()
+
+
+def bench_latency(port, runs, connect_runs, call):
+    """Connect/reconnect/DTC latencies with every operation run through `call`"""
+    def cold():
+        profiles.forget_profile(port)
+        conn = call(lambda: connect_fastest([port]))
+        conn.close()
+
+    def warm():
+        conn = call(lambda: connect_fastest([port]))
+        conn.close()
+
+    results = {"cold_connect": summarize(timed(cold, connect_runs))}
+
+    connect_fastest([port]).close()  # prime the profile cache
+    results["warm_reconnect"] = summarize(timed(warm, connect_runs))
+
+    conn = connect_fastest([port])
+    results["get_dtc"] = summarize(timed(lambda: call(conn.get_dtc), runs))
+    conn.close()
+    return results
+
+
+def _importtime(args):
+    """Run the interpreter with -X importtime; returns {top-level module: cumulative us}, all module names"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=ROOT,
+                          capture_output=True, text=True)
+    top, names = {}, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # header line
+        name = parts[2][1:]
+        names.add(name.strip())
+        if not name.startswith(" "):
+            top[name] = int(parts[1])
+    return top, names
+
+
+def bench_startup(runs):
+    """Wall time and import time of each startup path, plus any deferred module it loads"""
+    results = {}
+    for label, args in STARTUP_TARGETS.items():
+        walls, imports, slowest, names = [], [], {}, set()
+        for _ in range(runs):
+            start = time.perf_counter()
+            top, names = _importtime(args)
+            walls.append(time.perf_counter() - start)
+            imports.append(sum(top.values()) / 1e6)
+            slowest = top
+        results[label] = {
+            "wall": summarize(walls),
+            "imports": summarize(imports),
+            "slowest": [name for name, _ in sorted(slowest.items(), key=lambda item: -item[1])[:5]],
+            "deferred_loaded": [name for name in DEFERRED_MODULES if name in names],
+        }
+    return results
+
+
+def bench_throughput(port, duration):
+    """Samples/s for the batched stream, single-PID polling and python-OBD's Async watch"""
+    schedule = {name: 0.0 for name in DEFAULT_SCHEDULE}  # poll everything flat out
+    results = {}
+
+    for label, batch in (("batched", True), ("single_pid", False)):
+        conn = connect_fastest([port])
+        stream = PidStream(conn, schedule, batch=batch)
+        deadline = time.monotonic() + duration
+        for _ in stream:
+            if time.monotonic() >= deadline:
+                stream.stop()
+        results[label] = {"samples_per_s": stream.rate(), "requests": stream.requests,
+                          "samples": stream.samples}
+        conn.close()
+
+    probe = connect_fastest([port])
+    baudrate, protocol = probe.baudrate, probe.protocol_id()
+    probe.close()
+
+    count = [0]
+    conn = obd.Async(port, baudrate=baudrate, protocol=protocol, delay_cmds=0)
+    for name in DEFAULT_SCHEDULE:
+        conn.watch(obd.commands[name], callback=lambda r: count.__setitem__(0, count[0] + 1))
+    conn.start()
+    time.sleep(duration)
+    conn.stop()
+    conn.close()
+    results["obd_async"] = {"samples_per_s": count[0] / duration, "samples": count[0]}
+
+    return results
+
+
+def bench_fast_mode(duration, latency, jitter):
+    """Batched PID throughput with the adapter's default timing vs. the fast-mode profile"""
+    schedule = {name: 0.0 for name in DEFAULT_SCHEDULE}
+    results = {}
+    with SimulatedElm327(latency=latency, jitter=jitter, seed=0, timing=True) as sim:
+        for label, fast_mode in (("default", False), ("fast_mode", True)):
+            conn = connect_fastest([sim.port], use_cache=False, fast_mode=fast_mode)
+            stream = PidStream(conn, schedule)
+            deadline = time.monotonic() + duration
+            for _ in stream:
+                if time.monotonic() >= deadline:
+                    stream.stop()
+            results[label] = {"samples_per_s": stream.rate(), "requests": stream.requests,
+                              "samples": stream.samples,
+                              "settings": [setting.decode() for setting in conn.fast_settings]}
+            conn.close()
+    results["speedup"] = results["fast_mode"]["samples_per_s"] / max(results["default"]["samples_per_s"], 1e-9)
+    return results
+
+
+def bench_decode(port, replies):
+    """Per-sample decode cost: python-OBD per response vs. RawBatch per batch, same raw replies"""
+    conn = connect_fastest([port])
+    names = list(DEFAULT_SCHEDULE)
+    chunks = [names[i:i + MAX_BATCH] for i in range(0, len(names), MAX_BATCH)]
+    messages = [conn.send_raw(b"01" + b"".join(obd.commands[name].command[2:] for name in chunk))
+                for chunk in chunks]
+    conn.close()
+    replies = [messages[i % len(messages)] for i in range(replies)]
+
+    start = time.perf_counter()
+    samples = sum(len(split_pids(reply)) for reply in replies)
+    per_response = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = RawBatch()
+    for reply in replies:
+        for cmd, data in split_raw(reply):
+            batch.add(RawSample(cmd.name, data, 0.0))
+    bulk_samples = sum(len(values) for _, values in batch.decode().values())
+    bulk = time.perf_counter() - start
+
+    return {"samples": samples, "bulk_samples": bulk_samples,
+            "per_response_us": per_response / samples * 1e6,
+            "bulk_us": bulk / max(bulk_samples, 1) * 1e6,
+            "speedup": per_response / max(bulk, 1e-9)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark connect, DTC and PID polling latency")
+    parser.add_argument("--out", default=RESULTS_FILE, help=f"JSON results file (default: {RESULTS_FILE})")
+    parser.add_argument("--runs", type=int, default=200, help="get_dtc() round trips")
+    parser.add_argument("--connect-runs", type=int, default=5, help="connects per measurement")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per throughput run")
+    parser.add_argument("--latency", type=float, default=0.005, help="simulated adapter latency (s)")
+    parser.add_argument("--jitter", type=float, default=0.002, help="simulated adapter jitter (s)")
+    parser.add_argument("--replies", type=int, default=20000, help="raw replies per decoding run")
+    parser.add_argument("--startup-runs", type=int, default=10, help="interpreter starts per entry point")
+    parser.add_argument("--startup-only", action="store_true", help="only run the startup benchmark")
+    args = parser.parse_args()
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+
+    # keep benchmark profiles out of the user's cache, and gone afterwards
+    with tempfile.TemporaryDirectory(prefix="mondeo-bench-") as cache_dir:
+        profiles.CACHE_DIR = cache_dir
+        profiles.CACHE_FILE = os.path.join(cache_dir, "adapters.json")
+        _run(args)
+
+
+def _run(args):
+    report = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "simulator": {"latency": args.latency, "jitter": args.jitter},
+    }
+
+    print("Benchmarking startup...")
+    report["startup"] = bench_startup(args.startup_runs)
+    for name, stats in report["startup"].items():
+        print(f"  {name:<12} wall p50 {stats['wall']['p50_ms']:8.2f} ms"
+              f"  imports p50 {stats['imports']['p50_ms']:8.2f} ms  slowest: {', '.join(stats['slowest'])}")
+        if stats["deferred_loaded"]:
+            print(f"  {name:<12} loads {', '.join(stats['deferred_loaded'])} at startup")
+    headless_ok = not report["startup"]["cli"]["deferred_loaded"]
+
+    if args.startup_only:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.out}")
+        raise SystemExit(0 if headless_ok else 1)
+
+    with SimulatedElm327(latency=args.latency, jitter=args.jitter, seed=0) as sim:
+        print("Benchmarking CLI path...")
+        report["cli"] = bench_latency(sim.port, args.runs, args.connect_runs, lambda func: func())
+
+        print("Benchmarking GUI worker path...")
+        path = WorkerPath()
+        report["gui"] = bench_latency(sim.port, args.runs, args.connect_runs, path.call)
+        path.close()
+
+        print("Benchmarking PID throughput...")
+        report["throughput"] = bench_throughput(sim.port, args.duration)
+
+        print("Benchmarking decoding...")
+        report["decode"] = bench_decode(sim.port, args.replies)
+
+    print("Benchmarking ELM327 fast mode...")
+    report["fast_mode"] = bench_fast_mode(args.duration, args.latency, args.jitter)
+
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for path_name in ("cli", "gui"):
+        for name, stats in report[path_name].items():
+            print(f"  {path_name:<4} {name:<16} p50 {stats['p50_ms']:8.2f} ms"
+                  f"  p95 {stats['p95_ms']:8.2f} ms  p99 {stats['p99_ms']:8.2f} ms")
+    for name, stats in report["throughput"].items():
+        print(f"  {name:<21} {stats['samples_per_s']:8.1f} samples/s")
+    decode = report["decode"]
+    print(f"  decoding              {decode['per_response_us']:8.2f} -> {decode['bulk_us']:8.2f} us/sample"
+          f" ({decode['speedup']:.1f}x)")
+    fast = report["fast_mode"]
+    print(f"  fast mode             {fast['default']['samples_per_s']:8.1f} -> "
+          f"{fast['fast_mode']['samples_per_s']:8.1f} samples/s ({fast['speedup']:.1f}x,"
+          f" {' '.join(fast['fast_mode']['settings'])})")
+    print(f"Results written to {args.out}")
+    if not headless_ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+python-OBD connection with the helpers used by the CLI and GUI
+
+Every command sent through a MondeoOBD is timed into mondeo.stats: serial
+write, wait for the prompt, "SEARCHING..." and re-reads on the adapter
+side, and python-OBD's parsing and decoding on ours.
+
+With fast_mode the adapter is tuned before the PID scan: no echo, no
+spaces, aggressive adaptive timing and a response timeout sized from the
+ECU's measured response time, plus response-count hints ("0100 1") on
+raw requests so the ELM returns as soon as the expected frames are in
+instead of waiting out its timeout. Each setting is checked for "OK" and
+skipped (or a milder one used) when a clone rejects it. Headers stay on:
+python-OBD needs them to tell the ECUs' responses apart.
+"""
+
+import math
+import time
+
+import obd
+from obd.elm327 import ELM327
+
+from mondeo import stats
+
+# python-OBD waits up to 10 s for the prompt, then re-reads for another
+# second, which a mode 04 clear or a module answering "response pending"
+# (7F xx 78) may need. The heartbeat (ATRV, answered by the adapter itself)
+# doesn't: no reply in this long means the adapter has gone quiet (see
+# mondeo.health).
+READ_TIMEOUT = 0.5
+
+# Fast-mode settings in order; alternatives are tried left to right until one is accepted
+FAST_SETTINGS = (
+    (b"ATE0",),            # no echo
+    (b"ATS0",),            # no spaces: about a third fewer bytes per response
+    (b"ATAT2", b"ATAT1"),  # aggressive adaptive timing, else the default one
+)
+ST_UNIT = 0.004096   # seconds per ATST step
+ST_DEFAULT = 0x32    # ~200 ms, the ELM's power-on timeout
+ST_MIN = 0x10        # ~65 ms; slower ECU replies would turn into NO DATA
+ST_MARGIN = 4        # timeout = slowest measured reply x ST_MARGIN
+ELM_CLOCK = 4000000  # ATBRD divisor base
+
+
+class ClearResponse(obd.OBDResponse):
+    """Mode 04 response that knows whether the ECU acknowledged the clear"""
+
+    def is_successful(self):
+        # a positive mode 04 response is a bare 0x44 from at least one ECU
+        return any(m.data[:1] == b"\x44" for m in self.messages)
+
+
+class _TimedElm327(ELM327):
+    """
+    python-OBD's ELM327 with every command timed into mondeo.stats.
+
+    With fail_fast set (only during MondeoOBD.heartbeat()) there are no
+    re-reads after an empty reply: the adapter always answers ATRV, so no
+    reply at all marks the connection as lost.
+    """
+
+    fail_fast = False
+    io_time = 0.0  # seconds spent on the serial line, for telling I/O from decoding
+    _label = "(repeat)"
+
+    def _ELM327__send(self, cmd, delay=None, end_marker=ELM327.ELM_PROMPT):
+        if cmd:
+            self._label = stats.command_label(cmd)
+        label = self._label  # a bare CR repeats the last command
+        started = time.perf_counter()
+        self._ELM327__write(cmd)
+        written = time.perf_counter()
+        stats.observe("write", label, written - started)
+
+        if delay is not None:
+            time.sleep(delay)  # ATZ during setup
+        waited = time.perf_counter()
+        lines = self._ELM327__read(end_marker=end_marker)
+        read = time.perf_counter()
+        stats.observe("read", label, read - waited)
+        if any("SEARCHING" in line for line in lines):
+            stats.observe("search", label, read - waited)
+
+        if not lines and self.fail_fast and delay is None:
+            self._ELM327__status = obd.OBDStatus.NOT_CONNECTED
+        elif not lines:
+            # python-OBD's re-reads, up to a second including the delay
+            delayed = delay or 0.0
+            while delayed < 1.0 and not lines:
+                time.sleep(0.1)
+                delayed += 0.1
+                lines = self._ELM327__read(end_marker=end_marker)
+            stats.observe("retry", label, time.perf_counter() - read)
+
+        self.io_time += time.perf_counter() - started
+        return lines
+
+
+def _read_until(port, marker, timeout):
+    """Raw bytes from a pyserial port until `marker` or `timeout` seconds"""
+    deadline = time.monotonic() + timeout
+    data = b""
+    saved, port.timeout = port.timeout, 0.05
+    try:
+        while marker not in data and time.monotonic() < deadline:
+            data += port.read(port.in_waiting or 1)
+    finally:
+        port.timeout = saved
+    return data
+
+
+class MondeoOBD(obd.OBD):
+    """
+    OBD connection exposing get_dtc()/clear_dtc()
+
+    Passing `supported` (a set of OBDCommands, e.g. from the profile cache)
+    skips python-OBD's supported-PID scan on connect. `fast_mode` applies
+    the fast-mode settings; `fast_baud` additionally asks the adapter to
+    switch to that baud rate with ATBRD (kept only if it verifies).
+    """
+
+    def __init__(self, portstr=None, baudrate=None, protocol=None, supported=None,
+                 fast_mode=False, fast_baud=None, **kwargs):
+        self.baudrate = baudrate         # boot baud rate, what a reconnect has to use
+        self.link_baudrate = baudrate    # current one, differs after ATBRD
+        self.fast_mode = fast_mode
+        self.fast_baud = fast_baud
+        self.fast_settings = []          # settings the adapter accepted
+        self.response_hints = False
+        self._frame_counts = {}          # raw request -> frames in its last full response
+        self._cached_supported = supported
+        obd.OBD.__init__(self, portstr, baudrate, protocol, **kwargs)
+
+    def heartbeat(self):
+        """
+        Adapter voltage (ATRV), or None. A silent adapter is given up on
+        after READ_TIMEOUT instead of ~11 s and the connection marked lost;
+        every other command keeps python-OBD's patience.
+        """
+        port = getattr(self.interface, "_ELM327__port", None)
+        if port is None or not self.is_connected():
+            return None
+        saved, port.timeout = port.timeout, READ_TIMEOUT
+        self.interface.fail_fast = True
+        try:
+            response = self.query(obd.commands.ELM_VOLTAGE, force=True)
+        finally:
+            self.interface.fail_fast = False
+            if self.interface._ELM327__port is not None:
+                port.timeout = saved
+        return None if response.is_null() else response.value
+
+    def _OBD__connect(self, portstr, baudrate, protocol, check_voltage, start_low_power):
+        # overrides OBD.__connect() for an explicit port so the adapter setup is timed too
+        if portstr is None:
+            return obd.OBD._OBD__connect(self, portstr, baudrate, protocol, check_voltage, start_low_power)
+        self.interface = _TimedElm327(portstr, baudrate, protocol, self.timeout, check_voltage,
+                                      start_low_power)
+        if self.interface.status() == obd.OBDStatus.NOT_CONNECTED:
+            self.close()
+
+    def _io_time(self):
+        return getattr(self.interface, "io_time", 0.0)
+
+    def query(self, cmd, force=False):
+        """OBD.query(), timed into mondeo.stats ("decode" is everything but the serial I/O)"""
+        io_before = self._io_time()
+        started = time.perf_counter()
+        response = obd.OBD.query(self, cmd, force)
+        elapsed = time.perf_counter() - started
+        io = self._io_time() - io_before
+        if io:
+            label = stats.command_label(cmd.command)  # same labels as the write/read metrics
+            stats.observe("decode", label, max(0.0, elapsed - io))
+            stats.observe("query", label, elapsed)
+        return response
+
+    # ------------------------------------------------------------ fast mode
+
+    def _at(self, cmd):
+        """Send an AT command, True if the adapter answered OK"""
+        lines = self.interface._ELM327__send(cmd)
+        return any("OK" in line for line in lines)
+
+    def tune(self):
+        """Apply the fast-mode settings the adapter accepts; returns them"""
+        if self.fast_baud and self.fast_baud != self.link_baudrate:
+            self._switch_baud(self.fast_baud)
+
+        for alternatives in FAST_SETTINGS:
+            accepted = next((cmd for cmd in alternatives if self._at(cmd)), None)
+            if accepted:
+                self.fast_settings.append(accepted)
+
+        # response-count hints need ELM327 v1.3+; clones that reject them
+        # must not get python-OBD's own hints either
+        reply = self.interface._ELM327__send(b"01001")
+        self.response_hints = bool(reply) and not any("?" in line for line in reply) \
+            and bool(self.interface._ELM327__protocol(reply))
+        if not self.response_hints:
+            self.fast = False
+            return self.fast_settings
+
+        # the slowest of a few hinted 0100 round trips sizes the timeout
+        slowest = 0.0
+        for _ in range(3):
+            started = time.perf_counter()
+            self.interface._ELM327__send(b"01001")
+            slowest = max(slowest, time.perf_counter() - started)
+        st = min(ST_DEFAULT, max(ST_MIN, math.ceil(slowest * ST_MARGIN / ST_UNIT)))
+        if self._at(b"ATST%02X" % st):
+            self.fast_settings.append(b"ATST%02X" % st)
+        return self.fast_settings
+
+    def _switch_baud(self, baudrate):
+        """
+        ATBRD handshake: the ELM answers OK, switches, sends its ID at the new
+        rate and keeps it only if we answer with a CR; otherwise both sides
+        go back to the old rate. Returns True if the new rate is in use.
+        """
+        port = getattr(self.interface, "_ELM327__port", None)
+        divisor = round(ELM_CLOCK / baudrate)
+        if port is None or not 8 <= divisor <= 0xFF:
+            return False
+
+        old = port.baudrate
+        port.reset_input_buffer()
+        port.write(b"ATBRD%02X\r" % divisor)
+        reply = _read_until(port, b"OK\r", 0.5)
+        if b"OK\r" not in reply:
+            _read_until(port, b">", 0.5)  # "?" from clones without ATBRD
+            return False
+
+        port.baudrate = baudrate
+        ident = reply.split(b"OK\r", 1)[1]
+        if b"\r" not in ident:
+            ident += _read_until(port, b"\r", 0.2)
+        if ident.strip() and all(32 <= b < 127 for b in ident.strip()):
+            port.write(b"\r")
+            if _read_until(port, b">", 0.5).endswith(b">") and self.interface._ELM327__send(b"ATI"):
+                self.link_baudrate = baudrate
+                return True
+
+        # garbage at the new rate: the ELM falls back by itself after ATBRT
+        port.baudrate = old
+        _read_until(port, b">", 0.5)
+        return False
+
+    def _OBD__load_commands(self):
+        # overrides the name-mangled OBD.__load_commands() called from OBD.__init__
+        if self.fast_mode and self.is_connected():
+            self.tune()  # before the PID scan, which then runs tuned too
+        if self._cached_supported and self.is_connected():
+            self.supported_commands.update(self._cached_supported)
+        else:
+            obd.OBD._OBD__load_commands(self)
+
+    def send_raw(self, cmd_string):
+        """Send a raw command string (e.g. a multi-PID request), returns parsed Messages"""
+        if self.interface is None:
+            return []
+        # the response-count hint learned from the last full reply, e.g. "010C0B10" + "2"
+        frames = self._frame_counts.get(cmd_string) if self.response_hints else None
+        sent = cmd_string + b"%X" % frames if frames else cmd_string
+        # keeps OBD.query()'s "repeat last command with a bare CR" shortcut honest
+        self._OBD__last_command = sent
+        io_before = self._io_time()
+        started = time.perf_counter()
+        messages = self.interface.send_and_parse(sent) or []
+        elapsed = time.perf_counter() - started
+        if self.response_hints and not cmd_string.startswith(b"AT"):
+            count = sum(len(message.frames) for message in messages)
+            if 0 < count <= 0xF:
+                self._frame_counts[cmd_string] = count
+            else:
+                self._frame_counts.pop(cmd_string, None)  # nothing usable: no hint next time
+        label = stats.command_label(cmd_string)
+        stats.observe("decode", label, max(0.0, elapsed - (self._io_time() - io_before)))
+        stats.observe("query", label, elapsed)
+        return messages
+
+    def command(self, cmd_string):
+        """Send a command, returns the adapter's output lines unparsed (e.g. for mondeo.isotp)"""
+        if self.interface is None:
+            return []
+        self._OBD__last_command = cmd_string
+        with stats.timer("query", stats.command_label(cmd_string)):
+            return self.interface._ELM327__send(cmd_string)
+
+    def get_dtc(self):
+        """Read stored DTCs (mode 03)"""
+        return self.query(obd.commands.GET_DTC)
+
+    def clear_dtc(self):
+        """Clear DTCs and freeze-frame data (mode 04)"""
+        response = self.query(obd.commands.CLEAR_DTC)
+        return ClearResponse(response.command, response.messages)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""
+Real-time dashboard: gauges and scrolling charts
+
+Every signal keeps its samples in a fixed-size NumPy ring buffer. Charts
+are drawn from a min/max decimation of the visible window, one min/max
+pair per pixel column, so a redraw costs the same after five minutes or
+five hours and spikes between pixels are never lost. Drawing is plain
+pycairo; main-gui.py puts it in a Gtk.DrawingArea.
+
+    dashboard = Dashboard()
+    for sample in DashboardStream(conn):
+        dashboard.add(sample)             # any thread
+    dashboard.draw(cr, width, height)     # GTK draw handler
+"""
+
+import math
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from mondeo.stream import PidStream, Sample
+
+# name: key used by Dashboard.add(); source: PID or Ford DID it is computed from
+Gauge = namedtuple("Gauge", "name label unit low high warn source")
+
+GAUGES = (
+    Gauge("RPM", "RPM", "rpm", 0, 5000, 4500, "RPM"),
+    Gauge("BOOST", "Boost", "bar", 0, 2.0, 1.6, "INTAKE_PRESSURE"),
+    Gauge("EGT", "EGT", "°C", 0, 900, 750, "DPF_INLET_TEMP"),
+    Gauge("RAIL", "Rail pressure", "bar", 0, 1800, 1600, "FUEL_RAIL_PRESSURE_DIRECT"),
+)
+
+# PIDs the dashboard streams; barometric pressure turns MAP into boost
+SCHEDULE = {
+    "RPM": 0.05,
+    "INTAKE_PRESSURE": 0.05,
+    "FUEL_RAIL_PRESSURE_DIRECT": 0.05,
+    "BAROMETRIC_PRESSURE": 5.0,
+}
+
+# EGT has no mode 01 PID on this car; read from the PCM by DID instead
+EGT_DID = "DPF_INLET_TEMP"
+EGT_INTERVAL = 0.5  # seconds
+
+CAPACITY = 4096        # samples per signal, ~3 minutes at 20 Hz
+CHART_SPAN = 60.0      # seconds of history on screen
+STANDARD_PRESSURE = 101.325  # kPa, until the first barometric reading
+
+
+class RingBuffer:
+    """Fixed-size (time, value) history; append is O(1), memory never grows"""
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        self._times = np.zeros(capacity)
+        self._values = np.zeros(capacity)
+        self._next = 0
+        self.count = 0
+        self._lock = threading.Lock()  # filled on the OBD worker, read on the UI thread
+
+    def append(self, t, value):
+        with self._lock:
+            self._times[self._next] = t
+            self._values[self._next] = value
+            self._next = (self._next + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def latest(self):
+        """Most recent (time, value), or None if empty"""
+        with self._lock:
+            if not self.count:
+                return None
+            i = self._next - 1
+            return self._times[i], self._values[i]
+
+    def window(self, start):
+        """Copies of the times and values since `start`, oldest first"""
+        with self._lock:
+            if self.count < self.capacity:
+                times, values = self._times[:self.count].copy(), self._values[:self.count].copy()
+            else:
+                times = np.concatenate((self._times[self._next:], self._times[:self._next]))
+                values = np.concatenate((self._values[self._next:], self._values[:self._next]))
+        first = np.searchsorted(times, start)
+        return times[first:], values[first:]
+
+    def decimate(self, start, end, columns):
+        """
+        Min/max of the samples in [start, end] per pixel column.
+        Returns (column, minimum, maximum) arrays, one entry per column that has samples.
+        """
+        times, values = self.window(start)
+        if not len(times) or end <= start:
+            return np.empty(0, int), np.empty(0), np.empty(0)
+
+        column = ((times - start) * (columns / (end - start))).astype(int)
+        np.clip(column, 0, columns - 1, out=column)
+        # times are sorted, so each column is one contiguous run
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+        return column[starts], np.minimum.reduceat(values, starts), np.maximum.reduceat(values, starts)
+
+
+def _magnitude(value, unit):
+    return value.to(unit).magnitude if hasattr(value, "to") else float(value)
+
+
+class Dashboard:
+    """Ring buffers for the GAUGES signals and their cairo rendering"""
+
+    def __init__(self, gauges=GAUGES, capacity=CAPACITY, span=CHART_SPAN):
+        self.gauges = gauges
+        self.span = span
+        self.buffers = {gauge.name: RingBuffer(capacity) for gauge in gauges}
+        self._sources = {gauge.source: gauge.name for gauge in gauges}
+        self.barometric = STANDARD_PRESSURE
+        self.draw_time = 0.0  # seconds taken by the last draw()
+
+    def add(self, sample):
+        """Store a mondeo.stream.Sample if it feeds a gauge (any thread)"""
+        if sample.name == "BAROMETRIC_PRESSURE":
+            self.barometric = _magnitude(sample.value, "kilopascal")
+            return
+        name = self._sources.get(sample.name)
+        if name is None or sample.value is None:
+            return
+
+        if name == "BOOST":
+            value = (_magnitude(sample.value, "kilopascal") - self.barometric) / 100
+        elif name == "RAIL":
+            value = _magnitude(sample.value, "kilopascal") / 100
+        elif name == "EGT":
+            value = _magnitude(sample.value, "degC")
+        else:
+            value = _magnitude(sample.value, "revolutions_per_minute")
+        self.buffers[name].append(sample.time, value)
+
+    def extend(self, name, times, values):
+        """Store the decoded float arrays of one PID, as mondeo.decode.RawBatch.decode() gives them"""
+        for t, value in zip(times.tolist(), values.tolist()):
+            self.add(Sample(name, value, t))
+
+    def draw(self, cr, width, height, now=None):
+        """Gauges across the top, one chart per gauge below"""
+        started = time.perf_counter()
+        now = now or time.time()
+
+        cr.set_source_rgb(0.1, 0.1, 0.12)
+        cr.paint()
+
+        count = len(self.gauges)
+        cell = width / count
+        radius = min(cell, height * 0.4) * 0.42
+        chart_top = radius * 2.3
+        chart_height = (height - chart_top) / count
+
+        for i, gauge in enumerate(self.gauges):
+            buffer = self.buffers[gauge.name]
+            latest = buffer.latest()
+            draw_gauge(cr, gauge, latest[1] if latest else None, cell * (i + 0.5), radius * 1.15, radius)
+            draw_chart(cr, gauge, buffer, now - self.span, now,
+                       8, chart_top + i * chart_height + 4, width - 16, chart_height - 8)
+
+        self.draw_time = time.perf_counter() - started
+
+
+def _fraction(gauge, value):
+    return min(1.0, max(0.0, (value - gauge.low) / (gauge.high - gauge.low)))
+
+
+def draw_gauge(cr, gauge, value, cx, cy, radius):
+    """Dial from gauge.low to gauge.high over 270°, red from gauge.warn up"""
+    start, sweep = math.radians(135), math.radians(270)
+    warn = start + sweep * _fraction(gauge, gauge.warn)
+
+    cr.set_line_width(radius * 0.12)
+    cr.set_source_rgb(0.3, 0.3, 0.33)
+    cr.arc(cx, cy, radius, start, warn)
+    cr.stroke()
+    cr.set_source_rgb(0.8, 0.15, 0.15)
+    cr.arc(cx, cy, radius, warn, start + sweep)
+    cr.stroke()
+
+    if value is not None:
+        angle = start + sweep * _fraction(gauge, value)
+        if value >= gauge.warn:
+            cr.set_source_rgb(1.0, 0.55, 0.1)
+        else:
+            cr.set_source_rgb(0.2, 0.7, 1.0)
+        cr.arc(cx, cy, radius, start, angle)
+        cr.stroke()
+        cr.set_line_width(max(1.5, radius * 0.04))
+        cr.set_source_rgb(0.95, 0.95, 0.95)
+        cr.move_to(cx, cy)
+        cr.line_to(cx + math.cos(angle) * radius * 0.85, cy + math.sin(angle) * radius * 0.85)
+        cr.stroke()
+
+    text = "--" if value is None else f"{value:.0f}" if gauge.high >= 100 else f"{value:.2f}"
+    cr.set_source_rgb(0.95, 0.95, 0.95)
+    _centered_text(cr, text, cx, cy + radius * 0.55, radius * 0.32)
+    cr.set_source_rgb(0.6, 0.6, 0.65)
+    _centered_text(cr, f"{gauge.label} ({gauge.unit})", cx, cy + radius * 1.05, radius * 0.2)
+
+
+def draw_chart(cr, gauge, buffer, start, end, x, y, width, height):
+    """Scrolling min/max trace of `buffer` between times `start` and `end`"""
+    if width < 2 or height < 2:
+        return
+    cr.set_source_rgb(0.15, 0.15, 0.18)
+    cr.rectangle(x, y, width, height)
+    cr.fill()
+
+    # warning threshold
+    scale = height / (gauge.high - gauge.low)
+    warn_y = y + height - (gauge.warn - gauge.low) * scale
+    cr.set_line_width(1)
+    cr.set_source_rgba(0.8, 0.15, 0.15, 0.6)
+    cr.move_to(x, warn_y)
+    cr.line_to(x + width, warn_y)
+    cr.stroke()
+
+    columns, lows, highs = buffer.decimate(start, end, int(width))
+    if len(columns):
+        xs = x + columns + 0.5
+        bottom = y + height
+        low_ys = np.clip(bottom - (lows - gauge.low) * scale, y, bottom)
+        high_ys = np.clip(bottom - (highs - gauge.low) * scale, y, bottom)
+
+        # each column is a vertical stroke from min to max, joined to the next
+        cr.set_source_rgb(0.2, 0.7, 1.0)
+        cr.move_to(xs[0], low_ys[0])
+        for px, low, high in zip(xs.tolist(), low_ys.tolist(), high_ys.tolist()):
+            cr.line_to(px, low)
+            cr.line_to(px, high)
+        cr.stroke()
+
+    cr.set_source_rgb(0.6, 0.6, 0.65)
+    cr.move_to(x + 4, y + 12)
+    cr.set_font_size(10)
+    cr.show_text(gauge.label)
+
+
+def _centered_text(cr, text, cx, cy, size):
+    cr.set_font_size(size)
+    extents = cr.text_extents(text)
+    cr.move_to(cx - extents.width / 2 - extents.x_bearing, cy)
+    cr.show_text(text)
+
+
+class DashboardStream(PidStream):
+    """
+    PidStream of SCHEDULE with the PCM's EGT DID read in between every
+    `egt_interval` seconds; EGT is dropped if the PCM doesn't answer. With
+    raw=True the PIDs come as RawSamples, EGT still as a decoded Sample.
+    """
+
+    def __init__(self, conn, egt_interval=EGT_INTERVAL, raw=False):
+        super().__init__(conn, SCHEDULE, raw=raw)
+        self.egt_interval = egt_interval
+        self.egt = True
+
+    def __iter__(self):
+        from mondeo import ford
+
+        next_egt = time.monotonic()
+        for sample in super().__iter__():
+            yield sample
+            if self.egt and time.monotonic() >= next_egt:
+                value = ford.read_did(self.conn, "PCM", EGT_DID)
+                if value is None:
+                    self.egt = False
+                    continue
+                yield Sample(EGT_DID, value, time.time())
+                next_egt = time.monotonic() + self.egt_interval
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorised bulk decoding of mode 01 PIDs
+
+python-OBD decodes every reading into an OBDResponse holding a Pint
+Quantity, which costs tens of microseconds per sample. For high-rate
+logging the stream can hand over the raw data bytes instead (PidStream
+with raw=True); RawBatch keeps them per PID in preallocated uint8 arrays
+and decodes a whole batch at once with the SAE J1979 formulas in NumPy,
+e.g. (A*256+B)/4 for RPM, giving plain float arrays. Pint is only
+touched at display time (quantity()). PIDs without a formula here fall
+back to python-OBD's decoder, one reading at a time.
+
+    batch = RawBatch()
+    for sample in PidStream(conn, raw=True):
+        batch.add(sample)
+    for name, (times, values) in batch.decode().items():
+        recorder.extend(name, times, values, unit_symbol(name))
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+CHUNK = 1024  # readings per PID added to a batch's arrays each time they fill up
+
+# unit: Pint unit name (as python-OBD uses it); symbol: its short form for files and tables
+Formula = namedtuple("Formula", "pid bytes unit symbol function")
+
+
+def _word(d):
+    return d[:, 0] * 256.0 + d[:, 1]
+
+
+def _percent(d):
+    return d[:, 0] * (100.0 / 255.0)
+
+
+def _temperature(d):
+    return d[:, 0] - 40.0
+
+
+def _trim(d):
+    return (d[:, 0] - 128.0) * (100.0 / 128.0)
+
+
+# python-OBD command name -> Formula; data is an (n, bytes) uint8 array of A, B, ...
+FORMULAS = {
+    "ENGINE_LOAD": Formula(0x04, 1, "percent", "%", _percent),
+    "COOLANT_TEMP": Formula(0x05, 1, "degree_Celsius", "°C", _temperature),
+    "SHORT_FUEL_TRIM_1": Formula(0x06, 1, "percent", "%", _trim),
+    "LONG_FUEL_TRIM_1": Formula(0x07, 1, "percent", "%", _trim),
+    "FUEL_PRESSURE": Formula(0x0A, 1, "kilopascal", "kPa", lambda d: d[:, 0] * 3.0),
+    "INTAKE_PRESSURE": Formula(0x0B, 1, "kilopascal", "kPa", lambda d: d[:, 0].astype(float)),
+    "RPM": Formula(0x0C, 2, "revolutions_per_minute", "rpm", lambda d: _word(d) / 4.0),
+    "SPEED": Formula(0x0D, 1, "kilometer_per_hour", "kph", lambda d: d[:, 0].astype(float)),
+    "TIMING_ADVANCE": Formula(0x0E, 1, "degree", "deg", lambda d: d[:, 0] / 2.0 - 64.0),
+    "INTAKE_TEMP": Formula(0x0F, 1, "degree_Celsius", "°C", _temperature),
+    "MAF": Formula(0x10, 2, "gps", "GPS", lambda d: _word(d) / 100.0),
+    "THROTTLE_POS": Formula(0x11, 1, "percent", "%", _percent),
+    "RUN_TIME": Formula(0x1F, 2, "second", "s", _word),
+    "DISTANCE_W_MIL": Formula(0x21, 2, "kilometer", "km", _word),
+    "FUEL_RAIL_PRESSURE_VAC": Formula(0x22, 2, "kilopascal", "kPa", lambda d: _word(d) * 0.079),
+    "FUEL_RAIL_PRESSURE_DIRECT": Formula(0x23, 2, "kilopascal", "kPa", lambda d: _word(d) * 10.0),
+    "COMMANDED_EGR": Formula(0x2C, 1, "percent", "%", _percent),
+    "EGR_ERROR": Formula(0x2D, 1, "percent", "%", _trim),
+    "FUEL_LEVEL": Formula(0x2F, 1, "percent", "%", _percent),
+    "DISTANCE_SINCE_DTC_CLEAR": Formula(0x31, 2, "kilometer", "km", _word),
+    "BAROMETRIC_PRESSURE": Formula(0x33, 1, "kilopascal", "kPa", lambda d: d[:, 0].astype(float)),
+    "CATALYST_TEMP_B1S1": Formula(0x3C, 2, "degree_Celsius", "°C", lambda d: _word(d) / 10.0 - 40.0),
+    "CONTROL_MODULE_VOLTAGE": Formula(0x42, 2, "volt", "V", lambda d: _word(d) / 1000.0),
+    "ABSOLUTE_LOAD": Formula(0x43, 2, "percent", "%", lambda d: _word(d) * (100.0 / 255.0)),
+    "RELATIVE_THROTTLE_POS": Formula(0x45, 1, "percent", "%", _percent),
+    "AMBIANT_AIR_TEMP": Formula(0x46, 1, "degree_Celsius", "°C", _temperature),
+    "THROTTLE_POS_B": Formula(0x47, 1, "percent", "%", _percent),
+    "ACCELERATOR_POS_D": Formula(0x49, 1, "percent", "%", _percent),
+    "ACCELERATOR_POS_E": Formula(0x4A, 1, "percent", "%", _percent),
+    "THROTTLE_ACTUATOR": Formula(0x4C, 1, "percent", "%", _percent),
+    "RELATIVE_ACCEL_POS": Formula(0x5A, 1, "percent", "%", _percent),
+    "OIL_TEMP": Formula(0x5C, 1, "degree_Celsius", "°C", _temperature),
+    "FUEL_RATE": Formula(0x5E, 2, "lph", "LPH", lambda d: _word(d) / 20.0),
+}
+
+
+def decode_batch(name, data):
+    """Decode an (n, bytes) uint8 array of raw readings of PID `name` into n floats"""
+    formula = FORMULAS[name]
+    data = np.asarray(data, dtype=np.uint8).reshape(-1, formula.bytes)
+    return formula.function(data).astype(np.float64, copy=False)
+
+
+def decode_slow(name, data):
+    """One reading through python-OBD's own decoder (PIDs without a formula); magnitude or None"""
+    import obd
+    from obd.protocols import ECU
+    from obd.protocols.protocol import Message
+
+    cmd = obd.commands[name]
+    message = Message([])
+    message.ecu = ECU.ENGINE
+    message.data = bytearray([0x41, cmd.pid]) + bytes(data)
+    value = cmd([message]).value
+    value = getattr(value, "magnitude", value)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def unit_symbol(name):
+    """Short unit of PID `name` as the recorder and exporters write it, "" if unknown"""
+    formula = FORMULAS.get(name)
+    return formula.symbol if formula else ""
+
+
+def format_reading(name, value):
+    """Short display string for a decoded value of PID `name`"""
+    symbol = unit_symbol(name)
+    return f"{value:.1f} {symbol}" if symbol else f"{value:.1f}"
+
+
+def quantity(name, value):
+    """Pint Quantity for display; the only place the fast path touches Pint"""
+    formula = FORMULAS.get(name)
+    if formula is None:
+        return value
+    import obd
+
+    return obd.Unit.Quantity(value, formula.unit)
+
+
+class _Readings:
+    """Timestamps and raw bytes of one PID, grown in CHUNK steps"""
+
+    def __init__(self, width):
+        self.times = np.empty(CHUNK)
+        self.data = np.empty((CHUNK, width), dtype=np.uint8)
+        self.count = 0
+
+    def add(self, t, data):
+        if self.count == len(self.times):
+            self.times = np.resize(self.times, self.count + CHUNK)
+            self.data = np.resize(self.data, (self.count + CHUNK, self.data.shape[1]))
+        self.times[self.count] = t
+        self.data[self.count] = list(data[:self.data.shape[1]])
+        self.count += 1
+
+
+class RawBatch:
+    """Raw PID readings collected per PID, decoded together by decode()"""
+
+    def __init__(self):
+        self._readings = {}  # name -> _Readings
+
+    def __len__(self):
+        return sum(readings.count for readings in self._readings.values())
+
+    def add(self, sample):
+        """Add a mondeo.stream.RawSample"""
+        readings = self._readings.get(sample.name)
+        if readings is None:
+            formula = FORMULAS.get(sample.name)
+            width = formula.bytes if formula else len(sample.data)
+            readings = self._readings[sample.name] = _Readings(width)
+        if len(sample.data) >= readings.data.shape[1]:
+            readings.add(sample.time, sample.data)
+
+    def decode(self, clear=True):
+        """{name: (times, values)} float64 arrays for every PID in the batch"""
+        decoded = {}
+        for name, readings in self._readings.items():
+            if not readings.count:
+                continue
+            times, data = readings.times[:readings.count], readings.data[:readings.count]
+            if name in FORMULAS:
+                values = decode_batch(name, data)
+            else:
+                values = np.array([np.nan if v is None else v for v in (decode_slow(name, row) for row in data)])
+            decoded[name] = (times.copy(), values)
+        if clear:
+            self.clear()
+        return decoded
+
+    def clear(self):
+        for readings in self._readings.values():
+            readings.count = 0
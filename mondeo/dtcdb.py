@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+Offline DTC database
+
+Descriptions for every code the tool knows, Ford Mk4/Duratorq ones
+(mondeo.ford_defs) ahead of python-OBD's generic SAE table, prebuilt into
+one sorted binary file that ships with the package (dtc.idx). The file is
+memory-mapped on the first lookup and never parsed: a code is found by
+bisecting the sorted array of packed codes, so a lookup touches a few
+pages and importing this module costs nothing beyond the standard library.
+An LRU cache in front of describe() keeps repeated codes free.
+
+Full-text search uses a word index in the same file: the sorted words of
+all descriptions, each with the list of codes it appears in. Every query
+word is matched as a prefix (bisect on the word table), so the GUI can
+search as the user types.
+
+    describe("P2002")              # "Diesel particulate filter efficiency below threshold"
+    search("glow plug")            # [("P0380", "Glow Plug/Heater Circuit 'A'"), ...]
+
+Rebuild after changing mondeo.ford_defs or upgrading python-OBD:
+
+    python -m mondeo.dtcdb --build
+"""
+
+import argparse
+import bisect
+import functools
+import mmap
+import os
+import re
+import struct
+import sys
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dtc.idx")
+
+MAGIC = b"MDTC"
+VERSION = 1
+CACHE_SIZE = 4096   # descriptions kept by the LRU in front of the file
+SEARCH_LIMIT = 100  # results returned by search() unless asked otherwise
+
+# magic, version, code count, word count, then offsets of the key array,
+# entry table, word table, postings and string blob
+_HEADER = struct.Struct("<4sHIIIIIII")
+_KEY = struct.Struct("<H")        # packed code, see pack_code()
+_ENTRY = struct.Struct("<IH")     # description offset in the string blob, length
+_WORD = struct.Struct("<IBIH")    # word offset in the string blob, length, first posting, posting count
+_POSTING = struct.Struct("<H")    # index of a code in the key array
+
+_LETTERS = "PCBU"
+_WORDS = re.compile(r"[a-z0-9]+")
+_CODE = re.compile(r"^[PCBU]([0-3][0-9A-F]{0,3})?$")
+
+
+def pack_code(code):
+    """
+    'P0401' -> 0x0401: the two bytes the ECU sends (letter in the top two
+    bits, so the first digit is 0-3). ValueError for anything else.
+    """
+    if len(code) != 5 or code[1] not in "0123":
+        raise ValueError(f"Not a DTC: {code!r}")
+    return (_LETTERS.index(code[0]) << 14) | int(code[1:], 16)
+
+
+def unpack_code(value):
+    return f"{_LETTERS[value >> 14]}{value & 0x3FFF:04X}"
+
+
+def words(text):
+    """Lower-case search words of a description or query"""
+    return _WORDS.findall(text.lower())
+
+
+# ----------------------------------------------------------------- reading
+
+class _Table:
+    """Fixed-size records in the mapped file as a sequence, for bisect"""
+
+    def __init__(self, buffer, offset, count, record, field=0):
+        self.buffer, self.offset, self.count = buffer, offset, count
+        self.record, self.field = record, field
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self.record.unpack_from(self.buffer, self.offset + i * self.record.size)[self.field]
+
+
+class _WordTable(_Table):
+    """The sorted words themselves (bytes), for prefix bisection"""
+
+    def __init__(self, buffer, offset, count, strings):
+        super().__init__(buffer, offset, count, _WORD)
+        self.strings = strings
+
+    def __getitem__(self, i):
+        start, length, _, _ = self.entry(i)
+        return self.buffer[self.strings + start:self.strings + start + length]
+
+    def entry(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return _WORD.unpack_from(self.buffer, self.offset + i * _WORD.size)
+
+
+class Database:
+    """A memory-mapped dtc.idx"""
+
+    def __init__(self, path=DB_FILE):
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.count, word_count, keys, self._entries, table, self._postings,
+         self._strings) = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} DTC database")
+        if sys.byteorder == "little":
+            self._keys = memoryview(self._map)[keys:keys + self.count * _KEY.size].cast("H")
+        else:
+            self._keys = _Table(self._map, keys, self.count, _KEY)
+        self._words = _WordTable(self._map, table, word_count, self._strings)
+
+    def _description(self, i):
+        start, length = _ENTRY.unpack_from(self._map, self._entries + i * _ENTRY.size)
+        return self._map[self._strings + start:self._strings + start + length].decode("utf-8")
+
+    def describe(self, code):
+        """Description of `code`, or None"""
+        try:
+            key = pack_code(code.upper())
+        except (ValueError, IndexError):
+            return None
+        i = bisect.bisect_left(self._keys, key)
+        if i < self.count and self._keys[i] == key:
+            return self._description(i)
+        return None
+
+    def _code_range(self, prefix):
+        """Indices of the codes starting with `prefix` ("P20" -> P2000..P20FF, "C" -> C0000..C3FFF)"""
+        low = pack_code(prefix.ljust(5, "0"))
+        high = pack_code(prefix.ljust(5, "F") if len(prefix) > 1 else prefix + "3FFF")
+        return range(bisect.bisect_left(self._keys, low), bisect.bisect_right(self._keys, high))
+
+    def _word_matches(self, prefix):
+        """Indices of the codes with a description word starting with `prefix`"""
+        prefix = prefix.encode()
+        matches = set()
+        i = bisect.bisect_left(self._words, prefix)
+        while i < len(self._words) and self._words[i].startswith(prefix):
+            _, _, first, count = self._words.entry(i)
+            matches.update(_POSTING.unpack_from(self._map, self._postings + n * _POSTING.size)[0]
+                           for n in range(first, first + count))
+            i += 1
+        return matches
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        [(code, description)] in code order for a code prefix ("P24") or
+        words that must all appear, each matched as a prefix ("dpf press").
+        """
+        query = query.strip()
+        if not query:
+            return []
+        found = set(self._code_range(query.upper())) if _CODE.match(query.upper()) else None
+        if not found:  # not a code, or no such codes: search the descriptions
+            found = None
+            for term in words(query):
+                matches = self._word_matches(term)
+                found = matches if found is None else found & matches
+                if not found:
+                    return []
+        return [(unpack_code(self._keys[i]), self._description(i)) for i in sorted(found or ())[:limit]]
+
+
+@functools.lru_cache(maxsize=1)
+def _database():
+    """The shipped database, opened on first use; None if it is missing or unreadable"""
+    try:
+        return Database(DB_FILE)
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def describe(code):
+    """Description of `code` from the offline database, or None"""
+    database = _database()
+    return database.describe(code) if database else None
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Full-text search of the offline database, see Database.search()"""
+    database = _database()
+    return database.search(query, limit) if database else []
+
+
+# ---------------------------------------------------------------- building
+
+def sources():
+    """{code: description}: python-OBD's generic table overridden by the Ford one"""
+    import obd
+    from mondeo import ford_defs
+
+    codes = {code: description for code, description in obd.codes.DTC.items() if description}
+    for line in ford_defs.DTCS.strip().splitlines():
+        code, description = line.split("|", 1)
+        codes[code] = description
+    return codes
+
+
+def build(path=DB_FILE, codes=None):
+    """Write the database for {code: description} (default: sources()); returns the code count"""
+    codes = sources() if codes is None else codes
+    entries = sorted((pack_code(code), description) for code, description in codes.items())
+
+    strings = bytearray()
+    table = []
+    index = {}  # word -> [code index, ...]
+    for i, (_, description) in enumerate(entries):
+        text = description.encode("utf-8")
+        table.append((len(strings), len(text)))
+        strings += text
+        for word in sorted(set(words(description))):
+            index.setdefault(word, []).append(i)
+
+    word_table = []
+    postings = []
+    for word in sorted(index, key=str.encode):
+        text = word.encode()[:255]
+        word_table.append((len(strings), len(text), len(postings), len(index[word])))
+        strings += text
+        postings += index[word]
+
+    keys = b"".join(_KEY.pack(key) for key, _ in entries)
+    entry_bytes = b"".join(_ENTRY.pack(*entry) for entry in table)
+    word_bytes = b"".join(_WORD.pack(*entry) for entry in word_table)
+    posting_bytes = b"".join(_POSTING.pack(i) for i in postings)
+
+    offset = _HEADER.size
+    offsets = []
+    for block in (keys, entry_bytes, word_bytes, posting_bytes):
+        offsets.append(offset)
+        offset += len(block)
+    offsets.append(offset)
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(entries), len(word_table), *offsets))
+        for block in (keys, entry_bytes, word_bytes, posting_bytes, bytes(strings)):
+            f.write(block)
+    os.replace(temporary, path)
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline DTC database")
+    parser.add_argument("--build", action="store_true",
+                        help="rebuild the database from mondeo.ford_defs and python-OBD")
+    parser.add_argument("--db", default=DB_FILE, help="database file")
+    parser.add_argument("query", nargs="*", help="code or words to look up")
+    args = parser.parse_args()
+
+    if args.build:
+        count = build(args.db)
+        print(f"{count} codes written to {args.db} ({os.path.getsize(args.db)} bytes)")
+    if args.query:
+        for code, description in Database(args.db).search(" ".join(args.query)):
+            print(f"{code}  {description}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Structured export of diagnostic results
+
+Every DTC, DTC event and live-data sample becomes one flat record with the
+same fields, written as JSON Lines, CSV or Parquet as it arrives. Text
+output goes through a 64 KiB buffer that is flushed when full or once a
+second, so a live stream still reaches a pipe promptly without one write
+syscall per record. Parquet collects records into row groups and needs
+pyarrow, which is optional.
+
+    with open_writer("jsonl") as out:          # stdout
+        out.write(sample_record(sample))
+"""
+
+import abc
+import csv
+import io
+import json
+import sys
+import time
+
+FORMATS = ("jsonl", "csv", "parquet")
+
+# Every record has these fields, None where they don't apply
+FIELDS = ("time", "kind", "name", "value", "unit", "status", "description", "first_seen", "port")
+
+BUFFER_SIZE = 64 * 1024
+FLUSH_INTERVAL = 1.0   # seconds; bounds how stale a streamed record can get
+ROW_GROUP = 10000      # Parquet records per row group
+
+
+def dtc_record(code, description, status="stored", t=None, first_seen=None, port=None):
+    return {"time": t or time.time(), "kind": "dtc", "name": code, "value": None, "unit": None,
+            "status": status, "description": description, "first_seen": first_seen, "port": port}
+
+
+def event_record(event, port=None):
+    """Record for a mondeo.monitor.DtcEvent"""
+    return {"time": event.time, "kind": f"dtc_{event.kind}", "name": event.code, "value": None,
+            "unit": None, "status": event.status, "description": event.description,
+            "first_seen": event.first_seen, "port": port}
+
+
+def sample_record(sample, port=None):
+    """Record for a mondeo.stream.Sample; Pint quantities are split into value and unit"""
+    value, unit = sample.value, None
+    if hasattr(value, "magnitude"):
+        value, unit = float(value.magnitude), f"{value.units:~}"
+    elif not isinstance(value, (int, float, str, type(None))):
+        value = str(value)
+    return {"time": sample.time, "kind": "sample", "name": sample.name, "value": value,
+            "unit": unit, "status": None, "description": None, "first_seen": None, "port": port}
+
+
+def batch_records(decoded, port=None):
+    """Sample records, oldest first, for a mondeo.decode.RawBatch.decode() result"""
+    from mondeo.decode import unit_symbol
+
+    rows = [(t, name, value) for name, (times, values) in decoded.items()
+            for t, value in zip(times.tolist(), values.tolist())]
+    rows.sort(key=lambda row: row[0])
+    for t, name, value in rows:
+        yield {"time": t, "kind": "sample", "name": name, "value": None if value != value else value,
+               "unit": unit_symbol(name) or None, "status": None, "description": None,
+               "first_seen": None, "port": port}
+
+
+class _TextWriter(abc.ABC):
+    """Buffered text output with size- and time-based flushing"""
+
+    def __init__(self, path=None):
+        if path in (None, "-"):
+            sys.stdout.flush()
+            self._file = io.open(sys.stdout.fileno(), "w", buffering=BUFFER_SIZE, encoding="utf-8",
+                                 newline="", closefd=False)
+        else:
+            self._file = io.open(path, "w", buffering=BUFFER_SIZE, encoding="utf-8", newline="")
+        self._last_flush = time.monotonic()
+        self.records = 0
+
+    def write(self, record):
+        self._write(record)
+        self.records += 1
+        now = time.monotonic()
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self.flush()
+            self._last_flush = now
+
+    @abc.abstractmethod
+    def _write(self, record):
+        """Format one record into self._file"""
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonLinesWriter(_TextWriter):
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+class CsvWriter(_TextWriter):
+    def __init__(self, path=None):
+        super().__init__(path)
+        self._csv = csv.DictWriter(self._file, FIELDS, lineterminator="\n")
+        self._csv.writeheader()
+
+    def _write(self, record):
+        self._csv.writerow(record)
+
+
+class ParquetWriter:
+    """
+    Records collected in memory and written in row groups of ROW_GROUP.
+    `value` is a float column; non-numeric values go to an extra `text` column.
+    """
+
+    def __init__(self, path):
+        if path in (None, "-"):
+            raise ValueError("Parquet export needs an output file")
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+        self._pa = pa
+        self.schema = pa.schema([
+            ("time", pa.float64()), ("kind", pa.string()), ("name", pa.string()),
+            ("value", pa.float64()), ("unit", pa.string()), ("status", pa.string()),
+            ("description", pa.string()), ("first_seen", pa.float64()), ("port", pa.string()),
+            ("text", pa.string()),
+        ])
+        self._writer = pq.ParquetWriter(path, self.schema)
+        self._rows = self._empty()
+        self.records = 0
+
+    def _empty(self):
+        return {name: [] for name in self.schema.names}
+
+    def write(self, record):
+        for field in FIELDS:
+            self._rows[field].append(record[field])
+        value = record["value"]
+        numeric = isinstance(value, (int, float)) and not isinstance(value, bool)
+        if not numeric:
+            self._rows["value"][-1] = None
+        self._rows["text"].append(None if numeric or value is None else str(value))
+        self.records += 1
+        if len(self._rows["time"]) >= ROW_GROUP:
+            self.flush()
+
+    def flush(self):
+        if self._rows["time"]:
+            table = self._pa.Table.from_pydict(self._rows, schema=self.schema)
+            self._writer.write_table(table)
+            self._rows = self._empty()
+
+    def close(self):
+        if self._writer:
+            self.flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_writer(fmt, path=None):
+    """Writer for `fmt` (one of FORMATS); text formats go to stdout when `path` is None or "-" """
+    if fmt == "jsonl":
+        return JsonLinesWriter(path)
+    if fmt == "csv":
+        return CsvWriter(path)
+    if fmt == "parquet":
+        return ParquetWriter(path)
+    raise ValueError(f"Unknown export format {fmt!r}")
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Fleet scan
+
+Finds every adapter with a car behind it, then scans all of them at once
+on a single asyncio event loop (mondeo.aio): VIN, stored and pending DTCs
+and freeze frame 0 (read like mondeo.freeze does). A car whose scan fails
+gets an "error" entry; the others are reported as usual. Each car's
+requests run back to back on its own adapter, so the wall-clock time for
+N cars is roughly that of the slowest one rather than the sum.
+
+    python main.py --fleet
+    python main.py --fleet --json > fleet.json
+"""
+
+import asyncio
+import time
+
+import obd
+
+from mondeo.aio import AsyncElm327
+from mondeo.freeze import read_freeze_frame_async
+from mondeo.history import parse_vin
+from mondeo.probe import probe_all
+
+
+def _value(value):
+    """JSON-friendly form of a decoded OBD value"""
+    if hasattr(value, "magnitude"):
+        return {"value": round(float(value.magnitude), 2), "unit": f"{value.units:~}"}
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode("ascii", "ignore").strip("\x00 ")
+    if isinstance(value, tuple):
+        return list(value)
+    return value
+
+
+async def _vin(adapter):
+    """VIN of the car behind an open AsyncElm327, see mondeo.history.parse_vin"""
+    return parse_vin(await adapter.send_raw(obd.commands.VIN.command))
+
+
+async def scan_vehicle(result):
+    """Connect to one probed adapter and read everything a fleet report needs"""
+    start = time.monotonic()
+    report = {"port": result.port, "protocol": result.protocol}
+    adapter = AsyncElm327(result.port, result.baudrate, result.protocol)
+    try:
+        await adapter.open()
+        if obd.commands.VIN in adapter.supported_commands:
+            report["vin"] = await _vin(adapter)
+        stored = await adapter.query(obd.commands.GET_DTC)
+        pending = await adapter.query(obd.commands.GET_CURRENT_DTC)
+        report["stored"] = [list(dtc) for dtc in stored.value or []]
+        report["pending"] = [list(dtc) for dtc in pending.value or []]
+        frame = await read_freeze_frame_async(adapter)
+        report["freeze_frame"] = {}
+        if frame:
+            report["freeze_frame"] = {"dtc": frame.dtc,
+                                      "values": {name: _value(value) for name, value in frame.values.items()}}
+    except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+        report["error"] = str(e) or type(e).__name__
+    finally:
+        adapter.close()
+    report["elapsed"] = round(time.monotonic() - start, 3)
+    return report
+
+
+async def _scan_all(results):
+    # one car's unexpected error must not take the whole report down with it
+    reports = await asyncio.gather(*(scan_vehicle(result) for result in results), return_exceptions=True)
+    vehicles = []
+    for result, report in zip(results, reports):
+        if isinstance(report, BaseException):
+            report = {"port": result.port, "protocol": result.protocol,
+                      "error": str(report) or type(report).__name__, "elapsed": 0.0}
+        vehicles.append(report)
+    return vehicles
+
+
+def scan_fleet(ports):
+    """Probe `ports`, then scan every connected car concurrently. Returns a fleet report."""
+    start = time.monotonic()
+    results = probe_all(ports)
+    probed = time.monotonic() - start
+    vehicles = asyncio.run(_scan_all(results)) if results else []
+    return {
+        "timestamp": time.time(),
+        "ports": len(ports),
+        "probe_elapsed": round(probed, 3),
+        "elapsed": round(time.monotonic() - start, 3),
+        "vehicles": vehicles,
+    }
+
+
+def format_report(report):
+    """Consolidated plain-text report"""
+    lines = [f"Fleet scan: {len(report['vehicles'])} vehicle(s) on {report['ports']} port(s)"
+             f" in {report['elapsed']:.2f} s", ""]
+    for vehicle in report["vehicles"]:
+        lines.append(f"== {vehicle.get('vin') or 'Unknown VIN'} ({vehicle['port']},"
+                     f" protocol {vehicle['protocol']}, {vehicle['elapsed']:.2f} s)")
+        if "error" in vehicle:
+            lines.append(f"   Scan failed: {vehicle['error']}")
+            lines.append("")
+            continue
+        for title, key in (("Stored DTCs", "stored"), ("Pending DTCs", "pending")):
+            codes = vehicle[key]
+            lines.append(f"   {title}: {'none' if not codes else ''}")
+            for code, desc in codes:
+                lines.append(f"     {code}: {desc}")
+        freeze = vehicle["freeze_frame"]
+        if freeze:
+            lines.append(f"   Freeze frame (set by {freeze['dtc'] or '?'}):")
+            for name, value in freeze["values"].items():
+                if isinstance(value, dict):
+                    value = f"{value['value']} {value['unit']}"
+                lines.append(f"     {name:<28} {value}")
+        lines.append("")
+    return "\n".join(lines)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+Ford enhanced diagnostics
+
+Reads Ford-specific data from individual modules over CAN: mode 22
+(ReadDataByIdentifier) DIDs such as DPF soot load, injector corrections and
+glow plug status, and manufacturer DTCs through UDS mode 19, falling back
+to KWP2000 mode 18 on modules that don't speak UDS.
+
+A module is addressed physically through a mondeo.isotp channel: request
+header (ATSH), receive filter on its response ID (ATCRA) and flow control
+are set for the block and restored afterwards, so generic OBD requests
+keep going to the functional address. Multi-frame replies (long DTC
+lists, ASCII DIDs) are reassembled by the channel.
+
+full_scan() reads every module of the car: one cheap TesterPresent per
+module with a short adapter timeout finds the fitted ones, then their
+DTCs are read over a single channel that is only re-pointed between
+modules.
+
+DID and DTC definitions live in mondeo.ford_defs and are parsed into an
+index on the first lookup, so plain generic DTC reads never pay for them.
+
+    values = read_dids(conn, "PCM", ["DPF_SOOT_LOAD", "GLOW_PLUG_FAULTS"])
+    codes = read_module_dtcs(conn, "ABS")
+    result = full_scan(conn)
+"""
+
+import functools
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import obd
+
+from mondeo import dtcdb
+from mondeo.connection import ST_DEFAULT, ST_UNIT
+from mondeo.isotp import DEFAULT_FLOW, FUNCTIONAL_ID, IsoTpChannel
+
+Module = namedtuple("Module", "name request_id response_id description")
+Did = namedtuple("Did", "module did name kind scale offset unit description")
+ModuleDtc = namedtuple("ModuleDtc", "code description status")
+# modules: {name: [ModuleDtc]} for every module that answered; elapsed in seconds
+ScanResult = namedtuple("ScanResult", "modules absent elapsed")
+
+# The Mk4's diagnosable modules. Those on the medium-speed CAN (cluster
+# side) are only reachable with an adapter that can switch to it; on a
+# plain ELM327 they are skipped after one short timeout.
+MODULES = {
+    "PCM": Module("PCM", 0x7E0, 0x7E8, "Powertrain control module"),
+    "TCM": Module("TCM", 0x7E1, 0x7E9, "Transmission control module"),
+    "ABS": Module("ABS", 0x760, 0x768, "Anti-lock brake module"),
+    "RCM": Module("RCM", 0x737, 0x73F, "Restraints control module (airbags)"),
+    "IPC": Module("IPC", 0x720, 0x728, "Instrument cluster"),
+    "BCM": Module("BCM", 0x726, 0x72E, "Body control module (GEM)"),
+    "ACM": Module("ACM", 0x727, 0x72F, "Audio control module"),
+    "HVAC": Module("HVAC", 0x733, 0x73B, "Climate control module"),
+    "PAM": Module("PAM", 0x736, 0x73E, "Parking aid module"),
+    "DDM": Module("DDM", 0x740, 0x748, "Driver door module"),
+    "PDM": Module("PDM", 0x741, 0x749, "Passenger door module"),
+}
+
+PROBE_TIMEOUT = 0.05  # seconds an absent module gets to answer during discovery
+
+_SIZES = {"u8": 1, "s8": 1, "u16": 2, "s16": 2, "u24": 3, "u32": 4}
+
+# UDS DTC status bits worth showing (ISO 14229 status mask)
+STATUS_FAILED = 0x01
+STATUS_PENDING = 0x04
+STATUS_CONFIRMED = 0x08
+
+
+class NegativeResponse(Exception):
+    """The module answered 7F <service> <code>"""
+
+    def __init__(self, service, code):
+        super().__init__(f"Service {service:02X} rejected, NRC {code:02X}")
+        self.service = service
+        self.code = code
+
+
+# ------------------------------------------------------------------ index
+
+@functools.lru_cache(maxsize=None)
+def _index():
+    """Parse mondeo.ford_defs into {(module, did): Did}, {name: Did} and {code: description}"""
+    from mondeo import ford_defs
+
+    by_id, by_name = {}, {}
+    for line in ford_defs.DIDS.strip().splitlines():
+        module, did, name, kind, scale, offset, unit, description = line.split("|")
+        definition = Did(module, int(did, 16), name, kind, float(scale), float(offset),
+                         unit or None, description)
+        by_id[(module, definition.did)] = definition
+        by_name[name] = definition
+
+    dtcs = dict(line.split("|", 1) for line in ford_defs.DTCS.strip().splitlines())
+    return by_id, by_name, dtcs
+
+
+def did(name):
+    """Definition for a DID name, e.g. did("DPF_SOOT_LOAD")"""
+    return _index()[1][name]
+
+
+def lookup_did(module, number):
+    """Definition for `number` on `module`, or None"""
+    return _index()[0].get((module, number))
+
+
+def module_dids(module):
+    """All known DID definitions for a module, in table order"""
+    return [d for d in _index()[1].values() if d.module == module]
+
+
+def describe_dtc(code):
+    """
+    Description for a DTC from the offline database (mondeo.dtcdb), falling
+    back to the text tables if the database file is missing
+    """
+    return dtcdb.describe(code) or _index()[2].get(code) or obd.codes.DTC.get(code, "Unknown error code")
+
+
+# --------------------------------------------------------------- decoding
+
+def decode(definition, data):
+    """Value of a DID from its data bytes (after 62 DID_HI DID_LO)"""
+    if definition.kind == "ascii":
+        return bytes(data).decode("ascii", "ignore").strip("\x00 ")
+    if definition.kind == "bits":
+        return tuple(bool(byte >> bit & 1) for byte in data for bit in range(8))
+
+    size = _SIZES[definition.kind]
+    if len(data) < size:
+        return None
+    raw = int.from_bytes(bytes(data[:size]), "big", signed=definition.kind.startswith("s"))
+    if definition.scale == 1 and definition.offset == 0 and not definition.unit:
+        return raw  # counters and states stay integers
+    value = raw * definition.scale + definition.offset
+    return obd.Unit.Quantity(value, definition.unit) if definition.unit else value
+
+
+def format_did(name, value):
+    """Display string for a decoded DID value"""
+    if did(name).kind == "bits":
+        flags = [str(i) for i, flag in enumerate(value, 1) if flag]
+        return ", ".join(flags) if flags else "none"
+    if hasattr(value, "magnitude"):
+        return f"{value.magnitude:.2f} {value.units:~P}"
+    return str(value)
+
+
+def encode(definition, value):
+    """Data bytes for a DID value, the inverse of decode() (used by the simulator)"""
+    if definition.kind == "ascii":
+        return list(str(value).encode("ascii"))
+    if definition.kind == "bits":
+        flags = list(value)
+        return [sum(1 << bit for bit in range(8) if i + bit < len(flags) and flags[i + bit])
+                for i in range(0, max(len(flags), 1), 8)]
+
+    size = _SIZES[definition.kind]
+    raw = round((float(value) - definition.offset) / definition.scale)
+    signed = definition.kind.startswith("s")
+    limit = 1 << (size * 8 - (1 if signed else 0))
+    raw = max(-limit if signed else 0, min(limit - 1, raw))
+    return list(raw.to_bytes(size, "big", signed=signed))
+
+
+def dtc_code(high, low):
+    """DTC string from its two code bytes, e.g. (0x04, 0x01) -> "P0401" """
+    return "PCBU"[high >> 6] + f"{(high & 0x3F) << 8 | low:04X}"
+
+
+# ------------------------------------------------------------ module I/O
+
+@contextmanager
+def addressed(conn, module, flow=DEFAULT_FLOW):
+    """IsoTpChannel to one module by CAN ID for the duration of the block"""
+    module = MODULES[module] if isinstance(module, str) else module
+    with IsoTpChannel(conn, module, flow) as channel:
+        yield channel
+
+
+def _request(channel, request, positive):
+    """Send a raw request, return the data of the positive reply or raise NegativeResponse"""
+    negative = None
+    for message in channel.request(request):
+        data = message.data
+        if data[:1] == bytes([positive]):
+            return data
+        # 7F xx 78 is "response pending"; the real answer follows in the same reply
+        if len(data) >= 3 and data[0] == 0x7F and data[2] != 0x78:
+            negative = NegativeResponse(data[1], data[2])
+    if negative:
+        raise negative
+    return None
+
+
+def _read_did(channel, definition):
+    data = _request(channel, b"22%04X" % definition.did, 0x62)
+    if data is None or len(data) < 3 or int.from_bytes(bytes(data[1:3]), "big") != definition.did:
+        return None
+    return decode(definition, data[3:])
+
+
+def read_did(conn, module, name):
+    """Read one DID by name from `module`; None if the module didn't answer"""
+    definition = did(name)
+    with addressed(conn, module) as channel:
+        try:
+            return _read_did(channel, definition)
+        except NegativeResponse:
+            return None
+
+
+def read_dids(conn, module, names=None, callback=None):
+    """
+    Read several DIDs (default: every known DID of `module`). Returns
+    {name: value}; `callback(definition, value)` is also called as each one arrives.
+    """
+    definitions = [did(name) for name in names] if names else module_dids(module)
+    values = {}
+    with addressed(conn, module) as channel:
+        for definition in definitions:
+            try:
+                value = _read_did(channel, definition)
+            except NegativeResponse:
+                continue  # not supported by this module/software level
+            if value is not None:
+                values[definition.name] = value
+                if callback:
+                    callback(definition, value)
+    return values
+
+
+def _parse_dtcs(data, offset, record):
+    codes = []
+    for i in range(offset, len(data) - record + 1, record):
+        high, low = data[i], data[i + 1]
+        if high == low == 0:
+            continue
+        code = dtc_code(high, low)
+        codes.append(ModuleDtc(code, describe_dtc(code), data[i + record - 1]))
+    return codes
+
+
+def _module_dtcs(channel):
+    try:
+        data = _request(channel, b"1902%02X" % (STATUS_FAILED | STATUS_PENDING | STATUS_CONFIRMED), 0x59)
+        if data is not None:
+            return _parse_dtcs(data, 3, 4)
+    except NegativeResponse:
+        pass
+    try:
+        data = _request(channel, b"1800FF00", 0x58)
+    except NegativeResponse:
+        return []
+    return _parse_dtcs(data, 2, 3) if data is not None else []
+
+
+def read_module_dtcs(conn, module):
+    """
+    Manufacturer DTCs stored in `module`. UDS 19 02 first (4-byte records:
+    DTC high, low, failure type, status), then KWP 18 00 FF 00 (3-byte
+    records: high, low, status). Returns a list of ModuleDtc.
+    """
+    with addressed(conn, module) as channel:
+        return _module_dtcs(channel)
+
+
+def _discover(channel, names, timeout):
+    """
+    Names of the modules that answer TesterPresent (3E 00; a negative reply
+    counts too). The response-count hint of 1 ends a present module's
+    request as soon as its reply is in, so only absent modules ever wait,
+    once, for the shortened timeout.
+    """
+    conn = channel.conn
+    conn.command(b"ATST%02X" % max(1, round(timeout / ST_UNIT)))
+    try:
+        present = []
+        for name in names:
+            channel.address(MODULES[name])
+            if channel.request(b"3E00", frames=1):
+                present.append(name)
+        return present
+    finally:
+        conn.command(b"ATST%02X" % ST_DEFAULT)  # the channel's timeout
+
+
+def discover_modules(conn, modules=None, timeout=PROBE_TIMEOUT):
+    """Names of the fitted modules among `modules` (default: all of MODULES)"""
+    names = list(modules or MODULES)
+    with addressed(conn, names[0]) as channel:
+        return _discover(channel, names, timeout)
+
+
+def full_scan(conn, modules=None, callback=None, timeout=PROBE_TIMEOUT):
+    """
+    Manufacturer DTCs of every fitted module among `modules` (default: all
+    of MODULES). `callback(name, dtcs)` is called as each module is read.
+    Returns a ScanResult.
+    """
+    started = time.perf_counter()
+    names = list(modules or MODULES)
+    results = {}
+    with addressed(conn, names[0]) as channel:
+        present = _discover(channel, names, timeout)
+        for name in present:
+            channel.address(MODULES[name])
+            results[name] = _module_dtcs(channel)
+            if callback:
+                callback(name, results[name])
+    absent = [name for name in names if name not in results]
+    return ScanResult(results, absent, time.perf_counter() - started)
+
+
+def scan_module(conn, module):
+    """Manufacturer DTCs and every known DID of one module"""
+    return {"dtcs": read_module_dtcs(conn, module), "dids": read_dids(conn, module)}
+
+
+def describe_status(status):
+    """Short text for a UDS DTC status byte"""
+    if status & STATUS_CONFIRMED:
+        return "confirmed"
+    if status & STATUS_PENDING:
+        return "pending"
+    if status & STATUS_FAILED:
+        return "active"
+    return "stored"
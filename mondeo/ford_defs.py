@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Ford Mk4 enhanced diagnostic definitions
+
+Plain text tables, parsed into lookup dicts by mondeo.ford the first time
+a DID or manufacturer DTC is looked up. Nothing here is parsed at import.
+
+DIDS columns: module | DID (hex) | name | type | scale | offset | unit | description
+    type is u8/s8/u16/s16/u24/u32 (value = raw * scale + offset), bits
+    (one flag per bit, LSB first) or ascii. unit is a pint unit name or empty.
+
+DTCS columns: code | description
+"""
+
+DIDS = """
+PCM|F190|VIN|ascii|1|0||Vehicle identification number
+PCM|F188|PCM_SOFTWARE|ascii|1|0||PCM software part number
+PCM|F111|PCM_HARDWARE|ascii|1|0||PCM hardware part number
+PCM|0579|DPF_SOOT_LOAD|u16|0.01|0|gram|DPF soot mass (calculated)
+PCM|057A|DPF_SOOT_PERCENT|u8|0.392157|0|percent|DPF soot load relative to the regeneration threshold
+PCM|057B|DPF_DIFF_PRESSURE|s16|0.01|0|kilopascal|DPF differential pressure
+PCM|057C|DPF_INLET_TEMP|s16|0.1|0|degC|Exhaust gas temperature before DPF
+PCM|0580|DPF_DISTANCE_SINCE_REGEN|u16|1|0|kilometer|Distance since last DPF regeneration
+PCM|0581|DPF_REGEN_STATE|u8|1|0||DPF regeneration state (0 idle, 1 requested, 2 active, 3 inhibited)
+PCM|0434|INJECTOR_CORRECTION_1|s16|0.01|0|milligram|Injector 1 fuel quantity correction per stroke
+PCM|0435|INJECTOR_CORRECTION_2|s16|0.01|0|milligram|Injector 2 fuel quantity correction per stroke
+PCM|0436|INJECTOR_CORRECTION_3|s16|0.01|0|milligram|Injector 3 fuel quantity correction per stroke
+PCM|0437|INJECTOR_CORRECTION_4|s16|0.01|0|milligram|Injector 4 fuel quantity correction per stroke
+PCM|0461|GLOW_PLUG_FAULTS|bits|1|0||Glow plug circuit faults, cylinders 1-4
+PCM|0462|GLOW_PLUG_RELAY|u8|1|0||Glow plug relay commanded on
+PCM|0463|GLOW_TIME_REMAINING|u8|0.1|0|second|Post-glow time remaining
+PCM|1172|FUEL_RAIL_PRESSURE_DESIRED|u16|10|0|kilopascal|Desired fuel rail pressure
+PCM|1173|TURBO_BOOST_DESIRED|u16|0.1|0|kilopascal|Desired boost pressure (absolute)
+ABS|F188|ABS_SOFTWARE|ascii|1|0||ABS software part number
+ABS|2B06|WHEEL_SPEED_FL|u16|0.01|0|kph|Front left wheel speed
+ABS|2B07|WHEEL_SPEED_FR|u16|0.01|0|kph|Front right wheel speed
+ABS|2B08|WHEEL_SPEED_RL|u16|0.01|0|kph|Rear left wheel speed
+ABS|2B09|WHEEL_SPEED_RR|u16|0.01|0|kph|Rear right wheel speed
+ABS|2B0F|ABS_PUMP_MOTOR|u8|1|0||ABS pump motor commanded on
+BCM|F188|BCM_SOFTWARE|ascii|1|0||BCM software part number
+BCM|4028|BATTERY_VOLTAGE|u8|0.1|0|volt|Battery voltage
+BCM|4029|BATTERY_CHARGE|u8|1|0|percent|Battery state of charge
+BCM|DD01|ODOMETER|u24|1|0|kilometer|Odometer
+"""
+
+DTCS = """
+P1000|OBD systems readiness test not complete
+P1211|Fuel rail pressure higher or lower than expected
+P1247|Turbocharger boost pressure low
+P1248|Turbocharger boost pressure not detected
+P1260|Theft detected, vehicle immobilized
+P1335|EGR position sensor minimum/maximum stop performance
+P1378|Glow plug circuit A open
+P1379|Glow plug circuit B open
+P1380|Glow plug circuit C open
+P1381|Glow plug circuit D open
+P1382|Glow plug circuit monitor
+P1383|Glow plug relay circuit
+P1403|EGR valve position sensor circuit
+P1642|CAN link ECM/instrument cluster
+P1658|Fuel injection pump control unit fault
+P2002|Diesel particulate filter efficiency below threshold
+P200E|Diesel particulate filter system over temperature
+P242F|Diesel particulate filter restriction, ash accumulation
+P2452|Diesel particulate filter pressure sensor A circuit
+P2453|Diesel particulate filter pressure sensor A circuit range/performance
+P2458|Diesel particulate filter regeneration duration
+P2459|Diesel particulate filter regeneration frequency
+P2463|Diesel particulate filter restriction, soot accumulation
+P2670|Actuator supply voltage B circuit
+C1095|ABS hydraulic pump motor circuit failure
+C1145|Front right wheel speed sensor input circuit failure
+C1155|Front left wheel speed sensor input circuit failure
+C1165|Rear right wheel speed sensor input circuit failure
+C1175|Rear left wheel speed sensor input circuit failure
+C1233|Front left wheel speed sensor input signal missing
+C1234|Front right wheel speed sensor input signal missing
+C1288|Brake pressure sensor circuit failure
+B1318|Battery voltage low
+B1342|ECU is defective
+B1352|Ignition key-in circuit failure
+B1676|Battery pack voltage out of range
+B2477|Module configuration failure
+U0073|Control module communication bus off
+U0100|Lost communication with ECM/PCM
+U0121|Lost communication with ABS control module
+U0140|Lost communication with body control module
+U0155|Lost communication with instrument panel cluster
+U2023|Fault reported by external module
+"""
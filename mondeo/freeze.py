@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Freeze-frame and readiness bulk reader
+
+Freeze frames (mode 02) are read by first asking the ECU which PIDs it
+stored (the 0200/0220/... bitmaps), then requesting only those, several
+per request on CAN: three PID/frame pairs fit in one single-frame mode 02
+request. Readiness monitors come from mode 01 PIDs 01 (since DTCs were
+cleared) and 41 (this drive cycle), fetched in one request on CAN.
+
+    frames = read_freeze_frames(conn, ["P0401", "P2002"])
+    readiness = read_readiness(conn)
+
+The same mode 02 logic runs on a mondeo.aio.AsyncElm327 through
+read_freeze_frame_async(), which the fleet scan uses.
+"""
+
+from collections import namedtuple
+
+import obd
+
+from mondeo.stream import CAN_PROTOCOLS, split_pids
+
+# PID/frame pairs per mode 02 request: 02 + 3 pairs fills a single CAN frame
+FREEZE_BATCH = 3
+# Most freeze frames read per call; many ECUs only keep frame 0
+MAX_FRAMES = 8
+
+# dtc: the code that stored the frame; values: {PID name: decoded value}
+FreezeFrame = namedtuple("FreezeFrame", "frame dtc values")
+Monitor = namedtuple("Monitor", "name supported complete cycle_enabled cycle_complete")
+Readiness = namedtuple("Readiness", "mil dtc_count ignition monitors")
+
+ACRONYMS = {"EGR": "EGR", "VVT": "VVT", "PM": "PM", "NOX": "NOx", "SCR": "SCR", "NMHC": "NMHC"}
+
+
+def _can(conn):
+    return conn.protocol_id() in CAN_PROTOCOLS
+
+
+def _bitmap_request(base, frame):
+    return b"02%02X%02X" % (base, frame)
+
+
+def _parse_bitmap(reply, base, frame):
+    """PIDs a 02 <base> <frame> reply marks as stored and whether another range follows; None without one"""
+    bitmap = next((m.data[3:7] for m in reply
+                   if m.data[:3] == bytes([0x42, base, frame]) and len(m.data) >= 7), None)
+    if bitmap is None:
+        return None
+    bits = int.from_bytes(bytes(bitmap), "big")
+    return [base + i for i in range(1, 0x20) if bits & (1 << (0x20 - i))], bool(bits & 1)
+
+
+def _decodable(pids):
+    """Only the PIDs python-OBD can decode"""
+    return [pid for pid in pids if obd.commands.has_pid(1, pid)]
+
+
+def _value_requests(pids, frame, can):
+    batch = FREEZE_BATCH if can else 1
+    return [b"02" + b"".join(b"%02X%02X" % (pid, frame) for pid in pids[i:i + batch])
+            for i in range(0, len(pids), batch)]
+
+
+def _freeze_frame(frame, replies):
+    """FreezeFrame from the replies to _value_requests()"""
+    values = {}
+    for reply in replies:
+        values.update((cmd.name, value) for cmd, value in split_pids(reply, mode=0x02))
+    dtc = values.pop("FREEZE_DTC", None)
+    return FreezeFrame(frame, dtc[0] if dtc else None, values)
+
+
+def supported_freeze_pids(conn, frame=0):
+    """PIDs stored in freeze frame `frame`, from the 0200, 0220, ... bitmaps; [] if there is no frame"""
+    pids = []
+    base = 0x00
+    while base < 0xE0:
+        parsed = _parse_bitmap(conn.send_raw(_bitmap_request(base, frame)), base, frame)
+        if parsed is None:
+            break
+        found, more = parsed
+        pids += found
+        if not more:
+            break
+        base += 0x20
+    return _decodable(pids)
+
+
+def read_freeze_frame(conn, frame=0, pids=None):
+    """Read one freeze frame; None if the ECU has no such frame"""
+    if pids is None:
+        pids = supported_freeze_pids(conn, frame)
+    if not pids:
+        return None
+    return _freeze_frame(frame, [conn.send_raw(request) for request in _value_requests(pids, frame, _can(conn))])
+
+
+def read_freeze_frames(conn, codes=None):
+    """
+    Freeze frames for the stored codes, frame 0 first, stopping at the first
+    frame the ECU doesn't have. Returns {code: FreezeFrame}; a frame whose
+    code the ECU doesn't report is keyed by its frame number.
+    """
+    frames = {}
+    count = max(1, min(len(codes or ()), MAX_FRAMES))
+    for number in range(count):
+        frame = read_freeze_frame(conn, number)
+        if frame is None:
+            break
+        frames[frame.dtc or number] = frame
+    return frames
+
+
+# ------------------------------------------------------------------ asyncio
+
+async def supported_freeze_pids_async(adapter, frame=0):
+    """supported_freeze_pids() on a mondeo.aio.AsyncElm327"""
+    pids = []
+    base = 0x00
+    while base < 0xE0:
+        parsed = _parse_bitmap(await adapter.send_raw(_bitmap_request(base, frame)), base, frame)
+        if parsed is None:
+            break
+        found, more = parsed
+        pids += found
+        if not more:
+            break
+        base += 0x20
+    return _decodable(pids)
+
+
+async def read_freeze_frame_async(adapter, frame=0):
+    """read_freeze_frame() on a mondeo.aio.AsyncElm327, for scanning many cars on one loop"""
+    pids = await supported_freeze_pids_async(adapter, frame)
+    if not pids:
+        return None
+    can = adapter.protocol is not None and adapter.protocol.ELM_ID in CAN_PROTOCOLS
+    return _freeze_frame(frame, [await adapter.send_raw(request)
+                                 for request in _value_requests(pids, frame, can)])
+
+
+# ---------------------------------------------------------------- readiness
+
+def read_readiness(conn):
+    """Readiness monitors since DTCs were cleared, with this drive cycle's state where supported"""
+    status_cmd, cycle_cmd = obd.commands.STATUS, obd.commands.STATUS_DRIVE_CYCLE
+    wanted = [cmd for cmd in (status_cmd, cycle_cmd) if conn.supports(cmd)]
+    if status_cmd not in wanted:
+        return None
+
+    if _can(conn) and len(wanted) > 1:
+        values = dict(split_pids(conn.send_raw(b"01" + b"".join(cmd.command[2:] for cmd in wanted))))
+    else:
+        values = {}
+        for cmd in wanted:
+            response = conn.query(cmd)
+            if not response.is_null():
+                values[cmd] = response.value
+
+    status = values.get(status_cmd)
+    if status is None:
+        return None
+    cycle = values.get(cycle_cmd)
+
+    names = obd.codes.BASE_TESTS + (obd.codes.COMPRESSION_TESTS if status.ignition_type == "compression"
+                                    else obd.codes.SPARK_TESTS)
+    monitors = []
+    for name in filter(None, names):
+        test = getattr(status, name)
+        if not test.available:
+            continue
+        this_cycle = getattr(cycle, name) if cycle else None
+        monitors.append(Monitor(name, test.available, test.complete,
+                                this_cycle.available if this_cycle else None,
+                                this_cycle.complete if this_cycle else None))
+    return Readiness(status.MIL, status.DTC_count, status.ignition_type, monitors)
+
+
+def monitor_label(name):
+    """"PM_FILTER_MONITORING" -> "PM filter" """
+    label = " ".join(ACRONYMS.get(word, word.lower()) for word in name.split("_") if word != "MONITORING")
+    return label[:1].upper() + label[1:]
+
+
+def describe_monitor(monitor):
+    """Short state of a Monitor, e.g. "complete" or "incomplete (running this cycle)" """
+    state = "complete" if monitor.complete else "incomplete"
+    if monitor.cycle_enabled is None:
+        return state
+    if not monitor.cycle_enabled:
+        return f"{state} (disabled this cycle)"
+    return f"{state} ({'complete' if monitor.cycle_complete else 'running'} this cycle)"
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+Connection health monitor
+
+A cheap heartbeat (ATRV, answered by the adapter itself without touching
+the bus) runs every HEARTBEAT_INTERVAL seconds; MISSES unanswered beats in
+a row mean the link is lost, so a pulled USB cable or an adapter that lost
+power is noticed within about a second. The monitor then reopens the port
+with the last known baud rate, protocol and supported PIDs, skipping the
+probe and the PID scan, and retries every RECONNECT_INTERVAL until the
+adapter and the car answer again.
+
+ObdWorker runs the heartbeat between jobs and restarts its background
+stream on the new connection (ObdWorker.watch_health()); loops that own
+their connection, like the CLI's, wrap their iterator in keep_alive().
+"""
+
+import time
+from collections import namedtuple
+
+from mondeo import stats
+
+HEARTBEAT_INTERVAL = 0.5  # seconds between heartbeats
+MISSES = 2                # unanswered heartbeats before the link counts as lost
+RECONNECT_INTERVAL = 1.0  # seconds between reconnect attempts
+
+LINK_LOST = "lost"
+LINK_RESTORED = "restored"
+
+# Everything needed to reopen a connection without probing
+LinkSettings = namedtuple("LinkSettings", "port baudrate protocol supported asynchronous fast_mode fast_baud")
+HealthEvent = namedtuple("HealthEvent", "kind port time downtime")
+
+
+def link_settings(conn):
+    """LinkSettings of an open MondeoOBD or SyncConnection"""
+    from mondeo.aio import SyncConnection
+
+    return LinkSettings(conn.port_name(), conn.baudrate, conn.protocol_id() or None,
+                        set(conn.supported_commands), isinstance(conn, SyncConnection),
+                        getattr(conn, "fast_mode", False), getattr(conn, "fast_baud", None))
+
+
+def heartbeat(conn):
+    """Adapter voltage reading, or None if the adapter didn't answer"""
+    if not conn.is_connected():
+        return None
+    try:
+        return conn.heartbeat()
+    except Exception:
+        return None  # a transport error is a missed beat like any other
+
+
+def reopen(settings):
+    """Reconnect with known settings; None if the adapter or the car isn't back yet"""
+    from mondeo.probe import check_port
+
+    # a missing port or a wrong baud fails here in well under a second. An
+    # adapter that was power-cycled is back at its boot rate; one that only
+    # lost the link (USB glitch, cable) may still be at the ATBRD one.
+    baudrate = settings.baudrate
+    if baudrate and not check_port(settings.port, baudrate):
+        baudrate = settings.fast_baud if not settings.asynchronous else None
+        if not baudrate or baudrate == settings.baudrate or not check_port(settings.port, baudrate):
+            return None
+
+    with stats.timer("connect", "reconnect"):
+        if settings.asynchronous:
+            from mondeo.aio import SyncConnection
+
+            conn = SyncConnection(settings.port, baudrate, settings.protocol, fast_mode=settings.fast_mode)
+        else:
+            from mondeo.connection import MondeoOBD
+
+            conn = MondeoOBD(settings.port, baudrate=baudrate, protocol=settings.protocol,
+                             supported=settings.supported, fast_mode=settings.fast_mode,
+                             fast_baud=settings.fast_baud)
+            conn.baudrate = settings.baudrate  # still the rate the next reboot comes back at
+    if conn.is_connected():
+        return conn
+    conn.close()
+    return None
+
+
+class HealthMonitor:
+    """Heartbeat bookkeeping and reconnect timing for one connection at a time"""
+
+    def __init__(self, interval=HEARTBEAT_INTERVAL, misses=MISSES, reconnect_interval=RECONNECT_INTERVAL):
+        self.interval = interval
+        self.misses = misses
+        self.reconnect_interval = reconnect_interval
+        self.settings = None
+        self.connection = None  # the watched connection, replaced on reconnect
+        self.lost_since = None
+        self.reconnects = 0
+        self._missed = 0
+        self._next = 0.0
+
+    @property
+    def lost(self):
+        return self.lost_since is not None
+
+    def attach(self, conn):
+        """Remember the settings of a freshly opened connection"""
+        self.settings = link_settings(conn) if conn and conn.is_connected() else None
+        self.connection = conn
+        self.lost_since = None
+        self._missed = 0
+        self._next = time.monotonic() + self.interval
+
+    def detach(self):
+        """Stop watching (deliberate disconnect)"""
+        self.settings = None
+        self.connection = None
+        self.lost_since = None
+
+    def due(self):
+        return self.settings is not None and time.monotonic() >= self._next
+
+    def timeout(self):
+        """Seconds until the next check is due, or None when not watching"""
+        if self.settings is None:
+            return None
+        return max(0.0, self._next - time.monotonic())
+
+    def check(self, conn):
+        """
+        Run one heartbeat (or, once lost, one reconnect attempt).
+        Returns (HealthEvent or None, connection to use from now on).
+        """
+        if self.lost:
+            self._next = time.monotonic() + self.reconnect_interval
+            new = reopen(self.settings)
+            if new is None:
+                return None, conn
+            self.reconnects += 1
+            event = HealthEvent(LINK_RESTORED, self.settings.port, time.time(),
+                                time.monotonic() - self.lost_since)
+            self.attach(new)
+            return event, new
+
+        self._next = time.monotonic() + self.interval
+        if heartbeat(conn) is not None:
+            self._missed = 0
+            return None, conn
+
+        self._missed += 1
+        if self._missed < self.misses and conn.is_connected():
+            return None, conn
+
+        # lost: release the port so it can be reopened
+        self.lost_since = time.monotonic()
+        self._next = time.monotonic()
+        try:
+            conn.close()
+        except Exception:
+            pass
+        return HealthEvent(LINK_LOST, self.settings.port, time.time(), None), conn
+
+
+def keep_alive(conn, start, monitor=None, on_event=None):
+    """
+    Yield from start(conn), heartbeating the connection in between items.
+    When the link drops, reconnect and carry on with start(new_conn); ends
+    when the iterator ends with the link still up (e.g. after stop()).
+    `on_event(event)` is called for every HealthEvent.
+
+        for sample in keep_alive(conn, stream.restart):
+            ...
+    """
+    monitor = monitor or HealthMonitor()
+    monitor.attach(conn)
+    while True:
+        for item in start(conn):
+            yield item
+            if monitor.due():
+                event, conn = monitor.check(conn)
+                if event:
+                    if on_event:
+                        on_event(event)
+                    break
+        else:
+            if conn.is_connected():
+                return
+
+        # lost (or the iterator ended because the port went away): retry until it's back
+        while True:
+            event, conn = monitor.check(conn)
+            if event:
+                if on_event:
+                    on_event(event)
+                if event.kind == LINK_RESTORED:
+                    break
+            time.sleep(monitor.timeout() or 0.0)
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Local session history
+
+Every connection becomes a session in an SQLite database: the car's VIN,
+the adapter, and what was read during it. That covers DTCs with the times
+they were first and last seen, freeze frames, module DTCs and references
+to PID recordings (mondeo.recorder session directories). Indexes on VIN,
+code and time keep history queries such as "which cars threw P2002 in the
+last 30 days" to an index range scan, however many sessions pile up.
+
+Writes never run on the caller's thread. They are queued, and a writer
+thread commits them in one transaction per batch (BATCH_INTERVAL or
+BATCH_SIZE statements, whichever comes first), each statement under its
+own savepoint so a failing one loses only itself; errors go to the
+mondeo.history logger. The database is in WAL mode, so queries from the
+UI don't wait for the writer either.
+
+    store = HistoryStore()
+    session = store.begin(conn, source="cli")
+    session.record_dtcs(dtc_monitor.active(), dtc_monitor.last_poll)
+    for car in store.cars_with_code("P2002", days=30):
+        print(car.vin, car.sessions, car.last_seen)
+"""
+
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+HISTORY_FILE = os.path.join(os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+                            "mondeo-tool", "history.sqlite3")
+
+BATCH_INTERVAL = 0.5  # seconds the writer collects statements before committing
+BATCH_SIZE = 500      # statements per transaction at most
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    started REAL NOT NULL,
+    ended REAL,
+    vin TEXT,
+    adapter TEXT,
+    port TEXT,
+    protocol TEXT,
+    source TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_vin ON sessions (vin, started);
+CREATE INDEX IF NOT EXISTS sessions_started ON sessions (started);
+
+CREATE TABLE IF NOT EXISTS dtcs (
+    session_id TEXT NOT NULL,
+    module TEXT NOT NULL,  -- '' for generic OBD-II codes, else a mondeo.ford module name
+    code TEXT NOT NULL,
+    status TEXT NOT NULL,
+    vin TEXT,
+    description TEXT,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    PRIMARY KEY (session_id, module, code, status)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS dtcs_code ON dtcs (code, last_seen, vin, first_seen);
+CREATE INDEX IF NOT EXISTS dtcs_vin ON dtcs (vin, last_seen);
+
+CREATE TABLE IF NOT EXISTS freeze_frames (
+    session_id TEXT NOT NULL,
+    frame INTEGER NOT NULL,
+    code TEXT,
+    vin TEXT,
+    time REAL NOT NULL,
+    data TEXT NOT NULL,  -- JSON {PID name: [value, unit]}
+    PRIMARY KEY (session_id, frame)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS freeze_code ON freeze_frames (code, time);
+
+CREATE TABLE IF NOT EXISTS pid_logs (
+    session_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    started REAL NOT NULL,
+    PRIMARY KEY (session_id, path)
+) WITHOUT ROWID;
+"""
+
+_UPSERT_DTC = """
+INSERT INTO dtcs (session_id, module, code, status, vin, description, first_seen, last_seen)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (session_id, module, code, status) DO UPDATE SET
+    first_seen = min(first_seen, excluded.first_seen),
+    last_seen = max(last_seen, excluded.last_seen)
+"""
+
+SessionRow = namedtuple("SessionRow", "id started ended vin adapter port protocol source")
+DtcRow = namedtuple("DtcRow", "session_id module code status description first_seen last_seen")
+CodeHit = namedtuple("CodeHit", "vin sessions first_seen last_seen")
+CodeSummary = namedtuple("CodeSummary", "module code status description first_seen last_seen sessions")
+
+_STOP = object()
+
+logger = logging.getLogger(__name__)
+
+
+def parse_vin(messages):
+    """
+    VIN from the Messages of a raw mode 09 02 reply, or None. python-OBD's
+    decoder strips the characters of its padding pattern from both ends,
+    eating a trailing 0, 1 or 2.
+    """
+    for message in messages:
+        data = message.data
+        if len(data) >= 20 and data[:2] == b"\x49\x02":
+            return data[3:20].decode("ascii", "ignore")
+    return None
+
+
+def read_vin(conn):
+    """VIN of the car behind a connected MondeoOBD, or None"""
+    import obd
+
+    if not conn or not conn.is_connected():
+        return None
+    return parse_vin(conn.send_raw(obd.commands.VIN.command))
+
+
+def _plain(value):
+    """[magnitude, unit] for a Pint quantity, the value itself for JSON types, else its text"""
+    if hasattr(value, "magnitude"):
+        return [float(value.magnitude), f"{value.units:~}"]
+    if isinstance(value, (int, float, str, type(None))):
+        return [value, None]
+    return [str(value), None]
+
+
+def _days_ago(days, now=None):
+    return (now or time.time()) - days * 86400 if days is not None else 0.0
+
+
+class Session:
+    """One connection's history; every method only queues a write"""
+
+    def __init__(self, store, session_id, vin):
+        self.store = store
+        self.id = session_id
+        self.vin = vin
+
+    def record_dtcs(self, dtcs, t=None, module=""):
+        """
+        Codes present at time `t`: mondeo.monitor.ActiveDtc (with first_seen)
+        or anything with code, description and a status string.
+        """
+        t = t or time.time()
+        self.store.write_many(_UPSERT_DTC, [
+            (self.id, module, dtc.code, dtc.status, self.vin, dtc.description,
+             getattr(dtc, "first_seen", None) or t, t) for dtc in dtcs])
+
+    def record_module_dtcs(self, module, dtcs, t=None):
+        """mondeo.ford.ModuleDtcs read from `module`"""
+        from mondeo.ford import describe_status
+
+        t = t or time.time()
+        self.store.write_many(_UPSERT_DTC, [
+            (self.id, module, dtc.code, describe_status(dtc.status), self.vin, dtc.description, t, t)
+            for dtc in dtcs])
+
+    def record_freeze(self, frames, t=None):
+        """{code: mondeo.freeze.FreezeFrame} as read_freeze_frames() returns it"""
+        t = t or time.time()
+        self.store.write_many(
+            "INSERT OR REPLACE INTO freeze_frames (session_id, frame, code, vin, time, data) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.id, frame.frame, frame.dtc, self.vin, t,
+              json.dumps({name: _plain(value) for name, value in frame.values.items()}))
+             for frame in frames.values()])
+
+    def add_log(self, path, started=None):
+        """Reference a PID recording (a mondeo.recorder session directory)"""
+        self.store.write("INSERT OR IGNORE INTO pid_logs (session_id, path, started) VALUES (?, ?, ?)",
+                         (self.id, os.path.abspath(path), started or time.time()))
+
+    def end(self, t=None):
+        self.store.write("UPDATE sessions SET ended = ? WHERE id = ?", (t or time.time(), self.id))
+
+
+class HistoryStore:
+    """The session database: queued, batched writes and indexed queries"""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._queue = queue.Queue()
+        self._local = threading.local()  # one reading connection per thread
+        db = self._connect()
+        try:
+            version = db.execute("PRAGMA user_version").fetchone()[0]
+            db.executescript(SCHEMA)
+            if version < SCHEMA_VERSION:
+                db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        finally:
+            db.close()
+        self._writer = threading.Thread(target=self._write_loop, name="history-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=10)
+        db.execute("PRAGMA journal_mode = WAL")
+        db.execute("PRAGMA synchronous = NORMAL")  # durable at checkpoints, no fsync per commit
+        return db
+
+    # ------------------------------------------------------------- writing
+
+    def write(self, sql, params=()):
+        """Queue one statement; returns at once"""
+        self._queue.put((sql, params, False))
+
+    def write_many(self, sql, rows):
+        if rows:
+            self._queue.put((sql, rows, True))
+
+    def _write_loop(self):
+        db = self._connect()
+        db.isolation_level = None  # transactions and savepoints are managed here
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                deadline = time.monotonic() + BATCH_INTERVAL
+                while item is not _STOP and len(batch) < BATCH_SIZE:
+                    try:
+                        item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+                try:
+                    self._write_batch(db, [entry for entry in batch if entry is not _STOP])
+                finally:
+                    for _ in batch:
+                        self._queue.task_done()
+                if any(entry is _STOP for entry in batch):
+                    return
+        finally:
+            db.close()
+
+    def _write_batch(self, db, batch):
+        """
+        One transaction per batch, each entry under its own savepoint, so a
+        failing statement is dropped without taking the rest of the batch along
+        """
+        try:
+            db.execute("BEGIN")
+            for sql, params, many in batch:
+                db.execute("SAVEPOINT entry")
+                try:
+                    (db.executemany if many else db.execute)(sql, params)
+                except Exception as e:
+                    db.execute("ROLLBACK TO entry")
+                    logger.error("Session history: dropped a write: %s", e)
+                db.execute("RELEASE entry")
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            logger.error("Session history: %s", e)
+
+    def flush(self):
+        """Block until every queued write is committed"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+
+    # ------------------------------------------------------------ sessions
+
+    def begin(self, conn, source="cli", vin=None):
+        """
+        Start a session for an open connection; reads the VIN unless given.
+        Runs on the caller's thread (it talks to the car), the insert is queued.
+        """
+        from mondeo.profiles import adapter_key
+
+        vin = vin if vin is not None else read_vin(conn)
+        port = conn.port_name()
+        session = Session(self, uuid.uuid4().hex, vin)
+        self.write("INSERT INTO sessions (id, started, vin, adapter, port, protocol, source) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                   (session.id, time.time(), vin, adapter_key(port), port, conn.protocol_id() or None, source))
+        return session
+
+    # ------------------------------------------------------------- queries
+
+    def _db(self):
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = self._connect()
+        return db
+
+    def cars_with_code(self, code, days=30, now=None):
+        """Cars that reported `code` in the last `days` days (None = ever), most recent first"""
+        rows = self._db().execute(
+            "SELECT vin, COUNT(DISTINCT session_id), MIN(first_seen), MAX(last_seen) FROM dtcs "
+            "WHERE code = ? AND last_seen >= ? GROUP BY vin ORDER BY MAX(last_seen) DESC",
+            (code.upper(), _days_ago(days, now))).fetchall()
+        return [CodeHit(*row) for row in rows]
+
+    def sessions(self, vin=None, days=None, limit=50, now=None):
+        """Sessions, newest first, optionally of one car and/or the last `days` days"""
+        if vin is not None:
+            rows = self._db().execute(
+                "SELECT * FROM sessions WHERE vin = ? AND started >= ? ORDER BY started DESC LIMIT ?",
+                (vin, _days_ago(days, now), limit))
+        else:
+            rows = self._db().execute(
+                "SELECT * FROM sessions WHERE started >= ? ORDER BY started DESC LIMIT ?",
+                (_days_ago(days, now), limit))
+        return [SessionRow(*row) for row in rows.fetchall()]
+
+    def vehicle_codes(self, vin, days=None, now=None):
+        """Every code a car reported, with when it was first and last seen across sessions"""
+        rows = self._db().execute(
+            "SELECT module, code, status, description, MIN(first_seen), MAX(last_seen), COUNT(*) "
+            "FROM dtcs WHERE vin = ? AND last_seen >= ? GROUP BY module, code, status "
+            "ORDER BY MAX(last_seen) DESC",
+            (vin, _days_ago(days, now))).fetchall()
+        return [CodeSummary(*row) for row in rows]
+
+    def session_dtcs(self, session_id):
+        rows = self._db().execute(
+            "SELECT session_id, module, code, status, description, first_seen, last_seen FROM dtcs "
+            "WHERE session_id = ? ORDER BY first_seen", (session_id,)).fetchall()
+        return [DtcRow(*row) for row in rows]
+
+    def pid_logs(self, session_id):
+        """Paths of the PID recordings made during a session"""
+        return [row[0] for row in self._db().execute(
+            "SELECT path FROM pid_logs WHERE session_id = ? ORDER BY started", (session_id,))]
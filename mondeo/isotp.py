@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+"""
+ISO-TP (ISO 15765-2) transport over the ELM327
+
+python-OBD reassembles multi-frame replies only behind its own commands.
+This layer talks to one module directly: the request header (ATSH), the
+receive filter (ATCRA) and the flow control frame the adapter answers a
+first frame with (ATFCSH/ATFCSD/ATFCSM1: block size and separation time)
+are set per channel, and the headers-on reply lines are reassembled here.
+
+Reassembly copies consecutive frames straight into one preallocated
+4095-byte buffer per sending CAN ID, so a long reply (many DTCs, the VIN,
+a mode 22 block) costs no allocation per frame and one copy at the end.
+
+BusMonitor puts the adapter into ATMA (monitor all) mode. Its reader
+thread only moves bytes: it takes whatever the port has, splits it into
+lines in one bytes.split() and queues them, so the adapter's output is
+drained at its full rate however slow the consumer is; parsing and
+reassembly happen on the consumer's side. Lines the adapter itself had
+to drop are reported by it as BUFFER FULL and counted in `overflows`.
+
+    with IsoTpChannel(conn, ford.MODULES["PCM"], FlowControl(0, 0.0)) as pcm:
+        for message in pcm.request(b"1902FF"):
+            print(f"{message.can_id:03X}", message.data.hex())
+
+    with BusMonitor(conn) as monitor:
+        for message in monitor.messages(timeout=10):
+            ...
+"""
+
+import threading
+import time
+from collections import deque, namedtuple
+
+MAX_LENGTH = 4095  # longest ISO-TP message (12-bit length)
+
+# PCI frame types (high nibble of the first data byte)
+SINGLE = 0x0
+FIRST = 0x1
+CONSECUTIVE = 0x2
+FLOW = 0x3
+
+FUNCTIONAL_ID = 0x7DF
+MONITOR_POLL = 0.05  # seconds; read timeout of the monitor's reader thread
+
+# separation_time in seconds; STmin resolution is 1 ms, or 100 us below 1 ms
+FlowControl = namedtuple("FlowControl", "block_size separation_time")
+DEFAULT_FLOW = FlowControl(0, 0.0)  # the whole message in one block, frames back to back
+
+Frame = namedtuple("Frame", "can_id data time")
+IsoTpMessage = namedtuple("IsoTpMessage", "can_id data time")
+
+
+def encode_stmin(seconds):
+    """ISO-TP STmin byte: 0x00-0x7F milliseconds, 0xF1-0xF9 100-900 microseconds"""
+    if seconds <= 0:
+        return 0x00
+    if seconds < 0.001:
+        return 0xF0 + max(1, min(9, round(seconds * 10000)))
+    return min(0x7F, round(seconds * 1000))
+
+
+def flow_control_data(flow):
+    """ATFCSD argument for a FlowControl: 30 (continue to send), block size, STmin"""
+    return b"30%02X%02X" % (min(0xFF, max(0, flow.block_size)), encode_stmin(flow.separation_time))
+
+
+def parse_frame(line, extended=False, t=None):
+    """Frame from one headers-on adapter line ("7E8 10 14 49 02 01 57 46 30"), None if it isn't one"""
+    text = (line if isinstance(line, bytes) else line.encode("ascii", "ignore")).replace(b" ", b"")
+    width = 8 if extended else 3
+    if len(text) <= width or len(text) % 2 != width % 2:
+        return None
+    try:
+        return Frame(int(text[:width], 16), bytes.fromhex(text[width:].decode("ascii")), t)
+    except ValueError:
+        return None  # NO DATA, STOPPED, BUFFER FULL and the like
+
+
+class _Transfer:
+    """Reassembly state of one sending CAN ID; the buffer is reused for every message"""
+
+    __slots__ = ("buffer", "length", "filled", "sequence")
+
+    def __init__(self):
+        self.buffer = memoryview(bytearray(MAX_LENGTH))
+        self.length = 0  # 0 while no multi-frame message is in progress
+        self.filled = 0
+        self.sequence = 0
+
+
+class Reassembler:
+    """ISO-TP messages from CAN frames, reassembled per sending CAN ID"""
+
+    def __init__(self):
+        self._transfers = {}  # can_id -> _Transfer
+        self.errors = 0  # messages dropped: sequence gaps, stray consecutive frames, bad lengths
+
+    def feed(self, frame):
+        """The IsoTpMessage `frame` completes, or None"""
+        data = frame.data
+        if not data:
+            return None
+        kind = data[0] >> 4
+
+        if kind == SINGLE:
+            length = data[0] & 0x0F
+            if not 0 < length < len(data):
+                self.errors += 1
+                return None
+            return IsoTpMessage(frame.can_id, bytes(data[1:1 + length]), frame.time)
+
+        if kind == FIRST:
+            transfer = self._transfers.get(frame.can_id)
+            if transfer is None:
+                transfer = self._transfers[frame.can_id] = _Transfer()
+            elif transfer.length:
+                self.errors += 1  # the previous message never finished
+            length = (data[0] & 0x0F) << 8 | data[1] if len(data) > 1 else 0
+            if length < 8:
+                transfer.length = 0
+                self.errors += 1
+                return None
+            chunk = data[2:2 + length]
+            transfer.buffer[:len(chunk)] = chunk
+            transfer.length, transfer.filled, transfer.sequence = length, len(chunk), 1
+            return None
+
+        if kind == CONSECUTIVE:
+            transfer = self._transfers.get(frame.can_id)
+            if transfer is None or not transfer.length:
+                self.errors += 1
+                return None
+            if data[0] & 0x0F != transfer.sequence:
+                transfer.length = 0
+                self.errors += 1
+                return None
+            chunk = data[1:1 + transfer.length - transfer.filled]
+            transfer.buffer[transfer.filled:transfer.filled + len(chunk)] = chunk
+            transfer.filled += len(chunk)
+            transfer.sequence = (transfer.sequence + 1) & 0x0F
+            if transfer.filled < transfer.length:
+                return None
+            transfer.length = 0
+            return IsoTpMessage(frame.can_id, bytes(transfer.buffer[:transfer.filled]), frame.time)
+
+        return None  # flow control frames (from the tester side) carry no data
+
+    def reset(self):
+        """Forget unfinished messages (the buffers are kept)"""
+        for transfer in self._transfers.values():
+            transfer.length = 0
+
+
+# ----------------------------------------------------------------- requests
+
+def tuned_timeout(conn):
+    """The fast-mode ATST command in effect on `conn`, or None"""
+    settings = getattr(conn, "fast_settings", None) or ()
+    return next((setting for setting in reversed(settings) if setting.startswith(b"ATST")), None)
+
+
+class IsoTpChannel:
+    """
+    Physically addressed requests to one module (anything with 11-bit
+    request_id and response_id, e.g. a mondeo.ford.Module). `flow` sets
+    the flow control the adapter sends; None leaves the adapter's default.
+    Settings that the adapter rejects are left at its defaults. A fast-mode
+    ATST (sized from the PCM's replies, see MondeoOBD.tune()) is put back to
+    the adapter default while the channel is open: modules answer slower.
+    """
+
+    def __init__(self, conn, module, flow=DEFAULT_FLOW):
+        self.conn = conn
+        self.module = module
+        self.flow = flow
+        self.reassembler = Reassembler()
+        self._flow_set = False
+        self._tuned_timeout = None
+
+    def open(self):
+        from mondeo.connection import ST_DEFAULT
+
+        self.conn.command(b"ATH1")  # PCI bytes are only visible with headers on
+        self._tuned_timeout = tuned_timeout(self.conn)
+        if self._tuned_timeout:
+            self.conn.command(b"ATST%02X" % ST_DEFAULT)
+        self.address(self.module)
+        if self.flow is not None:
+            settings = (b"ATFCSH%03X" % self.module.request_id, b"ATFCSD" + flow_control_data(self.flow),
+                        b"ATFCSM1")
+            self._flow_set = all("OK" in self.conn.command(setting) for setting in settings)
+            if not self._flow_set:
+                self.conn.command(b"ATFCSM0")  # clone without user flow control: adapter default
+        return self
+
+    def address(self, module):
+        """Point the open channel at another module"""
+        self.module = module
+        self.conn.command(b"ATSH%03X" % module.request_id)
+        self.conn.command(b"ATCRA%03X" % module.response_id)
+        if self._flow_set:
+            self.conn.command(b"ATFCSH%03X" % module.request_id)
+
+    def close(self):
+        if self._flow_set:
+            self.conn.command(b"ATFCSM0")
+            self._flow_set = False
+        self.conn.command(b"ATCRA")
+        self.conn.command(b"ATSH%03X" % FUNCTIONAL_ID)
+        if self._tuned_timeout:
+            self.conn.command(self._tuned_timeout)
+            self._tuned_timeout = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, payload, frames=None):
+        """
+        Send `payload` (hex string bytes, e.g. b"1902FF") and return the
+        reassembled replies as IsoTpMessages, in arrival order. `frames` is
+        the ELM's response-count hint: it stops listening once that many
+        frames are in instead of waiting out its timeout.
+        """
+        now = time.time()
+        self.reassembler.reset()
+        messages = []
+        for line in self.conn.command(payload + b"%X" % frames if frames else payload):
+            frame = parse_frame(line, t=now)
+            if frame is not None:
+                message = self.reassembler.feed(frame)
+                if message is not None:
+                    messages.append(message)
+        return messages
+
+
+# ------------------------------------------------------------------ monitor
+
+class BusMonitor:
+    """
+    Every frame on the bus through the adapter's ATMA mode. Needs a
+    MondeoOBD, whose serial port it takes over until stop(); no other
+    requests may be sent meanwhile.
+    """
+
+    def __init__(self, conn, extended=None, command=b"ATMA"):
+        self.conn = conn
+        # 29-bit IDs on ISO 15765-4 protocols 7 and 9
+        self.extended = conn.protocol_id() in ("7", "9") if extended is None else extended
+        self.command = command
+        self.reassembler = Reassembler()
+        self.received = 0   # frames parsed
+        self.overflows = 0  # BUFFER FULL reports: frames the adapter dropped
+        self.started = None
+        self.stopped = None
+        self._chunks = deque()  # (time, [line, ...]) per read, appended by the reader thread
+        self._port = None
+        self._timeout = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self):
+        interface = getattr(self.conn, "interface", None)
+        port = getattr(interface, "_ELM327__port", None) if interface else None
+        if port is None:
+            raise RuntimeError("The bus monitor needs a connected MondeoOBD")
+        self.conn.command(b"ATH1")
+        self._port = port
+        self._timeout, port.timeout = port.timeout, MONITOR_POLL
+        port.reset_input_buffer()
+        port.write(self.command + b"\r")
+        port.flush()
+        self.started = time.monotonic()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._read, name="bus-monitor", daemon=True)
+        self._thread.start()
+        return self
+
+    def _read(self):
+        port, chunks = self._port, self._chunks
+        pending = b""
+        while not self._stop.is_set():
+            try:
+                data = port.read(port.in_waiting or 1)
+            except Exception:
+                break  # port gone; the health monitor notices on the next heartbeat
+            if data:
+                *lines, pending = (pending + data).split(b"\r")
+                if lines:
+                    chunks.append((time.time(), lines))
+
+    def stop(self):
+        """Leave monitor mode (any character ends it) and give the port back"""
+        if self._thread is None:
+            return
+        from mondeo.connection import _read_until
+
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.stopped = time.monotonic()
+        try:
+            self._port.write(b"\r")
+            tail = _read_until(self._port, b">", 1.0)  # the last frames, STOPPED and the prompt
+            self._chunks.append((time.time(), tail.rstrip(b">").split(b"\r")))
+        except Exception:
+            pass
+        finally:
+            self._port.timeout = self._timeout
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def frames(self, timeout=None):
+        """Yield Frames as they arrive, until stop() or `timeout` seconds"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        chunks = self._chunks
+        while True:
+            try:
+                t, lines = chunks.popleft()
+            except IndexError:
+                if not self.running or (deadline and time.monotonic() >= deadline):
+                    return
+                time.sleep(0.005)
+                continue
+            for line in lines:
+                frame = parse_frame(line, self.extended, t)
+                if frame is not None:
+                    self.received += 1
+                    yield frame
+                elif line.startswith(b"BUFFER FULL"):
+                    self.overflows += 1
+            if deadline and time.monotonic() >= deadline:
+                return
+
+    def messages(self, timeout=None):
+        """Yield reassembled IsoTpMessages (see frames())"""
+        for frame in self.frames(timeout):
+            message = self.reassembler.feed(frame)
+            if message is not None:
+                yield message
+
+    def rate(self):
+        """Frames per second parsed so far"""
+        if self.started is None:
+            return 0.0
+        elapsed = (self.stopped or time.monotonic()) - self.started
+        return self.received / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+Incremental DTC monitor
+
+Polls stored (mode 03) and pending (mode 07) codes and diffs every read
+against the previous snapshot, so callers only see what changed: an
+"appeared" event when a code shows up and a "cleared" event when it goes
+away, each carrying the time the code was first seen. Unchanged reads
+produce no events, and a pending code that comes and goes between polls
+still leaves an appeared/cleared pair behind. A read the ECU doesn't
+answer is not diffed at all (no answer is not the same as no codes): the
+poll is marked `failed` and callers show that instead of the codes of
+the last good read. Descriptions come from the offline database
+(mondeo.dtcdb), so Ford codes read as Ford documents them rather than
+with python-OBD's generic text.
+
+The monitor keeps no connection of its own; poll(conn) fits
+ObdWorker.submit() in the GUI, watch(conn) is a blocking generator for
+the CLI.
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from mondeo.dtcdb import describe
+
+DEFAULT_INTERVAL = 5.0  # seconds between polls
+TICK = 0.25             # seconds; watch() hands control back at least this often
+
+STORED = "stored"
+PENDING = "pending"
+
+APPEARED = "appeared"
+CLEARED = "cleared"
+
+# time: when the change was seen; first_seen: when the code first appeared
+DtcEvent = namedtuple("DtcEvent", "kind code description status time first_seen")
+ActiveDtc = namedtuple("ActiveDtc", "code description status first_seen")
+
+
+class DtcMonitor:
+    """Diffs successive mode 03/07 reads into appeared/cleared events"""
+
+    def __init__(self, interval=DEFAULT_INTERVAL, pending=True):
+        self.interval = interval
+        self.pending = pending
+        self.polls = 0
+        self.last_poll = None  # time of the latest read the ECU answered
+        self.failed = False    # the latest poll got no answer to a read
+        self._active = {}  # (status, code) -> ActiveDtc
+        self._lock = threading.Lock()  # polled on the OBD worker, read on the UI thread
+        self._running = False
+
+    def active(self, status=None):
+        """Codes present in the latest read, oldest first"""
+        with self._lock:
+            codes = sorted(self._active.values(), key=lambda dtc: (dtc.first_seen, dtc.code))
+        return [dtc for dtc in codes if status is None or dtc.status == status]
+
+    def poll(self, conn):
+        """Read stored (and pending) codes once; returns the list of DtcEvents"""
+        import obd
+
+        reads = [(STORED, obd.commands.GET_DTC)]
+        if self.pending:
+            reads.append((PENDING, obd.commands.GET_CURRENT_DTC))
+
+        events = []
+        failed = False
+        for status, cmd in reads:
+            response = conn.query(cmd)
+            # python-OBD turns NO DATA into a non-null response with no codes
+            if response.is_null() or not any(message.data for message in response.messages):
+                failed = True
+                continue
+            with self._lock:
+                events += self._diff(status, response.value or [], response.time or time.time())
+
+        self.polls += 1
+        self.failed = failed
+        if not failed:
+            self.last_poll = time.time()
+        return events
+
+    def _diff(self, status, codes, now):
+        current = {code: describe(code) or desc for code, desc in codes}
+        events = []
+        for code, desc in current.items():
+            if (status, code) not in self._active:
+                self._active[(status, code)] = ActiveDtc(code, desc, status, now)
+                events.append(DtcEvent(APPEARED, code, desc, status, now, now))
+        for key, dtc in list(self._active.items()):
+            if key[0] == status and dtc.code not in current:
+                del self._active[key]
+                events.append(DtcEvent(CLEARED, dtc.code, dtc.description, status, now, dtc.first_seen))
+        return events
+
+    def reset(self):
+        """Forget the snapshot (e.g. after switching cars)"""
+        with self._lock:
+            self._active.clear()
+        self.last_poll = None
+        self.failed = False
+
+    def stop(self):
+        self._running = False
+
+    def watch(self, conn):
+        """
+        Poll every `interval` seconds and yield events until stop() or
+        disconnect. Between polls it yields None every TICK seconds, so a
+        caller such as mondeo.health.keep_alive() gets to heartbeat the link
+        while nothing changes.
+        """
+        self._running = True
+        while self._running and conn.is_connected():
+            start = time.monotonic()
+            yield from self.poll(conn)
+            yield None
+            while self._running:
+                remaining = self.interval - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                time.sleep(min(TICK, remaining))
+                yield None
+
+
+def format_event(event):
+    """One-line description of a DtcEvent"""
+    first_seen = time.strftime("%H:%M:%S", time.localtime(event.first_seen))
+    if event.kind == APPEARED:
+        return f"{event.code} ({event.status}) appeared at {first_seen}: {event.description}"
+    cleared = time.strftime("%H:%M:%S", time.localtime(event.time))
+    return f"{event.code} ({event.status}) cleared at {cleared}, first seen {first_seen}: {event.description}"
@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Serial port registry with hotplug
+
+The port list is built once and then kept up to date from hotplug events
+instead of rescanning on every click: udev through pyudev when it is
+installed, otherwise inotify on /dev (Linux, no extra dependency), and
+polling comports() only where neither is available. A plugged-in port is
+described from sysfs alone, so nothing else is rescanned.
+
+Ports are ranked by USB VID:PID against the bridges OBD-II adapters are
+built on (CH340, FTDI, CP210x, PL2303), with OBD-specific product names
+(OBDLink, vLinker, "ELM327") first. `on_added` lets the UI connect as soon
+as a known adapter is plugged in.
+
+    registry = PortRegistry()
+    registry.start(on_added=lambda port: print("plugged in:", port.device))
+    connect_fastest(registry.candidates())
+"""
+
+import os
+import select
+import struct
+import threading
+import time
+from collections import namedtuple
+
+import serial.tools.list_ports
+
+# Lower ranks are tried and listed first
+RANK_OBD = 0     # OBD-specific adapter (product name says so)
+RANK_BRIDGE = 1  # USB-serial bridge used by ELM327 adapters and clones
+RANK_USB = 2     # other USB serial device
+RANK_OTHER = 3   # built-in or unknown serial port
+
+# (VID, PID) -> bridge name
+KNOWN_ADAPTERS = {
+    (0x1A86, 0x7523): "CH340",
+    (0x1A86, 0x5523): "CH341",
+    (0x1A86, 0x55D4): "CH9102",
+    (0x0403, 0x6001): "FTDI FT232R",
+    (0x0403, 0x6015): "FTDI FT-X",
+    (0x10C4, 0xEA60): "CP210x",
+    (0x067B, 0x2303): "PL2303",
+    (0x067B, 0x23A3): "PL2303GC",
+}
+OBD_KEYWORDS = ("obd", "elm", "stn11", "stn21", "vlinker", "vgate")
+
+# /dev names that come and go with hotplug (USB, CDC-ACM, Bluetooth RFCOMM)
+HOTPLUG_PREFIXES = ("ttyUSB", "ttyACM", "rfcomm")
+
+POLL_INTERVAL = 1.0  # seconds between comports() scans without udev/inotify
+READY_TIMEOUT = 2.0  # seconds to wait for udev to make a new node accessible
+
+PortInfo = namedtuple("PortInfo", "device description vid pid adapter rank")
+
+# inotify(7)
+_IN_ATTRIB = 0x00000004
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_EVENT = struct.Struct("iIII")
+
+
+def rank_port(device, description="", vid=None, pid=None):
+    """PortInfo for a port, ranked by the known-adapter table"""
+    adapter = KNOWN_ADAPTERS.get((vid, pid)) if vid is not None else None
+    text = f"{description or ''} {os.path.basename(device)}".lower()
+    if any(keyword in text for keyword in OBD_KEYWORDS) or device.startswith("/dev/rfcomm"):
+        rank = RANK_OBD
+    elif adapter:
+        rank = RANK_BRIDGE
+    elif vid is not None:
+        rank = RANK_USB
+    else:
+        rank = RANK_OTHER
+    if adapter and adapter.lower() not in (description or "").lower():
+        description = f"{description} [{adapter}]" if description and description != "n/a" else adapter
+    return PortInfo(device, description or "n/a", vid, pid, adapter, rank)
+
+
+def _info(port):
+    return rank_port(port.device, port.description, port.vid, port.pid)
+
+
+def scan_ports():
+    """Every serial port, described and ranked (a full comports() scan)"""
+    return [_info(port) for port in serial.tools.list_ports.comports()]
+
+
+def describe_port(device):
+    """PortInfo of a single port without a full scan where the platform allows it"""
+    try:
+        from serial.tools.list_ports_linux import SysFS
+    except ImportError:
+        return next((info for info in scan_ports() if info.device == device), None)
+    return _info(SysFS(device))
+
+
+def _wait_ready(device, timeout=READY_TIMEOUT):
+    """Wait for udev to give a new node its permissions; False if it never opens up"""
+    deadline = time.monotonic() + timeout
+    while not os.access(device, os.R_OK | os.W_OK):
+        if time.monotonic() >= deadline or not os.path.exists(device):
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _inotify_events(directory, stop):
+    """Yield ("add" | "remove", name) for entries created/removed in `directory` until `stop` is set"""
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+    if fd < 0:
+        raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+    try:
+        if libc.inotify_add_watch(fd, directory.encode(), _IN_CREATE | _IN_DELETE | _IN_ATTRIB) < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch {directory} failed")
+        while not stop.is_set():
+            if not select.select([fd], [], [], 0.5)[0]:
+                continue
+            data = os.read(fd, 4096)
+            offset = 0
+            while offset + _EVENT.size <= len(data):
+                _, mask, _, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b"\0").decode()
+                offset += _EVENT.size + length
+                if mask & _IN_DELETE:
+                    yield "remove", name
+                elif mask & (_IN_CREATE | _IN_ATTRIB):
+                    yield "add", name
+    finally:
+        os.close(fd)
+
+
+class PortRegistry:
+    """Current serial ports, kept up to date by a hotplug watcher thread"""
+
+    def __init__(self):
+        self._ports = {}  # device -> PortInfo
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        self.backend = None  # "udev", "inotify" or "poll" once started
+        self.on_added = None
+        self.on_removed = None
+        self.refresh()
+
+    def refresh(self):
+        """Full rescan; only needed when no watcher is running"""
+        ports = {info.device: info for info in scan_ports()}
+        with self._changed:
+            self._ports = ports
+            self._changed.notify_all()
+
+    def ports(self):
+        """Known ports, best ranked first"""
+        with self._changed:
+            ports = list(self._ports.values())
+        return sorted(ports, key=lambda info: (info.rank, info.device))
+
+    def adapters(self):
+        """Ports that look like an OBD-II adapter (any USB serial device), best first"""
+        return [info for info in self.ports() if info.rank <= RANK_USB]
+
+    def candidates(self):
+        """Devices worth probing: the likely adapters, or every port if none looks like one"""
+        return [info.device for info in self.adapters() or self.ports()]
+
+    def wait_for_adapter(self, timeout=None):
+        """Block until a likely adapter is plugged in (or `timeout` passes); returns adapters()"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while not any(info.rank <= RANK_USB for info in self._ports.values()):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                # short waits so Ctrl+C gets through on the main thread
+                self._changed.wait(0.5 if remaining is None else min(0.5, remaining))
+        return self.adapters()
+
+    # ------------------------------------------------------------ hotplug
+
+    def start(self, on_added=None, on_removed=None):
+        """
+        Start watching for hotplug events. `on_added(PortInfo)` and
+        `on_removed(device)` are called on the watcher thread.
+        """
+        self.on_added = on_added
+        self.on_removed = on_removed
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="port-watch", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+            self._thread = None
+
+    def _watch(self):
+        for backend, watch in (("udev", self._watch_udev), ("inotify", self._watch_inotify),
+                               ("poll", self._watch_poll)):
+            try:
+                self.backend = backend
+                watch()
+                return
+            except (ImportError, OSError, AttributeError):
+                continue  # not available here, try the next one
+
+    def _watch_udev(self):
+        import pyudev
+
+        monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        monitor.filter_by("tty")
+        monitor.start()
+        self.refresh()  # anything plugged in before the monitor started
+        while not self._stop.is_set():
+            device = monitor.poll(timeout=0.5)
+            if device is None or not device.device_node:
+                continue
+            if device.action == "add":
+                self._added(device.device_node)
+            elif device.action == "remove":
+                self._removed(device.device_node)
+
+    def _watch_inotify(self):
+        if not os.path.isdir("/dev"):
+            raise OSError("no /dev")
+        events = _inotify_events("/dev", self._stop)
+        self.refresh()
+        for kind, name in events:
+            if not name.startswith(HOTPLUG_PREFIXES):
+                continue
+            device = os.path.join("/dev", name)
+            if kind == "remove":
+                self._removed(device)
+            elif device not in self._ports and _wait_ready(device):
+                self._added(device)
+
+    def _watch_poll(self):
+        while not self._stop.wait(POLL_INTERVAL):
+            current = {info.device: info for info in scan_ports()}
+            for device in set(self._ports) - set(current):
+                self._removed(device)
+            for device in set(current) - set(self._ports):
+                self._added(device, current[device])
+
+    def _added(self, device, info=None):
+        info = info or describe_port(device)
+        if info is None:
+            return
+        with self._changed:
+            known = device in self._ports
+            self._ports[device] = info
+            self._changed.notify_all()
+        if not known and self.on_added:
+            self.on_added(info)
+
+    def _removed(self, device):
+        with self._changed:
+            known = self._ports.pop(device, None) is not None
+            self._changed.notify_all()
+        if known and self.on_removed:
+            self.on_removed(device)
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+Concurrent adapter probing
+
+Every candidate port is probed in its own thread. Within a port the baud
+rates are tried from most to least likely, each with a short timeout that
+adapts to how quickly the adapter answered. The first adapter that answers
+ATZ and gets a reply to 0100 from the car wins, and every other probe is
+cancelled and its port closed.
+
+When the adapter has a cached profile (see mondeo.profiles) its settings
+are tried first, and the full probe only runs if they have gone stale.
+"""
+
+import logging
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import serial
+
+from mondeo import stats
+from mondeo.profiles import load_profile, save_profile, forget_profile, decode_supported
+
+# Boot defaults first (38400 for genuine ELM327, 9600 for many clones),
+# then the rates adapters are commonly reprogrammed to.
+TRY_BAUDS = [38400, 9600, 115200, 57600, 230400, 19200]
+
+# Timeouts in seconds
+INITIAL_TIMEOUT = 0.3    # first prompt at an unknown baud rate
+MIN_TIMEOUT = 0.2        # floor for adaptive AT command timeouts
+MAX_TIMEOUT = 2.0        # ceiling for adaptive AT command timeouts
+RESET_TIMEOUT = 1.5      # ATZ reboots the ELM, allow it to come back
+SEARCH_TIMEOUT = 6.0     # 0100 may trigger a protocol search ("SEARCHING...")
+
+ProbeResult = namedtuple("ProbeResult", "port baudrate protocol car_connected elapsed")
+
+logger = logging.getLogger(__name__)
+
+
+class ProbeCancelled(Exception):
+    """Raised inside a probe when another port already won"""
+
+
+def _adaptive_timeout(rtt):
+    """Scale the measured prompt round trip into a per-command timeout"""
+    return min(MAX_TIMEOUT, max(MIN_TIMEOUT, rtt * 10))
+
+
+def _command(ser, cmd, timeout, cancel, expect=None):
+    """
+    Send an AT/OBD command and collect lines until the '>' prompt.
+
+    With `expect`, prompts whose output doesn't contain it are treated as
+    late replies to an earlier command (e.g. the ATZ python-OBD sends on
+    close) and skipped.
+    """
+    ser.reset_input_buffer()
+    ser.write(cmd + b"\r")
+    ser.flush()
+
+    buffer = bytearray()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cancel.is_set():
+            raise ProbeCancelled()
+        buffer.extend(ser.read(ser.in_waiting or 1))
+        if buffer.endswith(b">"):
+            text = buffer[:-1].replace(b"\x00", b"").decode("utf-8", "ignore")
+            if expect is None or expect in text:
+                return [line.strip() for line in text.replace("\n", "\r").split("\r") if line.strip()]
+            buffer.clear()
+    return None
+
+
+def _find_baud(ser, bauds, cancel):
+    """Return (baudrate, round trip) for the first baud that gives a prompt"""
+    for baud in bauds:
+        if cancel.is_set():
+            raise ProbeCancelled()
+        ser.baudrate = baud
+        start = time.monotonic()
+        # a nonsense command gets a prompt back without repeating anything
+        if _command(ser, b"\x7F\x7F", INITIAL_TIMEOUT, cancel, expect="?") is not None:
+            return baud, time.monotonic() - start
+    return None, None
+
+
+def probe_port(port, bauds=None, cancel=None):
+    """Probe a single port. Returns a ProbeResult, or None if nothing answered."""
+    bauds = bauds or TRY_BAUDS
+    cancel = cancel or threading.Event()
+    start = time.monotonic()
+
+    try:
+        ser = serial.serial_for_url(port, timeout=0.05, write_timeout=1)
+    except (serial.SerialException, OSError):
+        return None
+
+    try:
+        baud, rtt = _find_baud(ser, bauds, cancel)
+        if baud is None:
+            return None
+
+        timeout = _adaptive_timeout(rtt)
+        if _command(ser, b"ATZ", max(timeout, RESET_TIMEOUT), cancel) is None:
+            return None
+        _command(ser, b"ATE0", timeout, cancel, expect="OK")
+
+        # 0100 tells us whether a car is on the other end
+        lines = _command(ser, b"0100", SEARCH_TIMEOUT, cancel) or []
+        car = any("4100" in line.replace(" ", "") for line in lines)
+
+        protocol = None
+        if car:
+            dpn = _command(ser, b"ATDPN", timeout, cancel)
+            if dpn:
+                # strip the "A" prefix the ELM adds in automatic mode
+                protocol = dpn[0][1:] if dpn[0].startswith("A") and len(dpn[0]) > 1 else dpn[0]
+
+        return ProbeResult(port, baud, protocol, car, time.monotonic() - start)
+    except ProbeCancelled:
+        return None
+    except (serial.SerialException, OSError):
+        return None
+    finally:
+        ser.close()
+
+
+def probe_ports(ports, bauds=None):
+    """
+    Probe all ports concurrently.
+
+    Returns the first result with a car connected, otherwise the first
+    adapter that answered at all, otherwise None.
+    """
+    if not ports:
+        return None
+
+    cancel = threading.Event()
+    fallback = None
+    executor = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="probe")
+    try:
+        futures = [executor.submit(probe_port, port, bauds, cancel) for port in ports]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+                continue
+            if result.car_connected:
+                cancel.set()
+                return result
+            fallback = fallback or result
+    finally:
+        # probes poll the cancel flag, so this returns once their ports are closed
+        cancel.set()
+        executor.shutdown(wait=True)
+
+    return fallback
+
+
+def probe_all(ports, bauds=None):
+    """Probe all ports concurrently and return every adapter with a car connected"""
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix="probe") as executor:
+        results = executor.map(lambda port: probe_port(port, bauds), ports)
+        return [result for result in results if result and result.car_connected]
+
+
+def check_port(port, baudrate):
+    """Quick check that an adapter gives a prompt on `port` at `baudrate`"""
+    try:
+        ser = serial.serial_for_url(port, timeout=0.05, write_timeout=1)
+    except (serial.SerialException, OSError):
+        return False
+    try:
+        return _find_baud(ser, [baudrate], threading.Event())[0] is not None
+    except (serial.SerialException, OSError):
+        return False
+    finally:
+        ser.close()
+
+
+def _connect_cached(ports, **options):
+    """
+    Connect with cached profile settings, skipping protocol and PID
+    detection. A profile that doesn't work is kept here: an unplugged
+    adapter or a car with the ignition off fails just the same. The probe
+    that follows finds out whether it is stale (see _forget_stale()).
+    """
+    from mondeo.connection import MondeoOBD
+
+    for port in ports:
+        profile = load_profile(port)
+        if not profile:
+            continue
+        # a wrong baud would stall python-OBD on its 10 s serial timeout
+        if check_port(port, profile["baudrate"]):
+            conn = MondeoOBD(port,
+                             baudrate=profile["baudrate"],
+                             protocol=profile["protocol"] or None,
+                             supported=decode_supported(profile["supported"]),
+                             **options)
+            if conn.is_connected():
+                return conn
+            conn.close()
+    return None
+
+
+def _forget_stale(result):
+    """Drop the profile of result.port if the adapter answered at another baud rate or with another protocol"""
+    profile = load_profile(result.port)
+    if not profile:
+        return
+    if profile["baudrate"] != result.baudrate or \
+            (result.car_connected and (profile["protocol"] or None) != result.protocol):
+        forget_profile(result.port)
+
+
+def connect_fastest(ports, bauds=None, use_cache=True, asynchronous=False, fast_mode=False, fast_baud=None):
+    """
+    Probe the ports and open a full OBD connection on the winner.
+
+    With `asynchronous` the connection is a mondeo.aio.SyncConnection
+    driven by the shared asyncio loop instead of python-OBD's serial I/O.
+    `fast_mode` and `fast_baud` are passed on to MondeoOBD; the asyncio
+    transport applies `fast_mode` too but has no ATBRD switch, so
+    `fast_baud` is ignored there with a warning.
+    """
+    options = {"fast_mode": fast_mode, "fast_baud": fast_baud}
+    if asynchronous:
+        from mondeo.aio import SyncConnection
+
+        if fast_baud:
+            logger.warning("fast_baud %s is not supported by the asyncio transport, "
+                           "staying at the probed baud rate", fast_baud)
+        with stats.timer("connect", "probe"):
+            result = probe_ports(ports, bauds)
+        if result is None:
+            return None
+        with stats.timer("connect", "open"):
+            return SyncConnection(result.port, result.baudrate, result.protocol, fast_mode=fast_mode)
+
+    if use_cache:
+        with stats.timer("connect", "cached"):
+            conn = _connect_cached(ports, **options)
+        if conn:
+            return conn
+
+    with stats.timer("connect", "probe"):
+        result = probe_ports(ports, bauds)
+    if result is None:
+        return None
+    if use_cache:
+        _forget_stale(result)
+
+    # python-OBD is only imported once there is something to connect to
+    from mondeo.connection import MondeoOBD
+
+    with stats.timer("connect", "open"):
+        conn = MondeoOBD(result.port, baudrate=result.baudrate, protocol=result.protocol, **options)
+    if use_cache and conn.is_connected():
+        save_profile(result.port, conn)
+    return conn
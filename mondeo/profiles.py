@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk adapter profile cache
+
+Profiles are keyed by the adapter's USB VID:PID:serial (or the device path
+for adapters without USB descriptors) and remember the working baud rate,
+the ELM protocol number and the car's supported-command bitmap, so a
+reconnect can skip baud detection, protocol search and the PID scan.
+"""
+
+import json
+import os
+import threading
+import time
+
+import serial.tools.list_ports
+
+CACHE_DIR = os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "mondeo-tool")
+CACHE_FILE = os.path.join(CACHE_DIR, "adapters.json")
+
+_lock = threading.Lock()
+
+
+def adapter_key(port):
+    """Stable key for the adapter on `port`"""
+    for info in serial.tools.list_ports.comports():
+        if info.device == port and info.vid is not None:
+            return f"{info.vid:04X}:{info.pid:04X}:{info.serial_number or ''}"
+    return f"dev:{port}"
+
+
+def encode_supported(commands):
+    """Pack a set of OBDCommands into {mode: hex bitmap of PIDs}"""
+    bitmaps = {}
+    for cmd in commands:
+        if cmd.mode is None or cmd.pid is None:
+            continue
+        bitmaps[cmd.mode] = bitmaps.get(cmd.mode, 0) | (1 << cmd.pid)
+    return {str(mode): f"{bits:x}" for mode, bits in bitmaps.items()}
+
+
+def decode_supported(bitmaps):
+    """Inverse of encode_supported()"""
+    import obd
+
+    commands = set()
+    for mode, bits in bitmaps.items():
+        mode, bits = int(mode), int(bits, 16)
+        pid = 0
+        while bits:
+            if bits & 1 and obd.commands.has_pid(mode, pid):
+                commands.add(obd.commands[mode][pid])
+            bits >>= 1
+            pid += 1
+    return commands
+
+
+def _load_all():
+    try:
+        with open(CACHE_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_all(profiles):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = CACHE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, CACHE_FILE)
+
+
+def load_profile(port):
+    """Cached profile for the adapter on `port`, or None"""
+    with _lock:
+        return _load_all().get(adapter_key(port))
+
+
+def save_profile(port, conn):
+    """Remember the settings of a working connection"""
+    profile = {
+        "baudrate": conn.baudrate,
+        "protocol": conn.protocol_id(),
+        "supported": encode_supported(conn.supported_commands),
+        "updated": time.time(),
+    }
+    with _lock:
+        profiles = _load_all()
+        profiles[adapter_key(port)] = profile
+        _save_all(profiles)
+
+
+def forget_profile(port):
+    """Drop a stale profile"""
+    with _lock:
+        profiles = _load_all()
+        if profiles.pop(adapter_key(port), None) is not None:
+            _save_all(profiles)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+"""
+Columnar binary session recorder
+
+A session is a directory with one pair of raw little-endian float64 files
+per signal (<name>.t.f8 for timestamps, <name>.v.f8 for values) plus a
+small session.json describing the columns. Files are memory-mapped and
+grown a chunk at a time, so a long drive costs 16 bytes per sample on
+disk and only the mapped pages in RAM.
+
+DTC reads are stored in the "DTC" column with each code packed into its
+two raw bytes (P0401 -> 0x0401), see dtc_to_value()/value_to_dtc().
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+CHUNK = 4096  # samples added to a column's files each time it fills up
+DTC_COLUMN = "DTC"
+SESSIONS_DIR = os.path.join(os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+                            "mondeo-tool", "sessions")
+
+_DTC_LETTERS = "PCBU"
+
+
+def dtc_to_value(code):
+    """'P0401' -> 0x0401 (the two bytes the ECU sent)"""
+    return (_DTC_LETTERS.index(code[0]) << 14) | int(code[1:], 16)
+
+
+def value_to_dtc(value):
+    """Inverse of dtc_to_value()"""
+    value = int(value)
+    return f"{_DTC_LETTERS[value >> 14]}{value & 0x3FFF:04X}"
+
+
+def new_session_path():
+    """Timestamped directory under SESSIONS_DIR for a new recording"""
+    return os.path.join(SESSIONS_DIR, time.strftime("%Y%m%d-%H%M%S"))
+
+
+class _Column:
+    """Timestamp and value arrays for one signal, grown in CHUNK steps"""
+
+    def __init__(self, directory, name):
+        self.paths = (os.path.join(directory, f"{name}.t.f8"),
+                      os.path.join(directory, f"{name}.v.f8"))
+        self.count = 0
+        self.capacity = 0
+        self.t = None
+        self.v = None
+
+    def append(self, t, v):
+        if self.count == self.capacity:
+            self._grow()
+        self.t[self.count] = t
+        self.v[self.count] = v
+        self.count += 1
+
+    def extend(self, ts, vs):
+        """Append arrays of timestamps and values in one go"""
+        n = len(ts)
+        while self.count + n > self.capacity:
+            self._grow()
+        self.t[self.count:self.count + n] = ts
+        self.v[self.count:self.count + n] = vs
+        self.count += n
+
+    def _grow(self):
+        self.flush()
+        self.capacity += CHUNK
+        arrays = []
+        for path in self.paths:
+            with open(path, "ab") as f:
+                f.truncate(self.capacity * 8)
+            arrays.append(np.memmap(path, dtype="<f8", mode="r+", shape=(self.capacity,)))
+        self.t, self.v = arrays
+
+    def flush(self):
+        if self.t is not None:
+            self.t.flush()
+            self.v.flush()
+
+    def close(self):
+        self.flush()
+        self.t = self.v = None
+        # drop the unused tail of the last chunk
+        for path in self.paths:
+            with open(path, "r+b") as f:
+                f.truncate(self.count * 8)
+
+
+class SessionRecorder:
+    """
+    Append samples to a session directory. Samples arriving after close()
+    (e.g. from a stream still winding down on the OBD worker) are dropped.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or new_session_path()
+        os.makedirs(self.path, exist_ok=True)
+        self.started = time.time()
+        self.columns = {}
+        self.units = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def _column(self, name, unit):
+        # called with the lock held
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = _Column(self.path, name)
+            self.units[name] = unit
+        return column
+
+    def append(self, name, t, value, unit=""):
+        """Record one numeric sample"""
+        with self.lock:
+            if not self.closed:
+                self._column(name, unit).append(t, value)
+
+    def extend(self, name, times, values, unit=""):
+        """Record arrays of numeric samples of one signal (e.g. from mondeo.decode.RawBatch)"""
+        with self.lock:
+            if not self.closed:
+                self._column(name, unit).extend(times, values)
+
+    def record(self, sample):
+        """Record a Sample from mondeo.stream, skipping non-numeric values"""
+        value = sample.value
+        unit = ""
+        if hasattr(value, "magnitude"):
+            unit = f"{value.units:~P}"
+            value = value.magnitude
+        if isinstance(value, (int, float)):
+            self.append(sample.name, sample.time, value, unit)
+
+    def record_dtcs(self, codes, t=None):
+        """Record the (code, description) pairs of one DTC read"""
+        t = t or time.time()
+        with self.lock:
+            if self.closed or not codes:
+                return
+            column = self._column(DTC_COLUMN, "")
+            for code, desc in codes:
+                column.append(t, dtc_to_value(code))
+
+    def flush(self):
+        with self.lock:
+            if self.closed:
+                return
+            for column in self.columns.values():
+                column.flush()
+            self._write_meta()
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            for column in self.columns.values():
+                column.close()
+            self._write_meta()
+
+    def _write_meta(self):
+        meta = {
+            "started": self.started,
+            "columns": {name: {"count": column.count, "unit": self.units[name]}
+                        for name, column in self.columns.items()},
+        }
+        with open(os.path.join(self.path, "session.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionReader:
+    """Read-only, zero-copy access to a recorded session"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "session.json"), "r") as f:
+            meta = json.load(f)
+        self.started = meta["started"]
+        self.meta = meta["columns"]
+
+    def names(self):
+        return list(self.meta)
+
+    def column(self, name):
+        """(timestamps, values) as read-only memory-mapped float64 arrays"""
+        count = self.meta[name]["count"]
+        if count == 0:
+            return np.empty(0), np.empty(0)
+        return tuple(np.memmap(os.path.join(self.path, f"{name}.{kind}.f8"),
+                               dtype="<f8", mode="r", shape=(count,))
+                     for kind in ("t", "v"))
+
+    def to_numpy(self):
+        """{name: (timestamps, values)} for every column"""
+        return {name: self.column(name) for name in self.meta}
+
+    def to_pandas(self, name):
+        """One column as a pandas Series indexed by timestamp, backed by the mapped file"""
+        import pandas as pd
+
+        # plain ndarray views of the memmaps, pandas copies memmap subclasses
+        t, v = (np.asarray(a) for a in self.column(name))
+        return pd.Series(v, index=pd.Index(t, copy=False), name=name, copy=False)
+
+    def dtcs(self):
+        """[(timestamp, code)] for every DTC recorded in the session"""
+        if DTC_COLUMN not in self.meta:
+            return []
+        t, v = self.column(DTC_COLUMN)
+        return [(float(ts), value_to_dtc(value)) for ts, value in zip(t, v)]
@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+"""
+Simulated ELM327 adapter
+
+Serves a fake ELM327 on a pseudo terminal so the CLI, the GUI and the
+benchmarks can run without a car or an adapter. The simulated car talks
+ISO 15765-4 (CAN 11/500) like the Mk4 PCM. Responses come either from a
+scripted Ecu, a recorded session (see mondeo.recorder) or a plain
+{command: [response lines]} script, with configurable latency, jitter and
+error injection. With `timing` the adapter also waits out its response
+timeout (ATST, shortened by ATAT1/ATAT2) after every reply that doesn't
+satisfy a response-count hint, like a real ELM327 does. ATMA streams the
+engine ECU's traffic (single- and multi-frame) at `monitor_rate` frames
+per second until the next character arrives.
+
+    with SimulatedElm327(latency=0.02) as sim:
+        conn = connect_fastest([sim.port])
+
+Run standalone with `python -m mondeo.simulator` and point the tool at
+the printed port.
+"""
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+import tty
+
+import numpy as np
+
+from mondeo import ford
+from mondeo.recorder import SessionReader
+
+PROMPT = b">"
+ST_UNIT = 0.004096  # seconds per ATST step
+# Share of the ATST timeout an ELM waits after the last frame, by ATAT mode (a rough model)
+ADAPTIVE_WAIT = {0: 1.0, 1: 0.5, 2: 0.25}
+ERRORS = ["NO DATA", "CAN ERROR", "BUFFER FULL", "STOPPED"]
+
+# Mode 01 PID -> (byte count, encoder from the decoded value to the raw bytes)
+ENCODERS = {
+    0x01: (4, list),                                            # STATUS (raw bytes)
+    0x04: (1, lambda v: [round(v * 255 / 100)]),                # ENGINE_LOAD
+    0x05: (1, lambda v: [round(v + 40)]),                       # COOLANT_TEMP
+    0x0B: (1, lambda v: [round(v)]),                            # INTAKE_PRESSURE
+    0x0C: (2, lambda v: _u16(v * 4)),                           # RPM
+    0x0D: (1, lambda v: [round(v)]),                            # SPEED
+    0x0F: (1, lambda v: [round(v + 40)]),                       # INTAKE_TEMP
+    0x10: (2, lambda v: _u16(v * 100)),                         # MAF
+    0x23: (2, lambda v: _u16(v / 10)),                          # FUEL_RAIL_PRESSURE_DIRECT
+    0x2C: (1, lambda v: [round(v * 255 / 100)]),                # COMMANDED_EGR
+    0x33: (1, lambda v: [round(v)]),                            # BAROMETRIC_PRESSURE
+    0x41: (4, list),                                            # STATUS_DRIVE_CYCLE (raw bytes)
+    0x42: (2, lambda v: _u16(v * 1000)),                        # CONTROL_MODULE_VOLTAGE
+    0x49: (1, lambda v: [round(v * 255 / 100)]),                # ACCELERATOR_POS_D
+}
+
+PID_NAMES = {
+    "STATUS": 0x01, "STATUS_DRIVE_CYCLE": 0x41,
+    "ENGINE_LOAD": 0x04, "COOLANT_TEMP": 0x05, "INTAKE_PRESSURE": 0x0B, "RPM": 0x0C,
+    "SPEED": 0x0D, "INTAKE_TEMP": 0x0F, "MAF": 0x10, "FUEL_RAIL_PRESSURE_DIRECT": 0x23,
+    "COMMANDED_EGR": 0x2C, "BAROMETRIC_PRESSURE": 0x33, "CONTROL_MODULE_VOLTAGE": 0x42,
+    "ACCELERATOR_POS_D": 0x49,
+}
+PID_BY_NUMBER = {pid: name for name, pid in PID_NAMES.items()}
+
+
+def _u16(value):
+    value = max(0, min(0xFFFF, round(value)))
+    return [value >> 8, value & 0xFF]
+
+
+def _dtc_bytes(code):
+    value = ("PCBU".index(code[0]) << 14) | int(code[1:], 16)
+    return [value >> 8, value & 0xFF]
+
+
+# Ford DID values per module (see mondeo.ford_defs)
+FORD_DIDS = {
+    "PCM": {
+        "VIN": "WF0GXXGBBG7A12345",
+        "PCM_SOFTWARE": "7G91-12A650-AKB",
+        "DPF_SOOT_LOAD": lambda t: 18.5 + t / 600,
+        "DPF_SOOT_PERCENT": lambda t: 62 + t / 200,
+        "DPF_DIFF_PRESSURE": lambda t: 4.2 + 8 * abs(np.sin(t / 4)),
+        "DPF_INLET_TEMP": lambda t: 250 + 150 * abs(np.sin(t / 4)),
+        "DPF_DISTANCE_SINCE_REGEN": 412,
+        "DPF_REGEN_STATE": 0,
+        "INJECTOR_CORRECTION_1": 0.42,
+        "INJECTOR_CORRECTION_2": -0.18,
+        "INJECTOR_CORRECTION_3": 1.35,
+        "INJECTOR_CORRECTION_4": 0.07,
+        "GLOW_PLUG_FAULTS": (False, False, True, False, False, False, False, False),
+        "GLOW_PLUG_RELAY": 0,
+        "GLOW_TIME_REMAINING": 0,
+    },
+    "ABS": {
+        "ABS_SOFTWARE": "7G91-2C405-AE",
+        "WHEEL_SPEED_FL": 0, "WHEEL_SPEED_FR": 0, "WHEEL_SPEED_RL": 0, "WHEEL_SPEED_RR": 0,
+        "ABS_PUMP_MOTOR": 0,
+    },
+    "BCM": {
+        "BCM_SOFTWARE": "7S7T-14A073-BE",
+        "BATTERY_VOLTAGE": 12.4,
+        "BATTERY_CHARGE": 81,
+        "ODOMETER": 184220,
+    },
+}
+
+
+class Ecu:
+    """
+    Scripted ECU
+
+    `values` maps PID names to a constant or to a callable taking the
+    seconds since the simulation started; `dids` does the same for Ford
+    DID names. `module_dtcs` are manufacturer codes only reported through
+    UDS mode 19.
+    """
+
+    def __init__(self, values=None, dtcs=None, pending=None, vin="WF0GXXGBBG7A12345", tx_id=None,
+                 module="PCM", dids=None, module_dtcs=None):
+        self.values = values if values is not None else {
+            "RPM": lambda t: 800 + 2200 * abs(np.sin(t / 4)),
+            "SPEED": lambda t: 60 + 40 * np.sin(t / 20),
+            "INTAKE_PRESSURE": lambda t: 100 + 120 * abs(np.sin(t / 4)),
+            "MAF": lambda t: 15 + 60 * abs(np.sin(t / 4)),
+            "FUEL_RAIL_PRESSURE_DIRECT": lambda t: 30000 + 100000 * abs(np.sin(t / 4)),
+            "ENGINE_LOAD": lambda t: 20 + 60 * abs(np.sin(t / 4)),
+            "ACCELERATOR_POS_D": lambda t: 15 + 50 * abs(np.sin(t / 4)),
+            "COMMANDED_EGR": 12,
+            "INTAKE_TEMP": 28,
+            "BAROMETRIC_PRESSURE": 101,
+            "COOLANT_TEMP": lambda t: min(90, 20 + t),
+            "CONTROL_MODULE_VOLTAGE": 14.2,
+            # diesel readiness: all monitors supported, DPF incomplete;
+            # DPF and EGR still running this drive cycle
+            "STATUS": (0x00, 0x0F, 0xE8, 0x40),
+            "STATUS_DRIVE_CYCLE": (0x00, 0x0F, 0xE8, 0xC0),
+        }
+        self.dtcs = list(dtcs) if dtcs is not None else ["P0401", "P2002"]
+        self.pending = list(pending) if pending is not None else []
+        self.vin = vin
+        self.module = module
+        self.tx_id = tx_id or ford.MODULES[module].response_id
+        self.dids = dids if dids is not None else dict(FORD_DIDS.get(module, {}), VIN=vin)
+        self.module_dtcs = list(module_dtcs) if module_dtcs is not None else ["P1247"]
+        self.started = time.monotonic()
+        # freeze frame 0, captured when the (first) stored DTC was set; the
+        # monitor status PIDs are never frozen
+        self.freeze = {pid: self.pid_bytes(pid) for pid in self.supported() - {0x01, 0x41}} if self.dtcs else {}
+
+    def supported(self):
+        return {PID_NAMES[name] for name in self.values if name in PID_NAMES}
+
+    def pid_bytes(self, pid):
+        """Raw data bytes for a mode 01 PID, or None if unsupported"""
+        if pid % 0x20 == 0:
+            return self._support_bitmap(pid)
+        name = PID_BY_NUMBER.get(pid)
+        if name not in self.values:
+            return None
+        value = self.values[name]
+        if callable(value):
+            value = value(time.monotonic() - self.started)
+        if pid == 0x01:
+            # MIL and DTC count follow the stored codes
+            return [(0x80 if self.dtcs else 0) | len(self.dtcs)] + list(value)[1:]
+        if isinstance(value, tuple):
+            return ENCODERS[pid][1](value)
+        return ENCODERS[pid][1](float(value))
+
+    def _support_bitmap(self, base):
+        supported = self.supported()
+        bits = 0
+        for pid in supported:
+            if base < pid <= base + 0x20:
+                bits |= 1 << (0x20 - (pid - base))
+        if any(pid > base + 0x20 for pid in supported):
+            bits |= 1  # next PID range is available
+        if base and not bits:
+            return None
+        return list(bits.to_bytes(4, "big"))
+
+    def handle(self, data):
+        """Answer an OBD request (list of bytes), returns response bytes or None"""
+        mode = data[0]
+        if mode == 0x01:
+            response = [0x41]
+            for pid in data[1:]:
+                value = self.pid_bytes(pid)
+                if value is not None:
+                    response += [pid] + value
+            return response if len(response) > 1 else None
+        if mode in (0x03, 0x07):
+            codes = self.dtcs if mode == 0x03 else self.pending
+            response = [mode + 0x40, len(codes)]
+            for code in codes:
+                response += _dtc_bytes(code)
+            return response
+        if mode == 0x02:
+            response = [0x42]
+            for pid, frame in zip(data[1::2], data[2::2]):
+                value = self._freeze_bytes(pid) if frame == 0 else None
+                if value is not None:
+                    response += [pid, frame] + value
+            return response if len(response) > 1 else None
+        if mode == 0x04:
+            self.dtcs, self.pending, self.freeze = [], [], {}
+            return [0x44]
+        if mode == 0x22:
+            return self._read_dids(data[1:])
+        if mode == 0x19 and data[1:2] == [0x02]:
+            response = [0x59, 0x02, 0xFF]
+            for code in self.dtcs + self.module_dtcs:
+                response += _dtc_bytes(code) + [0x00, 0x09]  # test failed, confirmed
+            for code in self.pending:
+                response += _dtc_bytes(code) + [0x00, 0x04]
+            return response
+        if mode == 0x3E:
+            return [0x7E, 0x00]  # TesterPresent
+        if mode == 0x18:
+            return [0x7F, 0x18, 0x11]  # UDS module: KWP service not supported
+        if mode == 0x19:
+            return [0x7F, 0x19, 0x12]  # sub-function not supported
+        if mode == 0x09 and data[1:2] == [0x00]:
+            return [0x49, 0x00, 0x40, 0x00, 0x00, 0x00]  # only the VIN (PID 02)
+        if mode == 0x09 and data[1:2] == [0x02]:
+            return [0x49, 0x02, 0x01] + list(self.vin.encode())
+        return None
+
+    def _read_dids(self, data):
+        response = [0x62]
+        for hi, lo in zip(data[::2], data[1::2]):
+            definition = ford.lookup_did(self.module, hi << 8 | lo)
+            if definition is None or definition.name not in self.dids:
+                return [0x7F, 0x22, 0x31]  # request out of range
+            value = self.dids[definition.name]
+            if callable(value):
+                value = value(time.monotonic() - self.started)
+            response += [hi, lo] + ford.encode(definition, value)
+        return response if len(response) > 1 else [0x7F, 0x22, 0x13]
+
+    def _freeze_bytes(self, pid):
+        if not self.freeze:
+            return None
+        if pid == 0x00:
+            bits = 1 << (0x20 - 0x02)  # PID 02, the DTC that stored the frame
+            for p in self.freeze:
+                if p < 0x20:
+                    bits |= 1 << (0x20 - p)
+            return list(bits.to_bytes(4, "big"))
+        if pid == 0x02:
+            return _dtc_bytes(self.dtcs[0]) if self.dtcs else [0, 0]
+        return self.freeze.get(pid)
+
+
+class SessionEcu(Ecu):
+    """Ecu replaying the PID values of a recorded session in real time"""
+
+    def __init__(self, path, loop=True, **kwargs):
+        reader = SessionReader(path)
+        self.columns = {}
+        for name in reader.names():
+            if name in PID_NAMES:
+                t, v = reader.column(name)
+                if len(t):
+                    self.columns[name] = (np.asarray(t) - t[0], np.asarray(v))
+        dtcs = sorted({code for ts, code in reader.dtcs()})
+        self.loop = loop
+        values = {name: self._player(name) for name in self.columns}
+        Ecu.__init__(self, values=values, dtcs=dtcs, **kwargs)
+
+    def _player(self, name):
+        t, v = self.columns[name]
+        duration = t[-1] or 1.0
+
+        def play(elapsed):
+            if self.loop:
+                elapsed %= duration
+            i = min(len(v) - 1, np.searchsorted(t, elapsed, side="right") - 1)
+            return v[max(0, i)]
+        return play
+
+
+class SimulatedElm327:
+    """Fake ELM327 on a pseudo terminal"""
+
+    def __init__(self, ecu=None, script=None, latency=0.0, jitter=0.0, error_rate=0.0,
+                 multi_pid=True, reset_delay=0.0, seed=None, modules=None, timing=False,
+                 monitor_rate=2000):
+        self.ecu = ecu or Ecu()
+        if modules is None:
+            modules = [Ecu(values={}, dtcs=[], module="ABS", module_dtcs=["C1145"]),
+                       Ecu(values={}, dtcs=[], module="BCM", module_dtcs=["B1318", "U0121"])]
+        # physically addressed modules by request CAN ID; the engine ECU answers 7DF too
+        self.modules = {ecu.tx_id - 8: ecu for ecu in [self.ecu] + list(modules)}
+        self.script = {k.replace(" ", "").upper(): v for k, v in (script or {}).items()}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.multi_pid = multi_pid
+        self.reset_delay = reset_delay
+        self.timing = timing
+        self.monitor_rate = monitor_rate
+        self.random = random.Random(seed)
+        self.port = None
+        self.requests = 0
+        self.last_command = ""
+        self._master = None
+        self._slave = None
+        self._thread = None
+        self._running = False
+        self._monitor = None  # ATMA thread
+        self._monitoring = threading.Event()
+        self._reset_settings()
+
+    def _reset_settings(self):
+        self.echo = True
+        self.headers = False
+        self.spaces = True
+        self.protocol = "0"
+        self.header = ford.FUNCTIONAL_ID
+        self.adaptive = 1
+        self.st = 0x32
+        self.flow_header = None
+        self.flow_data = None
+        self.flow_mode = 0
+        self._baud_pending = False
+
+    # ------------------------------------------------------------------ pty
+
+    def start(self):
+        """Open the pty and start serving; returns the port path"""
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name="elm327-sim", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        self._running = False
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        master = self._master  # stop() clears the attribute while we may be blocked in read
+        buffer = b""
+        while self._running:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            if not data:
+                return
+            if self._monitoring.is_set():
+                # any character ends ATMA
+                self._monitoring.clear()
+                self._monitor.join()
+                buffer = b""
+                try:
+                    os.write(master, b"STOPPED\r\r" + PROMPT)
+                except OSError:
+                    return
+                continue
+            buffer += data
+            while b"\r" in buffer:
+                line, buffer = buffer.split(b"\r", 1)
+                reply = self.respond(line.decode("ascii", "ignore"))
+                if reply is None:
+                    continue
+                if not self._running:
+                    return  # stopped during the reply's latency: the fd may belong to someone else now
+                try:
+                    os.write(master, reply)
+                except OSError:
+                    return
+
+    # ------------------------------------------------------------- protocol
+
+    def respond(self, raw):
+        """Full adapter output (echo, lines, prompt) for one command line"""
+        if self._baud_pending:
+            # ATBRD: a CR at the new rate confirms it (the pty has no real baud rate)
+            self._baud_pending = False
+            if not raw.strip():
+                return b"OK\r\r" + PROMPT
+        cmd = raw.strip().replace(" ", "").upper()
+        if not cmd:
+            cmd = self.last_command  # a bare CR repeats the previous command
+        self.last_command = cmd
+        self.requests += 1
+
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+        if cmd in self.script:
+            lines = list(self.script[cmd])
+        elif cmd.startswith("ATBRD"):
+            self._baud_pending = True
+            echo = raw + "\r" if self.echo else ""
+            return (echo + "OK\r").encode() + b"ELM327 v1.5\r"
+        elif cmd == "ATMA":
+            self._monitoring.set()
+            self._monitor = threading.Thread(target=self._stream_monitor, name="elm327-sim-ma", daemon=True)
+            self._monitor.start()
+            return (raw + "\r").encode() if self.echo else b""
+        elif cmd.startswith("AT"):
+            lines = self._at(cmd[2:])
+        elif cmd.strip("\x7f") == "":
+            lines = ["?"]
+        else:
+            lines = self._obd(cmd)
+            if self.timing:
+                time.sleep(self._idle_wait(cmd, lines))
+
+        echo = raw + "\r" if self.echo else ""
+        return (echo + "\r".join(lines) + "\r\r").encode() + PROMPT
+
+    def _at(self, cmd):
+        if cmd.startswith("Z") or cmd == "WS":
+            if self.reset_delay:
+                time.sleep(self.reset_delay)
+            self._reset_settings()
+            return ["", "ELM327 v1.5"]
+        if cmd == "I":
+            return ["ELM327 v1.5"]
+        if cmd in ("E0", "E1"):
+            self.echo = cmd == "E1"
+        elif cmd in ("H0", "H1"):
+            self.headers = cmd == "H1"
+        elif cmd in ("S0", "S1"):
+            self.spaces = cmd == "S1"
+        elif cmd.startswith("SH"):
+            try:
+                self.header = int(cmd[2:], 16)
+            except ValueError:
+                return ["?"]
+        elif cmd.startswith("SP") or cmd.startswith("TP"):
+            self.protocol = cmd[2:].lstrip("A") or "0"
+        elif cmd == "DPN":
+            return ["A6" if self.protocol == "0" else self.protocol]
+        elif cmd == "DP":
+            return ["ISO 15765-4 (CAN 11/500)"]
+        elif cmd == "RV":
+            return ["12.6V"]
+        elif cmd in ("AT0", "AT1", "AT2"):
+            self.adaptive = int(cmd[2])
+        elif cmd.startswith("ST"):
+            try:
+                self.st = int(cmd[2:], 16)
+            except ValueError:
+                return ["?"]
+        elif cmd.startswith("FCSH"):
+            try:
+                self.flow_header = int(cmd[4:], 16)
+            except ValueError:
+                return ["?"]
+        elif cmd.startswith("FCSD"):
+            try:
+                self.flow_data = bytes.fromhex(cmd[4:])
+            except ValueError:
+                return ["?"]
+        elif cmd.startswith("FCSM"):
+            # user-defined flow control (1) needs its header and data set first
+            if cmd[4:] not in ("0", "1", "2") or (cmd[4:] == "1" and not (self.flow_header and self.flow_data)):
+                return ["?"]
+            self.flow_mode = int(cmd[4:])
+        return ["OK"]
+
+    def _idle_wait(self, cmd, lines):
+        """Seconds the ELM listens for more frames after the reply"""
+        if lines == ["NO DATA"]:
+            return self.st * ST_UNIT  # nobody answered: the full timeout
+        hint = int(cmd[-1], 16) if len(cmd) % 2 else None
+        if hint and len(lines) >= hint:
+            return 0.0
+        return self.st * ST_UNIT * ADAPTIVE_WAIT[self.adaptive]
+
+    def _obd(self, cmd):
+        if len(cmd) % 2:
+            cmd = cmd[:-1]  # drop the ELM's response-count hint, e.g. "010C1"
+        try:
+            data = list(bytes.fromhex(cmd))
+        except ValueError:
+            return ["?"]
+
+        if self.error_rate and self.random.random() < self.error_rate:
+            return [self.random.choice(ERRORS)]
+
+        if data[0] == 0x01 and not self.multi_pid:
+            data = data[:2]
+
+        ecu = self.ecu if self.header == ford.FUNCTIONAL_ID else self.modules.get(self.header)
+        response = ecu.handle(data) if ecu else None
+        if response is None:
+            return ["NO DATA"]
+        return self._frames(ecu.tx_id, response)
+
+    def _stream_monitor(self):
+        """ATMA: the engine ECU's replies to every supported PID and the VIN, over and over"""
+        traffic = []
+        for request in [[0x01, pid] for pid in sorted(self.ecu.supported())] + [[0x09, 0x02]]:
+            response = self.ecu.handle(request)
+            if response is not None:
+                traffic += self._frames(self.ecu.tx_id, response)
+        if not traffic:
+            return
+        batch = 20
+        i = 0
+        while self._monitoring.is_set():
+            lines = [traffic[(i + n) % len(traffic)] for n in range(batch)]
+            i = (i + batch) % len(traffic)
+            try:
+                os.write(self._master, ("\r".join(lines) + "\r").encode())
+            except (OSError, TypeError):
+                return
+            time.sleep(batch / self.monitor_rate)
+
+    def _frames(self, tx_id, data):
+        """Split a response into ISO-TP single/first/consecutive frames"""
+        if len(data) <= 7:
+            frames = [[len(data)] + data]
+        else:
+            frames = [[0x10 | (len(data) >> 8), len(data) & 0xFF] + data[:6]]
+            rest, seq = data[6:], 1
+            while rest:
+                frames.append([0x20 | seq] + rest[:7])
+                rest, seq = rest[7:], (seq + 1) & 0x0F
+
+        sep = " " if self.spaces else ""
+        if self.headers:
+            return [f"{tx_id:03X}{sep}" + sep.join(f"{b:02X}" for b in frame) for frame in frames]
+
+        # without headers the ELM strips the PCI bytes: single frames are bare
+        # data, multi-frame responses are a length line plus numbered lines
+        if len(frames) == 1:
+            return [sep.join(f"{b:02X}" for b in data)]
+        lines = [f"{len(data):03X}"]
+        for i, frame in enumerate(frames):
+            payload = frame[2:] if i == 0 else frame[1:]
+            lines.append(f"{i & 0x0F:X}:{sep}" + sep.join(f"{b:02X}" for b in payload))
+        return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated ELM327 adapter on a pseudo terminal")
+    parser.add_argument("--session", help="replay a recorded session directory")
+    parser.add_argument("--script", help="JSON file of {command: [response lines]}")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds added to latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of OBD requests that fail")
+    parser.add_argument("--single-pid", action="store_true", help="reject multi-PID requests")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script, "r") as f:
+            script = json.load(f)
+    ecu = SessionEcu(args.session) if args.session else Ecu()
+
+    sim = SimulatedElm327(ecu, script, args.latency, args.jitter, args.error_rate,
+                          multi_pid=not args.single_pid)
+    print(f"Simulated ELM327 on {sim.start()} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
+
+
+if __name__ == "__main__":
+    main()
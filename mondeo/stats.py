@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Per-command latency histograms
+
+The connection layer records how long each part of a request takes, per
+command, so slowness can be pinned on the adapter, the ECU or Python:
+
+    write    serial write of the command
+    read     wait for the ELM prompt (adapter + ECU time)
+    search   reads that included "SEARCHING..." (protocol auto-detect)
+    retry    re-reads after an empty reply
+    decode   python-OBD frame parsing and value decoding
+    query    whole request, command sent to decoded response
+    connect  connection attempts (probe, cached profile, reconnect)
+
+Histograms use fixed Prometheus-style buckets, so recording is a bisect
+and a few additions and memory never grows.
+
+    with stats.timer("connect", "probe"):
+        ...
+    print(stats.format_table())
+    stats.write_prometheus(stats.PROMETHEUS_FILE)
+"""
+
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the last bucket is +Inf
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "write": "Serial write time per command",
+    "read": "Time from write to the ELM prompt per command",
+    "search": "Reads that included SEARCHING... (protocol detection)",
+    "retry": "Re-reads after an empty reply",
+    "decode": "python-OBD parsing and decoding time per command",
+    "query": "Whole request time, send to decoded response",
+    "connect": "Connection attempts",
+}
+
+PROMETHEUS_PREFIX = "mondeo_obd"
+PROMETHEUS_FILE = os.path.join(os.environ.get("XDG_DATA_HOME", os.path.expanduser("~/.local/share")),
+                               "mondeo-tool", "mondeo_obd.prom")
+
+
+class Histogram:
+    """Count, sum, min, max and bucket counts of observed durations"""
+
+    __slots__ = ("counts", "count", "total", "minimum", "maximum")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.minimum = seconds if self.minimum is None else min(self.minimum, seconds)
+        self.maximum = max(self.maximum, seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, q):
+        """Estimate of the q-th percentile (0-100), interpolated within its bucket"""
+        if not self.count:
+            return 0.0
+        rank = self.count * q / 100
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                low = BUCKETS[i - 1] if i else 0.0
+                high = BUCKETS[i] if i < len(BUCKETS) else self.maximum
+                estimate = low + (high - low) * (rank - seen) / n
+                return min(max(estimate, self.minimum), self.maximum)
+            seen += n
+        return self.maximum
+
+    def copy(self):
+        other = Histogram()
+        other.counts = list(self.counts)
+        other.count, other.total = self.count, self.total
+        other.minimum, other.maximum = self.minimum, self.maximum
+        return other
+
+
+class Registry:
+    """Histograms keyed by (metric, command label); safe to use from any thread"""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, metric, label, seconds):
+        with self._lock:
+            histogram = self._histograms.get((metric, label))
+            if histogram is None:
+                histogram = self._histograms[(metric, label)] = Histogram()
+            histogram.observe(seconds)
+
+    def snapshot(self):
+        """Sorted [(metric, label, Histogram copy)]"""
+        with self._lock:
+            items = [(metric, label, histogram.copy())
+                     for (metric, label), histogram in self._histograms.items()]
+        order = list(METRICS)
+        return sorted(items, key=lambda item: (order.index(item[0]) if item[0] in order else len(order),
+                                               item[1]))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+
+
+registry = Registry()
+
+
+def observe(metric, label, seconds):
+    """Record one duration in the shared registry"""
+    registry.observe(metric, label, seconds)
+
+
+@contextmanager
+def timer(metric, label):
+    """Time the with-block into the shared registry"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        registry.observe(metric, label, time.perf_counter() - start)
+
+
+def command_label(cmd):
+    """
+    Histogram label for a raw ELM command: multi-PID requests are grouped so
+    the label set stays small ("010C0D11" -> "01 multi-PID"), and the
+    response-count hint is dropped ("010C1" -> "010C").
+    """
+    text = (cmd.decode("ascii", "replace") if isinstance(cmd, bytes) else str(cmd)).replace(" ", "").upper()
+    if not text:
+        return "(repeat)"  # bare CR: repeat the last command
+    if text[:2] in ("01", "02") and not text.startswith("AT"):
+        body = text[2:-1] if len(text) % 2 else text[2:]
+        per_pid = 2 if text[:2] == "01" else 4
+        if len(body) > per_pid:
+            return f"{text[:2]} multi-PID"
+        return text[:2] + body
+    return text
+
+
+def _ms(seconds):
+    return f"{seconds * 1000:.2f}"
+
+
+def format_table(snapshot=None):
+    """Plain-text summary, one row per metric and command, times in ms"""
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    if not snapshot:
+        return "No timings recorded yet."
+    header = ("metric", "command", "count", "mean", "p50", "p95", "max")
+    rows = [(metric, label, str(h.count), _ms(h.mean), _ms(h.percentile(50)), _ms(h.percentile(95)),
+             _ms(h.maximum)) for metric, label, h in snapshot]
+    widths = [max(len(row[i]) for row in rows + [header]) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(widths[i]) if i < 2 else cell.rjust(widths[i])
+                       for i, cell in enumerate(row)) for row in [header] + rows]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    lines.append("(times in ms)")
+    return "\n".join(lines)
+
+
+def _escape(label):
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(snapshot=None):
+    """Histograms in the Prometheus text exposition format"""
+    snapshot = registry.snapshot() if snapshot is None else snapshot
+    lines = []
+    described = set()
+    for metric, label, h in snapshot:
+        name = f"{PROMETHEUS_PREFIX}_{metric}_seconds"
+        if metric not in described:
+            described.add(metric)
+            lines.append(f"# HELP {name} {METRICS.get(metric, metric)}")
+            lines.append(f"# TYPE {name} histogram")
+        command = _escape(label)
+        cumulative = 0
+        for bound, n in zip(BUCKETS + (None,), h.counts):
+            cumulative += n
+            le = "+Inf" if bound is None else repr(bound)
+            lines.append(f'{name}_bucket{{command="{command}",le="{le}"}} {cumulative}')
+        lines.append(f'{name}_sum{{command="{command}"}} {h.total!r}')
+        lines.append(f'{name}_count{{command="{command}"}} {h.count}')
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def write_prometheus(path=PROMETHEUS_FILE):
+    """
+    Write prometheus_text() to `path` (e.g. for node_exporter's textfile
+    collector). Written to a temporary file and renamed, so a scraper never
+    sees a half-written file.
+    """
+    path = os.path.expanduser(path)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(prometheus_text())
+    os.replace(temporary, path)
+    return path
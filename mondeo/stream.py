@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+Live PID streaming
+
+Mode 01 PIDs are polled on a per-PID schedule (fast signals like RPM more
+often than slow ones like coolant temperature). On CAN protocols up to six
+due PIDs are packed into a single request, e.g. "010C0B10", so one round
+trip to the ECU returns several samples. PIDs missing from a batched reply
+are fetched one at a time for that round only; a PID that keeps missing
+(an ECU that doesn't answer it in multi-PID requests) is no longer batched.
+
+    stream = PidStream(conn)
+    for sample in stream:
+        print(sample.name, sample.value)
+
+With raw=True the stream skips python-OBD's decoding and yields RawSamples
+holding the PID's data bytes, for bulk decoding with mondeo.decode.
+"""
+
+import time
+from collections import namedtuple
+
+import obd
+from obd.protocols.protocol import Message
+
+# Mode 01 PIDs and their polling interval in seconds
+DEFAULT_SCHEDULE = {
+    "RPM": 0.05,
+    "SPEED": 0.1,
+    "INTAKE_PRESSURE": 0.1,            # MAP / boost
+    "MAF": 0.1,
+    "FUEL_RAIL_PRESSURE_DIRECT": 0.1,
+    "ENGINE_LOAD": 0.2,
+    "ACCELERATOR_POS_D": 0.2,
+    "COMMANDED_EGR": 0.5,
+    "INTAKE_TEMP": 1.0,
+    "BAROMETRIC_PRESSURE": 5.0,
+    "COOLANT_TEMP": 2.0,
+    "CONTROL_MODULE_VOLTAGE": 2.0,
+}
+
+# The ELM327 accepts up to six PIDs per mode 01 request, but only on CAN
+MAX_BATCH = 6
+BATCH_MISSES = 3  # batched replies in a row without a PID before it is requested on its own
+CAN_PROTOCOLS = ("6", "7", "8", "9")
+
+Sample = namedtuple("Sample", "name value time")
+RawSample = namedtuple("RawSample", "name data time")  # data: the PID's bytes (A, B, ...)
+
+
+def format_value(value):
+    """Short display string for a decoded PID value"""
+    if hasattr(value, "magnitude"):
+        return f"{value.magnitude:.1f} {value.units:~P}"
+    return str(value)
+
+
+class PidStream:
+    """Iterable stream of Samples from a connected MondeoOBD"""
+
+    def __init__(self, conn, schedule=None, batch=True, raw=False):
+        self.conn = conn
+        self.raw = raw
+        self.schedule = {}
+        for name, interval in (schedule or DEFAULT_SCHEDULE).items():
+            cmd = obd.commands[name]
+            if conn.supports(cmd):
+                self.schedule[cmd] = interval
+
+        self.batch_size = MAX_BATCH if batch and conn.protocol_id() in CAN_PROTOCOLS else 1
+        self.single = set()  # commands taken out of batching, see BATCH_MISSES
+        self._misses = {}    # command -> batched replies in a row it was missing from
+        self.samples = 0
+        self.requests = 0
+        self.started = None
+        self._running = False
+
+    def stop(self):
+        """Stop the stream; the generator returns after the current request"""
+        self._running = False
+
+    def restart(self, conn):
+        """Continue streaming on a new connection (after a reconnect); returns a fresh iterator"""
+        self.conn = conn
+        return iter(self)
+
+    def rate(self):
+        """Samples per second since the stream started"""
+        if not self.started:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.samples / elapsed if elapsed > 0 else 0.0
+
+    def __iter__(self):
+        self._running = True
+        self.started = time.monotonic()
+        next_due = {cmd: self.started for cmd in self.schedule}
+
+        while self._running and next_due and self.conn.is_connected():
+            now = time.monotonic()
+            due = sorted((cmd for cmd in next_due if next_due[cmd] <= now), key=next_due.get)
+            if not due:
+                time.sleep(max(0.0, min(next_due.values()) - now))
+                continue
+
+            batched = [cmd for cmd in due if cmd not in self.single]
+            chunks = [batched[i:i + self.batch_size] for i in range(0, len(batched), self.batch_size)]
+            chunks += [[cmd] for cmd in due if cmd in self.single]
+            for chunk in chunks:
+                for sample in self._request(chunk):
+                    self.samples += 1
+                    yield sample
+                for cmd in chunk:
+                    # don't build a backlog if the bus can't keep up with the schedule
+                    next_due[cmd] = max(next_due[cmd] + self.schedule[cmd], now)
+
+    def _request(self, chunk):
+        self.requests += 1
+
+        if self.raw:
+            return self._request_raw(chunk)
+        if len(chunk) == 1:
+            response = self.conn.query(chunk[0])
+            if not response.is_null():
+                return [Sample(chunk[0].name, response.value, response.time)]
+            return []
+
+        cmd_string = b"01" + b"".join(cmd.command[2:] for cmd in chunk)
+        messages = self.conn.send_raw(cmd_string)
+        samples = self._split(messages)
+
+        for cmd in self._missing(chunk, samples):
+            samples += self._request([cmd])
+        return samples
+
+    def _request_raw(self, chunk):
+        messages = self.conn.send_raw(b"01" + b"".join(cmd.command[2:] for cmd in chunk))
+        now = time.time()
+        samples = [RawSample(cmd.name, data, now) for cmd, data in split_raw(messages)]
+        if len(chunk) > 1:
+            for cmd in self._missing(chunk, samples):
+                samples += self._request_raw([cmd])
+        return samples
+
+    def _missing(self, chunk, samples):
+        """
+        Commands of a batched chunk without a sample, to be requested one at a
+        time; counts their misses and takes the ones that keep missing out of
+        batching. Nothing while the connection is down.
+        """
+        answered = {sample.name for sample in samples}
+        missing = []
+        for cmd in chunk:
+            if cmd.name in answered:
+                self._misses.pop(cmd, None)
+                continue
+            self._misses[cmd] = self._misses.get(cmd, 0) + 1
+            if self._misses[cmd] >= BATCH_MISSES:
+                self.single.add(cmd)
+            missing.append(cmd)
+        return missing if self.conn.is_connected() else []
+
+    def _split(self, messages):
+        """Split a multi-PID mode 01 response into one Sample per PID"""
+        now = time.time()
+        return [Sample(cmd.name, value, now) for cmd, value in split_pids(messages)]
+
+
+def _pid_fields(messages, mode):
+    """(message, command, data bytes) for every PID in multi-PID mode 01/02 replies"""
+    header = 2 if mode == 0x02 else 1  # PID, plus the frame number in mode 02
+    for message in messages:
+        data = message.data
+        if not data or data[0] != 0x40 + mode:
+            continue
+
+        i = 1
+        while i < len(data):
+            pid = data[i]
+            if not obd.commands.has_pid(1, pid):
+                break
+            cmd = obd.commands[1][pid]
+            start = i + header
+            end = start + cmd.bytes - 2
+            yield message, cmd, bytes(data[start:end])
+            i = end
+
+
+def split_pids(messages, mode=0x01):
+    """
+    Decode a multi-PID mode 01 reply (41 PID data PID data ...) or mode 02
+    reply (42 PID FRAME data ...) into (command, value) pairs. Mode 02 data
+    is laid out like mode 01, so both use python-OBD's mode 01 decoders.
+    """
+    values = []
+    for message, cmd, data in _pid_fields(messages, mode):
+        # rebuild a single-PID mode 01 message so python-OBD's decoder can be reused
+        single = Message(message.frames)
+        single.ecu = message.ecu
+        single.data = bytearray([0x41, cmd.pid]) + data
+        response = cmd([single])
+        if not response.is_null():
+            values.append((cmd, response.value))
+    return values
+
+
+def split_raw(messages, mode=0x01):
+    """Like split_pids(), but (command, data bytes) pairs with no decoding"""
+    return [(cmd, data) for message, cmd, data in _pid_fields(messages, mode)
+            if len(data) == cmd.bytes - 2]
+
+
+def stream_pids(conn, schedule=None, batch=True):
+    """Generator yielding Samples; see PidStream"""
+    yield from PidStream(conn, schedule, batch)
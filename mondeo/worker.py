@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Single OBD I/O worker
+
+One long-lived thread owns the connection and runs jobs from a priority
+queue, so commands from different parts of the UI can never interleave on
+the serial line. Identical requests that are still queued are coalesced
+into one job. Results come back as concurrent.futures.Future objects;
+`dispatch` decides where completion callbacks run (GLib.idle_add in the
+GUI, so they land on the GTK main loop).
+
+While the queue is empty the worker can advance a background generator
+(e.g. a PidStream) one step at a time, so queued commands still get the
+line between streaming requests.
+
+With watch_health() the worker also heartbeats the connection between
+jobs (mondeo.health) and reconnects on its own when the link drops; the
+background stream is restarted on the new connection with the same
+consumer, so whatever the consumer has buffered is kept.
+"""
+
+import itertools
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+
+from mondeo.health import HealthMonitor
+from mondeo.probe import connect_fastest
+
+# Lower runs first
+PRIORITY_CONNECT = 0
+PRIORITY_COMMAND = 1
+PRIORITY_BACKGROUND = 2
+
+logger = logging.getLogger(__name__)
+
+
+def _call(callback, *args):
+    callback(*args)
+
+
+class ObdWorker:
+    """Thread owning the OBD connection and processing queued jobs"""
+
+    def __init__(self, dispatch=_call, **connect_options):
+        self.connection = None
+        self.dispatch = dispatch
+        self.connect_options = connect_options  # passed to connect_fastest(), e.g. fast_mode
+        self._queue = queue.PriorityQueue()
+        self._pending = {}  # coalescing key -> Future of the queued job
+        self._lock = threading.Lock()
+        self._order = itertools.count()  # FIFO within a priority
+        self._background = None  # [source, iterator, consumer]
+        self.health = None
+        self._on_health = None
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="obd-worker", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args, key=None, priority=PRIORITY_COMMAND, callback=None):
+        """
+        Queue `func(connection, *args)`; returns a Future.
+
+        If a job with the same `key` is still queued, its Future is returned
+        instead and `func` is not queued again.
+        """
+        with self._lock:
+            future = self._pending.get(key) if key is not None else None
+            if future is None:
+                future = Future()
+                if key is not None:
+                    self._pending[key] = future
+                self._queue.put((priority, next(self._order), key, future, func, args))
+
+        if callback is not None:
+            future.add_done_callback(lambda f: self.dispatch(callback, f))
+        return future
+
+    def connect(self, ports, callback=None):
+        """Queue a (re)connect to the fastest adapter among `ports`"""
+        return self.submit(self._connect, ports, key="connect", priority=PRIORITY_CONNECT,
+                           callback=callback)
+
+    def _connect(self, connection, ports):
+        self._close_connection()
+        self.connection = connect_fastest(ports, **self.connect_options)
+        if self.health:
+            self.health.attach(self.connection)
+        return self.connection
+
+    def watch_health(self, callback=None, monitor=None):
+        """
+        Heartbeat the connection while idle and reconnect automatically when
+        it drops; `callback(event)` is dispatched for every HealthEvent.
+        """
+        def start(connection):
+            self.health = monitor or HealthMonitor()
+            self._on_health = callback
+            self.health.attach(connection)
+
+        return self.submit(start, priority=PRIORITY_CONNECT)
+
+    def disconnect(self, callback=None):
+        return self.submit(lambda connection: self._close_connection(), key="disconnect",
+                           priority=PRIORITY_CONNECT, callback=callback)
+
+    def _close_connection(self):
+        self._background = None
+        if self.health:
+            self.health.detach()
+        if self.connection:
+            try:
+                self.connection.close()
+            except Exception:
+                pass
+            self.connection = None
+
+    def start_background(self, source, consumer):
+        """
+        Advance `source` while idle, passing each item to `consumer` (worker thread).
+        After an automatic reconnect, source.restart(connection) continues it if the
+        source has one (PidStream does); otherwise it is dropped. There is one
+        background slot: this replaces whatever source ran before.
+        """
+        self.submit(self._set_background, source, consumer, priority=PRIORITY_BACKGROUND)
+
+    def stop_background(self, source=None):
+        """
+        Stop the background job. With `source`, only if that is still the one
+        running, so closing one view doesn't stop the stream another started.
+        """
+        self.submit(self._clear_background, source, priority=PRIORITY_CONNECT)
+
+    def _set_background(self, connection, source, consumer):
+        self._background = [source, iter(source), consumer]
+
+    def _clear_background(self, connection, source):
+        if source is None or (self._background and self._background[0] is source):
+            self._background = None
+
+    def stop(self):
+        """Close the connection and end the worker thread"""
+        self.disconnect()
+        self._running = False
+        self._queue.put((PRIORITY_BACKGROUND + 1, next(self._order), None, None, None, ()))
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        while self._running or not self._queue.empty():
+            try:
+                stepping = self._can_step()
+                timeout = None if stepping or not self.health else self.health.timeout()
+                priority, order, key, future, func, args = self._queue.get(block=not stepping,
+                                                                           timeout=timeout)
+            except queue.Empty:
+                if self.health and self.health.due():
+                    self._check_health()
+                if self._can_step():
+                    self._step_background()
+                continue
+
+            if future is None:
+                continue  # wake-up from stop()
+            with self._lock:
+                if key is not None and self._pending.get(key) is future:
+                    del self._pending[key]
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(func(self.connection, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def _can_step(self):
+        if self._background is None or self._background[1] is None:
+            return False
+        return not (self.health and self.health.lost)
+
+    def _check_health(self):
+        try:
+            event, connection = self.health.check(self.connection)
+        except Exception:
+            # a failed reconnect attempt must not take the worker thread down
+            logger.exception("Health check failed")
+            return
+        if connection is not self.connection:
+            self.connection = connection
+            if self._background:
+                source = self._background[0]
+                if hasattr(source, "restart"):
+                    self._background[1] = source.restart(connection)
+                else:
+                    self._background = None
+        if event and self._on_health:
+            self.dispatch(self._on_health, event)
+
+    def _step_background(self):
+        source, generator, consumer = self._background
+        try:
+            consumer(next(generator))
+        except StopIteration:
+            if self.health and self.health.settings and not self.connection.is_connected():
+                # the link dropped under the stream; restarted after the reconnect
+                self._background[1] = None
+                return
+            self._background = None
+        except Exception:
+            logger.exception("Background job stopped")
+            self._background = None
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+"""Shared fixtures: a simulated ELM327 on a pseudo terminal (mondeo.simulator)"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mondeo.simulator import SimulatedElm327  # noqa: E402
+
+
+@pytest.fixture
+def sim():
+    with SimulatedElm327() as simulator:
+        yield simulator
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""asyncio transport (mondeo.aio) against the simulator"""
+
+import asyncio
+import time
+
+import obd
+import pytest
+
+from mondeo import ford
+from mondeo.aio import AsyncElm327, SyncConnection
+
+
+@pytest.fixture
+def conn(sim):
+    connection = SyncConnection(sim.port)
+    assert connection.is_connected()
+    yield connection
+    connection.close()
+
+
+def test_get_dtc(conn):
+    codes = [code for code, _ in conn.get_dtc().value]
+    assert codes == ["P0401", "P2002"]
+
+
+def test_query(conn):
+    response = conn.query(obd.commands.COOLANT_TEMP)
+    assert not response.is_null()
+
+
+def test_command_returns_lines(conn):
+    assert "OK" in conn.command(b"ATH1")
+
+
+def test_module_scan(conn):
+    result = ford.full_scan(conn)
+    assert sorted(result.modules) == ["ABS", "BCM", "PCM"]
+    assert [dtc.code for dtc in result.modules["ABS"]] == ["C1145"]
+
+
+def test_read_did(conn):
+    assert ford.read_did(conn, "BCM", "ODOMETER").magnitude == 184220
+
+
+def test_silent_adapter_gives_null_response(conn, sim):
+    sim.latency = 1.5  # longer than the transport's command deadline
+    assert conn.get_dtc().is_null()
+    assert not conn.is_connected()
+    assert conn.send_raw("03") == []
+
+
+def test_vanished_adapter_gives_null_response(conn, sim):
+    sim.stop()
+    assert conn.query(obd.commands.RPM).is_null()
+    assert not conn.is_connected()
+    assert not conn.clear_dtc().is_successful()
+
+
+def test_silent_adapter_fails_queued_commands(sim):
+    async def run():
+        adapter = AsyncElm327(sim.port)
+        await adapter.open()
+        sim.latency = 30.0
+        started = time.monotonic()
+        queued = await asyncio.gather(adapter.command(b"ATRV", 0.5), adapter.command(b"ATRV", 0.5),
+                                      return_exceptions=True)
+        later = await asyncio.gather(adapter.command(b"ATI", 0.5), return_exceptions=True)
+        adapter.close()
+        return queued + later, time.monotonic() - started
+
+    results, elapsed = asyncio.run(run())
+    assert all(isinstance(result, (asyncio.TimeoutError, ConnectionError)) for result in results)
+    assert elapsed < 3.0
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""python-OBD transport (mondeo.connection.MondeoOBD) against the simulator"""
+
+import obd
+import pytest
+
+from mondeo import ford
+from mondeo.connection import ST_DEFAULT, ST_MIN, MondeoOBD
+from mondeo.simulator import SimulatedElm327
+
+
+@pytest.fixture
+def conn(sim):
+    connection = MondeoOBD(sim.port, baudrate=38400)
+    assert connection.is_connected()
+    yield connection
+    connection.close()
+
+
+def test_get_dtc(conn):
+    codes = [code for code, _ in conn.get_dtc().value]
+    assert codes == ["P0401", "P2002"]
+
+
+def test_clear_dtc(conn):
+    assert conn.clear_dtc().is_successful()
+    assert conn.get_dtc().value == []
+
+
+def test_query(conn):
+    response = conn.query(obd.commands.RPM)
+    assert not response.is_null()
+    assert response.value.magnitude >= 800
+
+
+def test_send_raw_multi_pid(conn):
+    messages = conn.send_raw(b"010C0D")
+    assert messages and messages[0].data[:2] == b"\x41\x0c"
+
+
+def test_command_returns_lines(conn):
+    assert "OK" in conn.command(b"ATH1")
+
+
+def test_module_scan(conn):
+    result = ford.full_scan(conn)
+    assert sorted(result.modules) == ["ABS", "BCM", "PCM"]
+    assert [dtc.code for dtc in result.modules["BCM"]] == ["B1318", "U0121"]
+
+
+def test_heartbeat(conn):
+    assert conn.heartbeat() is not None
+
+
+def test_supported_from_cache(sim):
+    supported = {obd.commands.RPM, obd.commands.SPEED}
+    connection = MondeoOBD(sim.port, baudrate=38400, supported=supported)
+    assert connection.supports(obd.commands.RPM)
+    assert not connection.supports(obd.commands.MAF)  # no PID scan, only the cached set
+    connection.close()
+
+
+def test_fast_mode():
+    with SimulatedElm327(timing=True) as sim:
+        connection = MondeoOBD(sim.port, baudrate=38400, fast_mode=True)
+        settings = connection.fast_settings
+        assert settings[:3] == [b"ATE0", b"ATS0", b"ATAT2"]
+        assert connection.response_hints
+        assert settings[-1].startswith(b"ATST") and ST_MIN <= int(settings[-1][4:], 16) <= ST_DEFAULT
+        assert not sim.spaces
+        assert [code for code, _ in connection.get_dtc().value] == ["P0401", "P2002"]
+        connection.close()
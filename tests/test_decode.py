@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""Bulk decoding (mondeo.decode) against python-OBD's own decoders"""
+
+import numpy as np
+import obd
+import pytest
+from obd.protocols import ECU
+from obd.protocols.protocol import Message
+
+from mondeo.decode import FORMULAS, RawBatch, decode_batch, decode_slow, quantity
+from mondeo.stream import RawSample
+
+
+def _readings(width):
+    """Every value of a one-byte PID, edge cases and a fixed random sample of two-byte ones"""
+    if width == 1:
+        return np.arange(256, dtype=np.uint8).reshape(-1, 1)
+    sample = np.random.default_rng(0).integers(0, 256, size=(500, width), dtype=np.uint8)
+    edges = np.array([[0] * width, [255] * width, [0x80] + [0] * (width - 1)], dtype=np.uint8)
+    return np.vstack([edges, sample])
+
+
+def _python_obd(name, data):
+    cmd = obd.commands[name]
+    message = Message([])
+    message.ecu = ECU.ENGINE
+    message.data = bytearray([0x41, cmd.pid]) + bytes(data)
+    return cmd([message]).value
+
+
+@pytest.mark.parametrize("name", sorted(FORMULAS))
+def test_formula_matches_python_obd(name):
+    formula = FORMULAS[name]
+    cmd = obd.commands[name]
+    assert (cmd.pid, cmd.bytes - 2) == (formula.pid, formula.bytes)
+
+    data = _readings(formula.bytes)
+    expected = [decode_slow(name, row) for row in data]
+    np.testing.assert_allclose(decode_batch(name, data), expected, rtol=1e-9, atol=1e-9)
+    assert quantity(name, 1.0).units == _python_obd(name, data[0]).units
+
+
+def test_raw_batch():
+    batch = RawBatch()
+    for i, data in enumerate([b"\x0c\x80", b"\x1f\x40", b"\x0f\xa0"]):
+        batch.add(RawSample("RPM", data, float(i)))
+    batch.add(RawSample("COOLANT_TEMP", b"\x82", 0.5))
+    assert len(batch) == 4
+
+    decoded = batch.decode()
+    times, values = decoded["RPM"]
+    assert times.tolist() == [0.0, 1.0, 2.0]
+    assert values.tolist() == [800.0, 2000.0, 1000.0]
+    assert decoded["COOLANT_TEMP"][1].tolist() == [90.0]
+    assert len(batch) == 0  # decode() clears by default
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Offline DTC database (mondeo.dtcdb)"""
+
+import pytest
+
+from mondeo import dtcdb, ford_defs
+
+
+@pytest.fixture(scope="module")
+def db(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("dtcdb") / "dtc.idx")
+    dtcdb.build(path, {
+        "P0401": "Exhaust Gas Recirculation Flow Insufficient Detected",
+        "P2002": "Diesel particulate filter efficiency below threshold",
+        "P2452": "Diesel particulate filter pressure sensor A circuit",
+        "P3000": "Hybrid battery pack deterioration",
+        "C0035": "Left front wheel speed sensor circuit",
+        "C3FFF": "Last chassis code",
+        "B1318": "Battery voltage low",
+        "U0121": "Lost communication with ABS control module",
+    })
+    return dtcdb.Database(path)
+
+
+def test_describe(db):
+    assert db.describe("P2002") == "Diesel particulate filter efficiency below threshold"
+    assert db.describe("p0401").startswith("Exhaust Gas")
+    assert db.describe("P0402") is None
+    assert db.describe("X1234") is None
+
+
+@pytest.mark.parametrize("code", ["P4401", "C8000", "P040", "P04011", ""])
+def test_pack_code_rejects_non_codes(code):
+    with pytest.raises(ValueError):
+        dtcdb.pack_code(code)
+
+
+def test_pack_round_trip():
+    for code in ("P0000", "C3FFF", "B1318", "U3FFF"):
+        assert dtcdb.unpack_code(dtcdb.pack_code(code)) == code
+
+
+def test_search_code_prefix(db):
+    assert [code for code, _ in db.search("P2")] == ["P2002", "P2452"]
+    assert [code for code, _ in db.search("C")] == ["C0035", "C3FFF"]
+    assert [code for code, _ in db.search("B")] == ["B1318"]
+
+
+def test_search_words(db):
+    assert [code for code, _ in db.search("particulate filt")] == ["P2002", "P2452"]
+    assert [code for code, _ in db.search("battery")] == ["P3000", "B1318"]
+    assert db.search("diesel hybrid") == []
+    assert db.search("   ") == []
+
+
+def test_shipped_database_prefers_ford_descriptions():
+    for line in ford_defs.DTCS.strip().splitlines():
+        code, description = line.split("|", 1)
+        assert dtcdb.describe(code) == description
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""Fleet scan (mondeo.fleet) against two simulated adapters"""
+
+import pytest
+
+from mondeo import fleet
+from mondeo.simulator import SimulatedElm327
+
+
+@pytest.fixture
+def second():
+    with SimulatedElm327() as simulator:
+        yield simulator
+
+
+def test_scan_fleet(sim, second):
+    report = fleet.scan_fleet([sim.port, second.port])
+    assert len(report["vehicles"]) == 2
+    for vehicle in report["vehicles"]:
+        assert vehicle["vin"] == "WF0GXXGBBG7A12345"
+        assert [code for code, _ in vehicle["stored"]] == ["P0401", "P2002"]
+        assert vehicle["freeze_frame"]["dtc"] == "P0401"
+        assert vehicle["freeze_frame"]["values"]["RPM"] == {"value": 800.0, "unit": "rpm"}
+
+
+def test_one_failing_car(sim, second, monkeypatch):
+    vin = fleet._vin
+
+    async def failing_vin(adapter):
+        if adapter.port == sim.port:
+            raise ValueError("garbled VIN")
+        return await vin(adapter)
+
+    monkeypatch.setattr(fleet, "_vin", failing_vin)
+    vehicles = {vehicle["port"]: vehicle for vehicle in fleet.scan_fleet([sim.port, second.port])["vehicles"]}
+    assert vehicles[sim.port]["error"] == "garbled VIN"
+    assert vehicles[second.port]["vin"] == "WF0GXXGBBG7A12345"
+    assert "Scan failed: garbled VIN" in fleet.format_report({"vehicles": list(vehicles.values()), "ports": 2,
+                                                               "elapsed": 0.0})
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Heartbeat and reconnect (mondeo.health) against the simulator"""
+
+import threading
+import time
+
+from mondeo.aio import SyncConnection
+from mondeo.connection import MondeoOBD
+from mondeo.health import LINK_LOST, LINK_RESTORED, HealthMonitor, heartbeat, keep_alive
+from mondeo.monitor import DtcMonitor
+from mondeo.stream import PidStream
+
+
+def test_heartbeat(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    assert heartbeat(conn) is not None
+    conn.close()
+
+
+def test_slow_reply_is_not_a_lost_link(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    sim.latency = 1.0  # e.g. a mode 04 clear
+    assert conn.clear_dtc().is_successful()
+    assert conn.is_connected()
+    conn.close()
+
+
+def test_async_stream_reconnects(sim):
+    conn = SyncConnection(sim.port)
+    stream = PidStream(conn)
+    monitor = HealthMonitor()
+    events = []
+
+    def outage():
+        time.sleep(0.5)
+        sim.latency = 2.0  # silent adapter, longer than any command deadline
+        time.sleep(1.5)
+        sim.latency = 0.0
+
+    threading.Thread(target=outage, daemon=True).start()
+    started = time.monotonic()
+    for _ in keep_alive(conn, stream.restart, monitor, events.append):
+        if monitor.reconnects or time.monotonic() - started > 15:
+            break
+    stream.stop()
+    monitor.connection.close()
+    assert [event.kind for event in events] == [LINK_LOST, LINK_RESTORED]
+
+
+def test_dtc_watch_reconnects(sim):
+    conn = SyncConnection(sim.port)
+    dtc_monitor = DtcMonitor(interval=1.0)
+    monitor = HealthMonitor()
+    events = []
+
+    def outage():
+        time.sleep(1.5)  # past the first poll: nothing changes from here on
+        sim.latency = 2.0
+        time.sleep(1.5)
+        sim.latency = 0.0
+
+    threading.Thread(target=outage, daemon=True).start()
+    started = time.monotonic()
+    for _ in keep_alive(conn, dtc_monitor.watch, monitor, events.append):
+        if monitor.reconnects or time.monotonic() - started > 15:
+            break
+    dtc_monitor.stop()
+    monitor.connection.close()
+    assert [event.kind for event in events] == [LINK_LOST, LINK_RESTORED]
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""Session history (mondeo.history)"""
+
+import time
+from collections import namedtuple
+
+import pytest
+
+from mondeo.history import HistoryStore, Session
+
+Dtc = namedtuple("Dtc", "code description status first_seen")
+
+
+@pytest.fixture
+def store(tmp_path):
+    history = HistoryStore(str(tmp_path / "history.sqlite3"))
+    yield history
+    history.close()
+
+
+def _session(store, vin, started=None):
+    session = Session(store, f"s-{vin}-{started}", vin)
+    store.write("INSERT INTO sessions (id, started, vin, source) VALUES (?, ?, ?, ?)",
+                (session.id, started or time.time(), vin, "test"))
+    return session
+
+
+def test_cars_with_code(store):
+    now = time.time()
+    _session(store, "VIN1").record_dtcs([Dtc("P2002", "DPF", "stored", now - 60)], now)
+    _session(store, "VIN2").record_dtcs([Dtc("P0401", "EGR", "stored", now)], now)
+    old = _session(store, "VIN3", now - 90 * 86400)
+    old.record_dtcs([Dtc("P2002", "DPF", "stored", now - 90 * 86400)], now - 90 * 86400)
+    store.flush()
+
+    assert [car.vin for car in store.cars_with_code("p2002", days=30)] == ["VIN1"]
+    assert sorted(car.vin for car in store.cars_with_code("P2002", days=None)) == ["VIN1", "VIN3"]
+
+
+def test_repeated_reads_update_last_seen(store):
+    session = _session(store, "VIN1")
+    session.record_dtcs([Dtc("P2002", "DPF", "stored", 100.0)], 100.0)
+    session.record_dtcs([Dtc("P2002", "DPF", "stored", 100.0)], 200.0)
+    store.flush()
+    [row] = store.session_dtcs(session.id)
+    assert (row.first_seen, row.last_seen) == (100.0, 200.0)
+
+
+def test_failing_write_loses_only_itself(store, capsys):
+    store.write("INSERT INTO no_such_table VALUES (1)")
+    session = _session(store, "VIN1")
+    store.flush()
+    assert [row.id for row in store.sessions()] == [session.id]
+    assert capsys.readouterr().out == ""  # errors go to the log, never to stdout
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""ISO-TP reassembly and channels (mondeo.isotp)"""
+
+from mondeo import ford
+from mondeo.connection import MondeoOBD
+from mondeo.isotp import FlowControl, Frame, IsoTpChannel, Reassembler, encode_stmin, flow_control_data, \
+    parse_frame
+
+VIN = b"WF0GXXGBBG7A12345"
+# 49 02 01 + VIN: 20 bytes, a first frame and two consecutive frames
+VIN_FRAMES = [bytes.fromhex("1014490201") + VIN[:3], b"\x21" + VIN[3:10], b"\x22" + VIN[10:]]
+
+
+def _feed(reassembler, can_id, frames):
+    return [message for message in (reassembler.feed(Frame(can_id, data, 0.0)) for data in frames)
+            if message is not None]
+
+
+def test_single_frame():
+    messages = _feed(Reassembler(), 0x7E8, [bytes.fromhex("03410C1A")])
+    assert [message.data for message in messages] == [bytes.fromhex("410C1A")]
+
+
+def test_multi_frame():
+    messages = _feed(Reassembler(), 0x7E8, VIN_FRAMES)
+    assert len(messages) == 1
+    assert messages[0].can_id == 0x7E8
+    assert messages[0].data == b"\x49\x02\x01" + VIN
+
+
+def test_interleaved_senders():
+    reassembler = Reassembler()
+    frames = [Frame(can_id, data, 0.0) for pair in zip(VIN_FRAMES, VIN_FRAMES) for can_id, data in
+              zip((0x7E8, 0x7E9), pair)]
+    messages = [message for message in map(reassembler.feed, frames) if message is not None]
+    assert [message.can_id for message in messages] == [0x7E8, 0x7E9]
+    assert all(message.data.endswith(VIN) for message in messages)
+    assert reassembler.errors == 0
+
+
+def test_sequence_gap_drops_the_message():
+    reassembler = Reassembler()
+    assert _feed(reassembler, 0x7E8, [VIN_FRAMES[0], VIN_FRAMES[2]]) == []
+    assert reassembler.errors == 1
+    assert _feed(reassembler, 0x7E8, [b"\x21" + VIN[3:10]]) == []  # stray consecutive frame
+    assert reassembler.errors == 2
+    assert len(_feed(reassembler, 0x7E8, VIN_FRAMES)) == 1  # the buffer is reused
+
+
+def test_bad_lengths():
+    reassembler = Reassembler()
+    assert _feed(reassembler, 0x7E8, [b"\x00\x41", b"\x09\x41", b"\x10\x05\x49\x02"]) == []
+    assert reassembler.errors == 3
+
+
+def test_parse_frame():
+    assert parse_frame("7E8 03 41 0C 1A") == Frame(0x7E8, bytes.fromhex("03410C1A"), None)
+    assert parse_frame(b"18DAF110034100BE", extended=True).can_id == 0x18DAF110
+    assert parse_frame("NO DATA") is None
+    assert parse_frame("STOPPED") is None
+
+
+def test_flow_control():
+    assert encode_stmin(0) == 0x00
+    assert encode_stmin(0.005) == 0x05
+    assert encode_stmin(0.0003) == 0xF3
+    assert encode_stmin(1.0) == 0x7F
+    assert flow_control_data(FlowControl(8, 0.002)) == b"300802"
+
+
+def test_channel_request(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    with IsoTpChannel(conn, ford.MODULES["PCM"]) as channel:
+        messages = channel.request(b"0902")
+        assert [message.data for message in messages] == [b"\x49\x02\x01" + VIN]
+        assert sim.flow_mode == 1
+    assert sim.flow_mode == 0 and sim.header == 0x7DF
+    conn.close()
+
+
+def test_channel_resets_the_tuned_timeout(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    conn.fast_settings.append(b"ATST10")  # as MondeoOBD.tune() leaves it
+    conn.command(b"ATST10")
+    with IsoTpChannel(conn, ford.MODULES["BCM"]):
+        assert sim.st == 0x32
+    assert sim.st == 0x10
+    conn.close()
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""DTC monitor (mondeo.monitor) against the simulator"""
+
+from mondeo.connection import MondeoOBD
+from mondeo.monitor import APPEARED, STORED, DtcMonitor
+
+
+def test_appeared_once(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    monitor = DtcMonitor(pending=False)
+    events = monitor.poll(conn)
+    assert {event.code for event in events if event.kind == APPEARED} == {"P0401", "P2002"}
+    assert monitor.poll(conn) == []
+    conn.close()
+
+
+def test_failed_read_is_not_diffed(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    monitor = DtcMonitor(pending=False)
+    monitor.poll(conn)
+    last_poll = monitor.last_poll
+
+    sim.script["03"] = ["NO DATA"]
+    assert monitor.poll(conn) == []  # no "cleared" events for codes nobody answered about
+    assert monitor.failed
+    assert monitor.last_poll == last_poll
+
+    del sim.script["03"]
+    assert monitor.poll(conn) == []
+    assert not monitor.failed
+    assert {dtc.code for dtc in monitor.active(STORED)} == {"P0401", "P2002"}
+    conn.close()
+
+
+def test_reset(sim):
+    conn = MondeoOBD(sim.port, baudrate=38400)
+    monitor = DtcMonitor(pending=False)
+    monitor.poll(conn)
+    monitor.reset()
+    assert monitor.active() == [] and monitor.last_poll is None
+    assert len(monitor.poll(conn)) == 2  # every code is new again
+    conn.close()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Port probing and cached connects (mondeo.probe) against the simulator"""
+
+import pytest
+
+from mondeo import profiles
+from mondeo.aio import SyncConnection
+from mondeo.probe import ProbeResult, _forget_stale, check_port, connect_fastest, probe_all, probe_ports
+from mondeo.simulator import SimulatedElm327
+
+
+@pytest.fixture(autouse=True)
+def profile_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiles, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiles, "CACHE_FILE", str(tmp_path / "adapters.json"))
+
+
+@pytest.fixture
+def no_car():
+    with SimulatedElm327(script={"0100": ["NO DATA"]}) as simulator:
+        yield simulator
+
+
+def test_probe_ports(sim):
+    result = probe_ports([sim.port])
+    assert (result.port, result.baudrate, result.protocol, result.car_connected) == (sim.port, 38400, "6", True)
+
+
+def test_probe_prefers_the_car(sim, no_car):
+    assert probe_ports([no_car.port, sim.port]).port == sim.port
+    result = probe_ports([no_car.port])
+    assert result.port == no_car.port and not result.car_connected
+
+
+def test_probe_all(sim, no_car):
+    with SimulatedElm327() as third:
+        assert sorted(result.port for result in probe_all([sim.port, no_car.port, third.port])) == \
+            sorted([sim.port, third.port])
+
+
+def test_probe_missing_port():
+    assert probe_ports(["/dev/does-not-exist"]) is None
+    assert not check_port("/dev/does-not-exist", 38400)
+
+
+def test_connect_fastest_async(sim):
+    conn = connect_fastest([sim.port], asynchronous=True, fast_mode=True)
+    assert isinstance(conn, SyncConnection) and conn.is_connected()
+    assert b"ATS0" in conn.fast_settings
+    assert [code for code, _ in conn.get_dtc().value] == ["P0401", "P2002"]
+    conn.close()
+
+
+def test_connect_saves_profile(sim):
+    conn = connect_fastest([sim.port])
+    assert conn.is_connected()
+    conn.close()
+    profile = profiles.load_profile(sim.port)
+    assert profile["baudrate"] == 38400 and profile["protocol"] == "6"
+
+
+def test_cached_connect(sim):
+    connect_fastest([sim.port]).close()
+    requests = sim.requests
+    conn = connect_fastest([sim.port])
+    assert conn.is_connected()
+    assert sim.requests - requests < 15  # no probe, no supported-PID scan
+    conn.close()
+
+
+def test_profile_kept_while_unplugged(sim):
+    connect_fastest([sim.port]).close()
+    port = sim.port
+    sim.stop()
+    assert connect_fastest([port]) is None
+    assert profiles.load_profile(port) is not None
+
+
+def test_forget_stale(sim):
+    connect_fastest([sim.port]).close()
+    _forget_stale(ProbeResult(sim.port, 38400, None, False, 0.0))  # no car: nothing to compare
+    assert profiles.load_profile(sim.port) is not None
+    _forget_stale(ProbeResult(sim.port, 38400, "6", True, 0.0))
+    assert profiles.load_profile(sim.port) is not None
+    _forget_stale(ProbeResult(sim.port, 38400, "7", True, 0.0))
+    assert profiles.load_profile(sim.port) is None
+
+    connect_fastest([sim.port]).close()
+    _forget_stale(ProbeResult(sim.port, 115200, None, False, 0.0))
+    assert profiles.load_profile(sim.port) is None
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+"""Columnar session recorder (mondeo.recorder)"""
+
+import numpy as np
+
+from mondeo.recorder import SessionReader, SessionRecorder, dtc_to_value, value_to_dtc
+
+
+def test_round_trip(tmp_path):
+    with SessionRecorder(str(tmp_path)) as recorder:
+        for i in range(10000):
+            recorder.append("RPM", float(i), 800.0 + i, "rpm")
+        recorder.extend("SPEED", np.arange(3.0), np.array([10.0, 20.0, 30.0]), "kph")
+        recorder.record_dtcs([("P0401", ""), ("U0121", "")], t=5.0)
+
+    reader = SessionReader(str(tmp_path))
+    t, v = reader.column("RPM")
+    assert len(t) == 10000 and v[-1] == 800.0 + 9999
+    assert list(reader.column("SPEED")[1]) == [10.0, 20.0, 30.0]
+    assert reader.dtcs() == [(5.0, "P0401"), (5.0, "U0121")]
+
+
+def test_writes_after_close_are_dropped(tmp_path):
+    recorder = SessionRecorder(str(tmp_path))
+    recorder.append("RPM", 0.0, 800.0)
+    recorder.close()
+    recorder.append("RPM", 1.0, 900.0)
+    recorder.extend("RPM", np.array([2.0]), np.array([1000.0]))
+    recorder.record_dtcs([("P2002", "")])
+    recorder.close()
+    assert SessionReader(str(tmp_path)).meta["RPM"]["count"] == 1
+
+
+def test_dtc_packing():
+    assert dtc_to_value("P0401") == 0x0401
+    assert value_to_dtc(dtc_to_value("U3FFF")) == "U3FFF"
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Live PID streaming (mondeo.stream) against the simulator"""
+
+import pytest
+
+from mondeo.connection import MondeoOBD
+from mondeo.stream import MAX_BATCH, PidStream, RawSample, Sample
+
+SCHEDULE = {"RPM": 0.0, "SPEED": 0.0, "MAF": 0.0, "ENGINE_LOAD": 0.0, "INTAKE_TEMP": 0.0,
+            "COOLANT_TEMP": 0.0, "BAROMETRIC_PRESSURE": 0.0}
+
+
+def _take(stream, count):
+    samples = []
+    for sample in stream:
+        samples.append(sample)
+        if len(samples) >= count:
+            stream.stop()
+    return samples
+
+
+@pytest.fixture
+def conn(sim):
+    connection = MondeoOBD(sim.port, baudrate=38400)
+    yield connection
+    connection.close()
+
+
+def test_batched_requests(conn):
+    stream = PidStream(conn, SCHEDULE)
+    assert stream.batch_size == MAX_BATCH
+    samples = _take(stream, 70)
+    assert {sample.name for sample in samples} == set(SCHEDULE)
+    assert all(isinstance(sample, Sample) and sample.value is not None for sample in samples)
+    assert stream.requests <= 2 * len(samples) / MAX_BATCH  # seven PIDs take two requests
+
+
+def test_single_pid_requests(conn):
+    stream = PidStream(conn, SCHEDULE, batch=False)
+    samples = _take(stream, 14)
+    assert stream.requests == len(samples)
+
+
+def test_falls_back_without_multi_pid(sim, conn):
+    sim.multi_pid = False
+    stream = PidStream(conn, SCHEDULE)
+    samples = _take(stream, 70)
+    # only the first PID of a batch is answered: the others end up requested on their own
+    assert len(stream.single) == len(SCHEDULE) - 1
+    assert {sample.name for sample in samples} == set(SCHEDULE)
+
+
+def test_short_batched_reply_once(conn, monkeypatch):
+    send_raw, sent = conn.send_raw, []
+
+    def dropping_first(cmd_string):
+        sent.append(cmd_string)
+        return [] if len(sent) == 1 else send_raw(cmd_string)
+
+    monkeypatch.setattr(conn, "send_raw", dropping_first)
+    stream = PidStream(conn, SCHEDULE)
+    samples = _take(stream, 70)
+    assert {sample.name for sample in samples} == set(SCHEDULE)
+    assert stream.batch_size == MAX_BATCH and not stream.single
+    # batching goes on: the short reply only cost its PIDs one request each, once
+    assert stream.requests <= 2 * len(samples) / MAX_BATCH + len(SCHEDULE)
+
+
+def test_raw_samples(conn):
+    samples = _take(PidStream(conn, {"RPM": 0.0, "COOLANT_TEMP": 0.0}, raw=True), 10)
+    assert all(isinstance(sample, RawSample) for sample in samples)
+    assert {len(sample.data) for sample in samples if sample.name == "RPM"} == {2}
+    assert {len(sample.data) for sample in samples if sample.name == "COOLANT_TEMP"} == {1}
+
+
+def test_unsupported_pids_are_skipped(conn):
+    stream = PidStream(conn, {"RPM": 0.0, "OIL_TEMP": 0.0})
+    assert [cmd.name for cmd in stream.schedule] == ["RPM"]
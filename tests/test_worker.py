@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""OBD worker (mondeo.worker) job queue and background slot"""
+
+import itertools
+import time
+
+from mondeo.worker import ObdWorker
+
+
+class Counter:
+    def __init__(self):
+        self.items = []
+
+    def __iter__(self):
+        for i in itertools.count():
+            time.sleep(0.001)
+            yield i
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_submit_runs_job():
+    worker = ObdWorker()
+    try:
+        assert worker.submit(lambda connection, x: x * 2, 21).result(timeout=2) == 42
+    finally:
+        worker.stop()
+
+
+def test_stop_background_only_stops_its_own_source():
+    worker = ObdWorker()
+    try:
+        live, dashboard = Counter(), Counter()
+        worker.start_background(live, live.items.append)
+        assert _wait(lambda: live.items)
+        worker.start_background(dashboard, dashboard.items.append)
+        assert _wait(lambda: dashboard.items)
+
+        worker.stop_background(live)  # the replaced view closes
+        seen = len(dashboard.items)
+        assert _wait(lambda: len(dashboard.items) > seen + 10)
+
+        worker.stop_background(dashboard)
+        worker.submit(lambda connection: None).result(timeout=2)
+        seen = len(dashboard.items)
+        time.sleep(0.05)
+        assert len(dashboard.items) == seen
+    finally:
+        worker.stop()